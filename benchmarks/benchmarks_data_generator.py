@@ -0,0 +1,245 @@
+# benchmarks_data_generator.py
+"""
+Генератор синтетических данных для замеров слоя данных.
+
+По зерну (seed) и размерам (DatasetSpec) детерминированно строит филиалы,
+врачей, услуги, животных с историей болезни реалистичного размера и
+приёмы без пересечений по времени, а затем загружает их в PostgreSQL и
+MongoDB пакетными путями приложения (execute_values, bulk_insert_appointments,
+insert_many).
+
+Загрузка с reset=True очищает таблицы и коллекцию - запускайте только
+на отдельных базах для замеров (POSTGRES_URL, MONGO_URL в .env).
+"""
+import random
+import uuid
+from datetime import date, time, timedelta
+from typing import NamedTuple
+
+from psycopg2.extras import execute_values
+
+from database.database_models_mongo import MongoDBModels
+from database.database_models_pg import PostgresModels
+
+
+class DatasetSpec(NamedTuple):
+    """Размеры набора данных"""
+    branches: int
+    vets_per_branch: int
+    services: int
+    animals: int
+    appointments: int
+    seed: int = 42
+
+
+# Наборы для прогона по размерам
+PRESETS = {
+    'small': DatasetSpec(branches=2, vets_per_branch=3, services=10, animals=1_000, appointments=5_000),
+    'medium': DatasetSpec(branches=5, vets_per_branch=6, services=25, animals=20_000, appointments=100_000),
+    'large': DatasetSpec(branches=10, vets_per_branch=10, services=40, animals=200_000, appointments=1_000_000),
+}
+
+START_DATE = date(2023, 1, 2)  # Понедельник - начало периода приёмов
+SLOT_STARTS = [time(9 + minutes // 60, minutes % 60) for minutes in range(0, 9 * 60 + 1, 30)]  # 9:00-18:00
+BOOKING_DENSITY = 0.7  # Доля занятых слотов врача в рабочие дни
+LOAD_BATCH = 5_000  # Строк на один пакет загрузки
+
+SPECIES = {
+    'Собака': ['Лабрадор', 'Овчарка', 'Такса', 'Хаски', 'Беспородная'],
+    'Кошка': ['Британская', 'Мейн-кун', 'Сфинкс', 'Сиамская', 'Беспородная'],
+    'Хомяк': ['Сирийский', 'Джунгарский', 'Роборовский'],
+    'Попугай': ['Волнистый', 'Корелла', 'Жако'],
+    'Кролик': ['Карликовый', 'Вислоухий'],
+}
+NAMES = ['Барсик', 'Рекс', 'Лиза', 'Мурка', 'Шарик', 'Бобик', 'Кеша', 'Пушок', 'Тима', 'Джек',
+         'Белка', 'Соня', 'Граф', 'Луна', 'Персик']
+SURNAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов', 'Лебедев',
+            'Козлов', 'Новиков', 'Морозов', 'Волков']
+INITIALS = 'АБВГДЕИКЛМНОПРСТ'
+DIAGNOSES = ['грипп', 'бронхит', 'гастрит', 'дерматит', 'отит', 'конъюнктивит', 'артрит',
+             'цистит', 'аллергия', 'глисты', 'здоров']
+SYMPTOMS = ['потеря аппетита', 'чихание', 'слабость', 'кашель', 'рвота', 'зуд', 'хромота',
+            'вялость', 'температура']
+TREATMENTS = ['антибиотики', 'противовирусные', 'вливания жидкости', 'диета', 'мазь',
+              'капли', 'покой', 'витамины']
+SERVICE_TITLES = ['Осмотр', 'Вакцинация', 'УЗИ', 'Анализ крови', 'Чистка зубов', 'Стрижка когтей',
+                  'Рентген', 'Кастрация', 'Чипирование', 'Консультация']
+
+
+class Dataset(NamedTuple):
+    """Сгенерированные данные; ссылки между сущностями - по номерам в списках"""
+    spec: DatasetSpec
+    branches: list  # (name, address, phone)
+    vets: list  # (full_name, login, номер филиала)
+    services: list  # (title, description, price)
+    animals: list  # документы MongoDB
+    appointments: list  # (номер животного, номер врача, date, time, номер услуги, status)
+    date_from: date
+    date_to: date
+
+
+def _person(rng):
+    return f"{rng.choice(SURNAMES)} {rng.choice(INITIALS)}.{rng.choice(INITIALS)}."
+
+
+def _phone(rng):
+    return f"+7900{rng.randrange(10 ** 7):07d}"
+
+
+def _medical_history(rng, birth_date, today):
+    """История болезни: у большинства животных несколько записей, у немногих - десятки"""
+    size = min(int(rng.expovariate(1 / 3)), 40)
+    span = max((today - birth_date).days, 1)
+    records = []
+    for _ in range(size):
+        records.append({
+            'date': (birth_date + timedelta(days=rng.randrange(span))).isoformat(),
+            'symptoms': rng.choice(SYMPTOMS),
+            'diagnosis': rng.choice(DIAGNOSES),
+            'treatment': rng.choice(TREATMENTS),
+            'attachments': [f"scan{rng.randrange(100)}.jpg" for _ in range(rng.randrange(3))],
+        })
+    records.sort(key=lambda record: record['date'], reverse=True)
+    return records
+
+
+def _working_days(count):
+    days = []
+    day = START_DATE
+    while len(days) < count:
+        if day.isoweekday() <= 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def generate(spec):
+    """
+    Строит набор данных по размерам spec (одинаковый для одного seed).
+
+    Returns:
+        Dataset: Данные для загрузки
+    """
+    rng = random.Random(spec.seed)
+
+    branches = [
+        (f"Филиал {number}", f"ул. {rng.choice(SURNAMES)}а, {rng.randrange(1, 200)}", _phone(rng))
+        for number in range(1, spec.branches + 1)
+    ]
+    vets = [
+        (_person(rng), f"bench_vet_{branch}_{number}", branch)
+        for branch in range(spec.branches)
+        for number in range(spec.vets_per_branch)
+    ]
+    services = [
+        (f"{SERVICE_TITLES[number % len(SERVICE_TITLES)]} {number // len(SERVICE_TITLES) + 1}",
+         "Синтетическая услуга", round(rng.uniform(300, 5000), -1))
+        for number in range(spec.services)
+    ]
+
+    # Приёмы - случайные неповторяющиеся ячейки (врач, рабочий день, слот)
+    slots_per_vet_day = len(SLOT_STARTS)
+    day_count = max(1, -(-spec.appointments // int(len(vets) * slots_per_vet_day * BOOKING_DENSITY)))
+    days = _working_days(day_count)
+    today = days[len(days) * 3 // 4]  # Четверть приёмов - будущие
+    cells = len(vets) * len(days) * slots_per_vet_day
+    appointments = []
+    for cell in sorted(rng.sample(range(cells), min(spec.appointments, cells))):
+        vet, rest = divmod(cell, len(days) * slots_per_vet_day)
+        day_index, slot = divmod(rest, slots_per_vet_day)
+        day = days[day_index]
+        if day >= today:
+            status = 'запланирован'
+        else:
+            status = 'отменен' if rng.random() < 0.1 else 'завершен'
+        appointments.append((
+            rng.randrange(spec.animals), vet, day, SLOT_STARTS[slot], rng.randrange(spec.services), status
+        ))
+
+    animals = []
+    for _ in range(spec.animals):
+        species = rng.choice(list(SPECIES))
+        birth_date = today - timedelta(days=rng.randrange(180, 15 * 365))
+        animals.append({
+            '_id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'name': rng.choice(NAMES),
+            'species': species,
+            'breed': rng.choice(SPECIES[species]),
+            'birth_date': birth_date.isoformat(),
+            'sex': rng.choice('МЖ'),
+            'owner_name': _person(rng),
+            'owner_phone': _phone(rng),
+            'medical_history': _medical_history(rng, birth_date, today),
+        })
+
+    return Dataset(spec, branches, vets, services, animals, appointments, days[0], days[-1])
+
+
+RESET_SQL = """
+TRUNCATE Приёмы, Журнал_входа, Графики_работы, Исключения_графика, Доход_по_дням,
+         Сотрудники, Услуги, Филиалы
+RESTART IDENTITY CASCADE;
+"""
+
+
+def load(dataset, db_pg=None, db_mongo=None, reset=False, batch_size=LOAD_BATCH):
+    """
+    Загружает набор данных в PostgreSQL и MongoDB.
+
+    Args:
+        dataset (Dataset): Данные из generate()
+        db_pg (PostgresModels, optional): Модель PostgreSQL
+        db_mongo (MongoDBModels, optional): Модель MongoDB
+        reset (bool): Предварительно очистить таблицы и коллекцию
+        batch_size (int): Строк на пакет
+
+    Returns:
+        dict: Количество загруженных записей по сущностям
+            (приёмы - принятые bulk_insert_appointments)
+    """
+    db_pg = db_pg or PostgresModels()
+    db_mongo = db_mongo or MongoDBModels()
+    db_pg.create_tables()
+
+    with db_pg.db.connection() as conn:
+        with conn.cursor() as cur:
+            if reset:
+                cur.execute(RESET_SQL)
+            branch_ids = [row[0] for row in execute_values(
+                cur, "INSERT INTO Филиалы (name, address, phone) VALUES %s RETURNING id",
+                dataset.branches, fetch=True
+            )]
+            vet_ids = [row[0] for row in execute_values(
+                cur,
+                "INSERT INTO Сотрудники (full_name, login, password_hash, role, branch_id) VALUES %s RETURNING id",
+                [(name, login, 'bench', 'doctor', branch_ids[branch]) for name, login, branch in dataset.vets],
+                fetch=True
+            )]
+            service_ids = [row[0] for row in execute_values(
+                cur, "INSERT INTO Услуги (title, description, price) VALUES %s RETURNING id",
+                dataset.services, fetch=True
+            )]
+
+    if reset:
+        db_mongo.collection.delete_many({})
+    for start in range(0, len(dataset.animals), batch_size):
+        batch = [db_mongo._set_search_fields(dict(animal)) for animal in dataset.animals[start:start + batch_size]]
+        db_mongo.collection.insert_many(batch, ordered=False)
+    db_mongo.ensure_indexes()
+
+    animal_ids = [animal['_id'] for animal in dataset.animals]
+    accepted = 0
+    for start in range(0, len(dataset.appointments), batch_size):
+        batch = [
+            (animal_ids[animal], vet_ids[vet], day, at, service_ids[service], status)
+            for animal, vet, day, at, service, status in dataset.appointments[start:start + batch_size]
+        ]
+        accepted += sum(1 for result in db_pg.bulk_insert_appointments(batch) if result.ok)
+
+    return {
+        'branches': len(branch_ids),
+        'vets': len(vet_ids),
+        'services': len(service_ids),
+        'animals': len(animal_ids),
+        'appointments': accepted,
+    }
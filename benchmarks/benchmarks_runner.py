@@ -0,0 +1,223 @@
+# benchmarks_runner.py
+"""
+Замеры методов слоя данных на синтетических наборах разного размера.
+
+Для каждого размера набор генерируется и загружается заново (базы
+очищаются!), после чего каждый замер выполняется repeat раз; в отчёт
+JSON попадают минимум, медиана, среднее и максимум в миллисекундах.
+Отчёт можно сравнить с предыдущим (--compare): замеры, ставшие
+медленнее порога, выводятся, а код возврата - 1.
+
+Запуск из корня проекта:
+    python -m benchmarks.benchmarks_runner --sizes small,medium --reset --output bench.json
+    python -m benchmarks.benchmarks_runner --sizes small --reset --compare bench.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()  # До импорта моделей: настройки метрик читаются при импорте
+
+from benchmarks.benchmarks_data_generator import PRESETS, generate, load
+from database.database_models_mongo import MongoDBModels
+from database.database_models_pg import PostgresModels, year_range
+from logic.logic_reports_generator import ReportsGenerator
+
+
+REGRESSION_THRESHOLD = 1.25  # Во сколько раз медиана может вырасти без предупреждения
+
+
+class BenchContext:
+    """Модели и параметры запросов, выбранные по загруженному набору"""
+
+    def __init__(self, dataset):
+        self.pg = PostgresModels()
+        self.mongo = MongoDBModels()
+        self.reports = ReportsGenerator()
+        self.date_from = dataset.date_from
+        self.date_to = dataset.date_to
+        self.year = dataset.date_from.year
+        self.vet_id = 1
+        self.branch_id = 1
+        self.animal_ids = [animal['_id'] for animal in dataset.animals[:100]]
+        self.diagnosis = 'гастрит'
+        first = dataset.appointments[0] if dataset.appointments else None
+        self.busy_day = first[2] if first else dataset.date_from
+        self.busy_time = first[3] if first else None
+
+
+def _consume(rows):
+    count = 0
+    for _row in rows:
+        count += 1
+    return count
+
+
+# Замеры: имя -> функция(контекст); только чтение, данные не меняются
+CASES = {
+    # PostgreSQL
+    'pg.get_financial_stats': lambda c: c.pg.get_financial_stats(c.date_from, c.date_to),
+    'pg.get_monthly_stats': lambda c: c.pg.get_monthly_stats(c.year),
+    'pg.get_revenue_by_period': lambda c: c.pg.get_revenue_by_period(
+        [(year, *year_range(year)) for year in range(c.year, c.date_to.year + 1)]),
+    'pg.get_vet_bookings': lambda c: c.pg.get_vet_bookings(c.date_from, c.date_to),
+    'pg.get_appointments_by_date': lambda c: c.pg.get_appointments_by_date(c.busy_day),
+    'pg.get_day_view': lambda c: c.pg.get_day_view(c.busy_day),
+    'pg.get_appointments_by_doctor': lambda c: c.pg.get_appointments_by_doctor(c.vet_id, c.date_from, c.date_to),
+    'pg.check_vet_availability': lambda c: c.pg.check_vet_availability(c.vet_id, c.busy_day, c.busy_time),
+    'pg.get_branch_doctors': lambda c: c.pg.get_branch_doctors(c.branch_id),
+    'pg.count_appointments': lambda c: c.pg.count_appointments(c.date_from, c.date_to),
+    'pg.iter_appointments': lambda c: _consume(c.pg.iter_appointments(c.date_from, c.date_to)),
+    # MongoDB
+    'mongo.get_animals_page': lambda c: c.mongo.get_animals_page(limit=100),
+    'mongo.search_animals_by_field.name': lambda c: c.mongo.search_animals_by_field('name', 'бар'),
+    'mongo.search_animals_by_field.owner_phone': lambda c: c.mongo.search_animals_by_field('owner_phone', '+79001'),
+    'mongo.get_animal_names': lambda c: c.mongo.get_animal_names(c.animal_ids),
+    'mongo.get_animals_by_diagnosis': lambda c: c.mongo.get_animals_by_diagnosis(c.diagnosis),
+    'mongo.get_all_diagnoses': lambda c: c.mongo.get_all_diagnoses(),
+    'mongo.estimate_animals_count': lambda c: c.mongo.estimate_animals_count({'species': 'Кошка'}),
+    # Отчёты
+    'reports.appointments': lambda c: c.reports.generate_appointments_report(c.date_from, c.date_to),
+    'reports.animals_by_diagnosis': lambda c: c.reports.generate_animals_by_diagnosis(c.diagnosis),
+    'reports.services_by_doctor': lambda c: c.reports.generate_services_by_doctor(c.vet_id, c.date_from, c.date_to),
+    'reports.finance': lambda c: c.reports.generate_finance_report(c.date_from, c.date_to),
+    'reports.monthly_stats': lambda c: c.reports.generate_monthly_stats_report(c.year),
+    'reports.year_over_year': lambda c: c.reports.generate_year_over_year_report([c.year, c.year + 1]),
+}
+
+
+def measure(fn, context, repeat):
+    """Время выполнения fn(context) в миллисекундах (после одного прогрева)"""
+    fn(context)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(context)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'repeat': repeat,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(sizes, repeat=5, cases=None, seed=None):
+    """
+    Генерирует, загружает и замеряет наборы указанных размеров.
+
+    Returns:
+        dict: Отчёт (см. write_report)
+    """
+    selected = {name: fn for name, fn in CASES.items() if not cases or any(name.startswith(c) for c in cases)}
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'sizes': {},
+    }
+    for size in sizes:
+        spec = PRESETS[size]
+        if seed is not None:
+            spec = spec._replace(seed=seed)
+        print(f"[{size}] генерация {spec}")
+        started = time.perf_counter()
+        dataset = generate(spec)
+        generated = time.perf_counter() - started
+
+        print(f"[{size}] загрузка")
+        started = time.perf_counter()
+        loaded = load(dataset, reset=True)
+        load_seconds = time.perf_counter() - started
+
+        context = BenchContext(dataset)
+        results = {}
+        for name, fn in selected.items():
+            results[name] = measure(fn, context, repeat)
+            print(f"[{size}] {name}: {results[name]['median_ms']} мс")
+
+        report['sizes'][size] = {
+            'spec': spec._asdict(),
+            'loaded': loaded,
+            'generate_seconds': round(generated, 3),
+            'load_seconds': round(load_seconds, 3),
+            'cases': results,
+        }
+    return report
+
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Замеры, медиана которых выросла больше чем в threshold раз.
+
+    Returns:
+        list: (размер, замер, медиана было, медиана стало)
+    """
+    regressions = []
+    for size, current in report['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size, {}).get('cases', {})
+        for name, stats in current['cases'].items():
+            before = previous.get(name)
+            if before and before['median_ms'] > 0 and stats['median_ms'] / before['median_ms'] > threshold:
+                regressions.append((size, name, before['median_ms'], stats['median_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры слоя данных на синтетических данных")
+    parser.add_argument('--sizes', default='small', help=f"Размеры через запятую: {', '.join(PRESETS)}")
+    parser.add_argument('--repeat', type=int, default=5, help="Повторов каждого замера")
+    parser.add_argument('--cases', default='', help="Префиксы замеров через запятую (например, pg.,reports.)")
+    parser.add_argument('--seed', type=int, default=None, help="Зерно генератора")
+    parser.add_argument('--output', default='benchmark_report.json', help="Файл отчёта JSON")
+    parser.add_argument('--compare', default=None, help="Отчёт для сравнения")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Допустимый рост медианы (во сколько раз)")
+    parser.add_argument('--reset', action='store_true',
+                        help="Подтверждение: таблицы и коллекция будут очищены")
+    args = parser.parse_args(argv)
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in PRESETS]
+    if unknown:
+        parser.error(f"Неизвестные размеры: {', '.join(unknown)}")
+    if not args.reset:
+        parser.error("Замеры очищают базы из .env - запускайте на отдельных базах с флагом --reset")
+
+    cases = [case.strip() for case in args.cases.split(',') if case.strip()]
+    report = run(sizes, args.repeat, cases, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Отчёт сохранён: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.threshold)
+        for size, name, before, after in regressions:
+            print(f"[{size}] {name}: {before} мс -> {after} мс (x{after / before:.2f})")
+        if regressions:
+            return 1
+        print("Регрессий не найдено")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# database_events.py
+"""
+События изменения данных.
+
+Модели публикуют событие (сущность, ID, операция) после успешной
+фиксации изменения; подписчики (например, шина событий интерфейса)
+получают его в потоке, где произошла запись. Модуль не зависит от Qt.
+"""
+import logging
+import threading
+from typing import NamedTuple
+
+
+logger = logging.getLogger(__name__)
+
+
+# Сущности
+ANIMAL = 'animal'
+APPOINTMENT = 'appointment'
+SERVICE = 'service'
+BRANCH = 'branch'
+EMPLOYEE = 'employee'
+SCHEDULE = 'schedule'  # Графики работы и исключения
+
+# Операции
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+
+
+class DataEvent(NamedTuple):
+    entity: str  # Сущность: ANIMAL, APPOINTMENT, ...
+    id: object  # ID изменённой записи
+    op: str  # Операция: INSERT, UPDATE или DELETE
+    # Связанные ID, затронутые изменением (для приёма - врачи до и после
+    # изменения); None - неизвестно
+    related: tuple = None
+
+
+_subscribers = []
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(callback):
+    """Подписывает callback(event) на все события"""
+    with _subscribers_lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+
+
+def unsubscribe(callback):
+    with _subscribers_lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def publish(entity, entity_id, op, related=None):
+    """Рассылает событие подписчикам; ошибка подписчика не влияет на запись"""
+    event = DataEvent(entity, entity_id, op, tuple(related) if related is not None else None)
+    with _subscribers_lock:
+        subscribers = list(_subscribers)
+    for callback in subscribers:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика события {event}: {e}")
+    return event
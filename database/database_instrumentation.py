@@ -0,0 +1,459 @@
+# database_instrumentation.py
+"""
+Метрики обращений к базам данных.
+
+Методы моделей оборачиваются декоратором instrument_class: для каждого
+метода считаются вызовы, ошибки, гистограмма времени, строки, полученные
+из PostgreSQL, документы, полученные из MongoDB, число обращений к
+серверу (execute / команды MongoDB) и время ожидания соединения из пула.
+Обращения учитываются во всех вложенных вызовах: если метод вызывает
+другой метод модели, обращения попадают в метрики обоих.
+
+Счётчики собирают:
+    - InstrumentedCursor - курсор psycopg2 (cursor_factory соединений пула);
+    - MongoCommandListener - слушатель команд pymongo;
+    - record_acquire - пул соединений PostgreSQL.
+MongoDB не сообщает слушателям команд docsExamined, поэтому для неё
+учитываются документы в ответах сервера (firstBatch / nextBatch).
+
+snapshot() возвращает текущие метрики, а start_periodic_dump() раз в
+interval секунд записывает их в файл JSON или в текстовом формате
+Prometheus. Переменные окружения читаются при импорте модуля, поэтому
+.env загружается раньше (в начале main.py):
+    VET_METRICS=0 - не оборачивать методы (метрики выключены);
+    VET_METRICS_FILE - файл периодической выгрузки;
+    VET_METRICS_FORMAT - json (по умолчанию) или prometheus;
+    VET_METRICS_INTERVAL - период выгрузки в секундах (по умолчанию 60);
+    VET_LOG_SLOW_MS - вызовы методов дольше порога пишутся в журнал
+        предупреждением (по умолчанию 500), остальные - на уровне DEBUG.
+"""
+import bisect
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from psycopg2 import extensions
+from pymongo import monitoring
+
+
+logger = logging.getLogger(__name__)
+
+
+ENABLED = os.getenv("VET_METRICS", "1") != "0"
+SLOW_CALL_MS = float(os.getenv("VET_LOG_SLOW_MS", "500"))
+
+# Верхние границы корзин гистограммы времени, мс
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class MethodStats:
+    """Метрики одного метода (или одной команды)"""
+
+    __slots__ = ('calls', 'errors', 'total_ms', 'max_ms', 'buckets',
+                 'rows', 'round_trips', 'acquire_ms', 'docs')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)  # Последняя корзина - +Inf
+        self.rows = 0
+        self.round_trips = 0
+        self.acquire_ms = 0.0
+        self.docs = 0
+
+    def observe(self, elapsed_ms, failed=False):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+
+    def as_dict(self):
+        cumulative = 0
+        histogram = {}
+        for bound, count in zip(BUCKETS_MS + ('+Inf',), self.buckets):
+            cumulative += count
+            histogram[str(bound)] = cumulative
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'total_ms': round(self.total_ms, 3),
+            'mean_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'histogram_ms': histogram,
+            'rows': self.rows,
+            'round_trips': self.round_trips,
+            'acquire_ms': round(self.acquire_ms, 3),
+            'docs': self.docs,
+        }
+
+
+class _Frame:
+    """Счётчики выполняющегося вызова метода"""
+
+    __slots__ = ('rows', 'round_trips', 'acquire_ms', 'docs')
+
+    def __init__(self):
+        self.rows = 0
+        self.round_trips = 0
+        self.acquire_ms = 0.0
+        self.docs = 0
+
+
+_stats = {}  # имя метода -> MethodStats
+_stats_lock = threading.Lock()
+_local = threading.local()
+_observers = []  # Функции observer(name, elapsed_ms, failed, frame)
+
+
+def _frames():
+    frames = getattr(_local, 'frames', None)
+    if frames is None:
+        frames = _local.frames = []
+    return frames
+
+
+def _add(field, value):
+    """Добавляет значение ко всем выполняющимся вызовам потока"""
+    for frame in _frames():
+        setattr(frame, field, getattr(frame, field) + value)
+
+
+def _record(name, elapsed_ms, failed=False, frame=None):
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = MethodStats()
+        stats.observe(elapsed_ms, failed)
+        if frame is not None:
+            stats.rows += frame.rows
+            stats.round_trips += frame.round_trips
+            stats.acquire_ms += frame.acquire_ms
+            stats.docs += frame.docs
+    if frame is not None:
+        _log_call(name, elapsed_ms, failed, frame)
+    for observer in _observers:
+        observer(name, elapsed_ms, failed, frame)
+
+
+def _log_call(name, elapsed_ms, failed, frame):
+    """Запись о вызове метода модели: медленные - предупреждением"""
+    level = logging.WARNING if elapsed_ms >= SLOW_CALL_MS else logging.DEBUG
+    if not logger.isEnabledFor(level):
+        return
+    entity, _, op = name.partition('.')
+    logger.log(level, f"{'Медленный вызов' if level == logging.WARNING else 'Вызов'} {name}", extra={
+        'entity': entity, 'op': op, 'duration_ms': round(elapsed_ms, 3),
+        'rows': frame.rows, 'docs': frame.docs, 'round_trips': frame.round_trips, 'failed': failed,
+    })
+
+
+def add_observer(observer):
+    """
+    Подписывает observer(name, elapsed_ms, failed, frame) на каждое измерение:
+    вызовы методов моделей (frame - счётчики вызова), обращения к серверу
+    ('pg.execute', 'mongo.cmd.*') и ожидание пула ('pg.pool.acquire', frame=None).
+    Вызывается в потоке, где выполнялось обращение, сразу после его окончания.
+    """
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+# --- Точки сбора ---
+
+def record_acquire(elapsed_seconds):
+    """Время ожидания соединения из пула PostgreSQL"""
+    elapsed_ms = elapsed_seconds * 1000
+    _add('acquire_ms', elapsed_ms)
+    _record('pg.pool.acquire', elapsed_ms)
+
+
+class InstrumentedCursor(extensions.cursor):
+    """Курсор psycopg2, считающий обращения к серверу и полученные строки"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            _add('round_trips', 1)
+            _record('pg.execute', (time.perf_counter() - started) * 1000, failed)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            _add('round_trips', 1)
+            _record('pg.execute', (time.perf_counter() - started) * 1000, failed)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            _add('rows', 1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _add('rows', len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        _add('rows', len(rows))
+        return rows
+
+    def __iter__(self):
+        # Итерация C-курсора (для именованных курсоров - порциями по itersize)
+        while True:
+            try:
+                row = extensions.cursor.__next__(self)
+            except StopIteration:
+                return
+            _add('rows', 1)
+            yield row
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Слушатель команд pymongo: время, обращения и документы в ответах"""
+
+    def __init__(self):
+        self._started = {}  # request_id -> (кадры вызывающего потока)
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        # Команда стартует в потоке вызова - запоминаем его кадры
+        with self._lock:
+            self._started[event.request_id] = list(_frames())
+
+    def succeeded(self, event):
+        frames = self._pop(event.request_id)
+        reply = event.reply or {}
+        cursor = reply.get('cursor') or {}
+        docs = len(cursor.get('firstBatch') or cursor.get('nextBatch') or ())
+        for frame in frames:
+            frame.round_trips += 1
+            frame.docs += docs
+        _record(f'mongo.cmd.{event.command_name}', event.duration_micros / 1000)
+
+    def failed(self, event):
+        for frame in self._pop(event.request_id):
+            frame.round_trips += 1
+        _record(f'mongo.cmd.{event.command_name}', event.duration_micros / 1000, failed=True)
+
+    def _pop(self, request_id):
+        with self._lock:
+            return self._started.pop(request_id, ())
+
+
+_mongo_listener = MongoCommandListener()
+
+
+def mongo_event_listeners():
+    """Слушатели для MongoClient(event_listeners=...)"""
+    return [_mongo_listener] if ENABLED else []
+
+
+def cursor_factory():
+    """cursor_factory для psycopg2.connect (None - курсор по умолчанию)"""
+    return InstrumentedCursor if ENABLED else None
+
+
+# --- Декораторы ---
+
+def instrumented(name):
+    """Декоратор метода: метрики под именем name"""
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                # Генератор выгрузки: замер от первого запроса до исчерпания
+                frame = _Frame()
+                started = time.perf_counter()
+                failed = True
+                iterator = None
+                try:
+                    iterator = fn(*args, **kwargs)
+                    while True:
+                        _frames().append(frame)
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            failed = False
+                            return
+                        finally:
+                            _frames().remove(frame)
+                        yield item
+                except GeneratorExit:
+                    # Потребитель остановил выгрузку - это не ошибка
+                    failed = False
+                    raise
+                finally:
+                    if iterator is not None:
+                        iterator.close()
+                    _record(name, (time.perf_counter() - started) * 1000, failed, frame)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            frame = _Frame()
+            frames = _frames()
+            frames.append(frame)
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                frames.pop()
+                _record(name, (time.perf_counter() - started) * 1000, failed, frame)
+        return wrapper
+    return decorator
+
+
+def instrument_class(prefix):
+    """
+    Декоратор класса: оборачивает открытые методы (без '_' в начале,
+    кроме staticmethod и classmethod) в instrumented(f'{prefix}.{имя}').
+    При VET_METRICS=0 класс не меняется.
+    """
+    def decorator(cls):
+        if not ENABLED:
+            return cls
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or not inspect.isfunction(value):
+                continue
+            setattr(cls, attr, instrumented(f'{prefix}.{attr}')(value))
+        return cls
+    return decorator
+
+
+# --- Выгрузка ---
+
+def snapshot():
+    """
+    Текущие метрики.
+
+    Returns:
+        dict: {имя: {calls, errors, total_ms, mean_ms, max_ms, histogram_ms
+            (накопительно по верхним границам), rows, round_trips, acquire_ms, docs}}
+    """
+    with _stats_lock:
+        return {name: stats.as_dict() for name, stats in sorted(_stats.items())}
+
+
+def reset():
+    """Сбрасывает накопленные метрики"""
+    with _stats_lock:
+        _stats.clear()
+
+
+def _label(name):
+    return name.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def to_prometheus(metrics=None):
+    """Метрики в текстовом формате Prometheus (время - в секундах)"""
+    metrics = snapshot() if metrics is None else metrics
+    lines = [
+        "# HELP vet_db_call_duration_seconds Время вызова метода модели",
+        "# TYPE vet_db_call_duration_seconds histogram",
+    ]
+    for name, stats in metrics.items():
+        method = _label(name)
+        for bound, count in stats['histogram_ms'].items():
+            le = bound if bound == '+Inf' else repr(int(bound) / 1000)
+            lines.append(f'vet_db_call_duration_seconds_bucket{{method="{method}",le="{le}"}} {count}')
+        lines.append(f'vet_db_call_duration_seconds_sum{{method="{method}"}} {stats["total_ms"] / 1000}')
+        lines.append(f'vet_db_call_duration_seconds_count{{method="{method}"}} {stats["calls"]}')
+
+    counters = (
+        ('vet_db_call_errors_total', 'errors', "Вызовы, завершившиеся исключением"),
+        ('vet_db_rows_total', 'rows', "Строки, полученные из PostgreSQL"),
+        ('vet_db_round_trips_total', 'round_trips', "Обращения к серверу баз данных"),
+        ('vet_db_docs_total', 'docs', "Документы в ответах MongoDB"),
+    )
+    for metric, field, help_text in counters:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name, stats in metrics.items():
+            lines.append(f'{metric}{{method="{_label(name)}"}} {stats[field]}')
+    lines.append("# HELP vet_db_acquire_seconds_total Ожидание соединения из пула")
+    lines.append("# TYPE vet_db_acquire_seconds_total counter")
+    for name, stats in metrics.items():
+        lines.append(f'vet_db_acquire_seconds_total{{method="{_label(name)}"}} {stats["acquire_ms"] / 1000}')
+    return "\n".join(lines) + "\n"
+
+
+def dump(path, fmt='json'):
+    """Записывает метрики в файл (атомарно: через временный файл)"""
+    metrics = snapshot()
+    if fmt == 'prometheus':
+        content = to_prometheus(metrics)
+    else:
+        content = json.dumps({'timestamp': time.time(), 'metrics': metrics}, ensure_ascii=False, indent=2)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+    os.replace(tmp_path, path)
+
+
+_dump_stop = None
+
+
+def start_periodic_dump(path, interval=60, fmt='json'):
+    """
+    Запускает фоновую выгрузку метрик в файл раз в interval секунд.
+
+    Returns:
+        threading.Event: Установка события останавливает выгрузку
+    """
+    global _dump_stop
+    stop_periodic_dump()
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                dump(path, fmt)
+            except Exception as e:
+                logger.error(f"Ошибка выгрузки метрик: {e}")
+        dump(path, fmt)
+
+    threading.Thread(target=loop, name="metrics-dump", daemon=True).start()
+    _dump_stop = stop
+    return stop
+
+
+def stop_periodic_dump():
+    """Останавливает фоновую выгрузку (с последней записью файла)"""
+    global _dump_stop
+    if _dump_stop is not None:
+        _dump_stop.set()
+        _dump_stop = None
+
+
+def start_from_env():
+    """Включает периодическую выгрузку, если задан VET_METRICS_FILE"""
+    path = os.getenv("VET_METRICS_FILE")
+    if not ENABLED or not path:
+        return None
+    return start_periodic_dump(
+        path,
+        interval=float(os.getenv("VET_METRICS_INTERVAL", "60")),
+        fmt=os.getenv("VET_METRICS_FORMAT", "json"),
+    )
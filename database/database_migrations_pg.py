@@ -0,0 +1,350 @@
+# database_migrations_pg.py
+"""
+Версионные миграции схемы PostgreSQL.
+
+Каждая миграция - упорядоченный набор идемпотентных шагов up/down.
+Применённые версии хранятся в таблице Миграции_схемы; каждая миграция
+выполняется в отдельной транзакции под advisory-блокировкой, поэтому
+одновременный запуск нескольких копий приложения безопасен.
+"""
+import logging
+
+from database.database_postgres_connector import PostgresConnector
+
+
+logger = logging.getLogger(__name__)
+
+
+# Произвольный ключ advisory-блокировки для миграций
+MIGRATIONS_LOCK_KEY = 72_450_001
+
+
+class Migration:
+    def __init__(self, version, name, up, down):
+        """
+        Args:
+            version (int): Номер версии (строго возрастает)
+            name (str): Краткое название
+            up (list): SQL-команды применения
+            down (list): SQL-команды отката
+        """
+        self.version = version
+        self.name = name
+        self.up = up
+        self.down = down
+
+
+MIGRATIONS = [
+    Migration(
+        1, "appointment_indexes",
+        up=[
+            # День в расписании: WHERE date = ... ORDER BY time
+            """
+            CREATE INDEX IF NOT EXISTS idx_appointments_date_time
+                ON Приёмы (date, time);
+            """,
+            # Приёмы врача за период и проверка занятости врача
+            """
+            CREATE INDEX IF NOT EXISTS idx_appointments_vet_date
+                ON Приёмы (vet_id, date) INCLUDE (time, status);
+            """,
+            # Финансовые отчёты учитывают только завершённые приёмы
+            """
+            CREATE INDEX IF NOT EXISTS idx_appointments_completed_date
+                ON Приёмы (date) INCLUDE (vet_id, service_id)
+                WHERE status = 'завершен';
+            """,
+            # Списки приёмов с фильтром по статусу
+            """
+            CREATE INDEX IF NOT EXISTS idx_appointments_status_date
+                ON Приёмы (status, date, time);
+            """,
+            "ANALYZE Приёмы;",
+        ],
+        down=[
+            "DROP INDEX IF EXISTS idx_appointments_status_date;",
+            "DROP INDEX IF EXISTS idx_appointments_completed_date;",
+            "DROP INDEX IF EXISTS idx_appointments_vet_date;",
+            "DROP INDEX IF EXISTS idx_appointments_date_time;",
+        ],
+    ),
+    Migration(
+        2, "schedules_and_service_durations",
+        up=[
+            # Шаблоны рабочего времени: филиала (vet_id IS NULL) или врача;
+            # несколько строк на день недели - несколько смен
+            """
+            CREATE TABLE IF NOT EXISTS Графики_работы (
+                id SERIAL PRIMARY KEY,
+                branch_id INTEGER REFERENCES Филиалы(id) ON DELETE CASCADE,
+                vet_id INTEGER REFERENCES Сотрудники(id) ON DELETE CASCADE,
+                weekday SMALLINT NOT NULL CHECK (weekday BETWEEN 1 AND 7),
+                start_time TIME NOT NULL,
+                end_time TIME NOT NULL,
+                slot_minutes SMALLINT NOT NULL DEFAULT 30 CHECK (slot_minutes > 0),
+                CHECK (start_time < end_time),
+                CHECK (branch_id IS NOT NULL OR vet_id IS NOT NULL)
+            );
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_schedules_branch
+                ON Графики_работы (branch_id) WHERE vet_id IS NULL;
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_schedules_vet
+                ON Графики_работы (vet_id) WHERE vet_id IS NOT NULL;
+            """,
+            # Исключения на дату: праздники и выходные (время не указано)
+            # или особые часы; без филиала и врача - для всей клиники
+            """
+            CREATE TABLE IF NOT EXISTS Исключения_графика (
+                id SERIAL PRIMARY KEY,
+                branch_id INTEGER REFERENCES Филиалы(id) ON DELETE CASCADE,
+                vet_id INTEGER REFERENCES Сотрудники(id) ON DELETE CASCADE,
+                date DATE NOT NULL,
+                start_time TIME,
+                end_time TIME,
+                slot_minutes SMALLINT NOT NULL DEFAULT 30 CHECK (slot_minutes > 0),
+                reason TEXT,
+                CHECK ((start_time IS NULL AND end_time IS NULL) OR start_time < end_time)
+            );
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_schedule_exceptions_date
+                ON Исключения_графика (date);
+            """,
+            # Длительность услуги - для проверки пересечения приёмов
+            """
+            ALTER TABLE Услуги
+                ADD COLUMN IF NOT EXISTS duration_minutes INTEGER NOT NULL DEFAULT 30
+                CHECK (duration_minutes > 0);
+            """,
+            # Точное совпадение времени заменяется проверкой пересечения
+            # интервалов с учётом длительности (PostgresModels)
+            "ALTER TABLE Приёмы DROP CONSTRAINT IF EXISTS unique_appointment;",
+        ],
+        down=[
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'unique_appointment') THEN
+                    ALTER TABLE Приёмы ADD CONSTRAINT unique_appointment UNIQUE (vet_id, date, time);
+                END IF;
+            END $$;
+            """,
+            "ALTER TABLE Услуги DROP COLUMN IF EXISTS duration_minutes;",
+            "DROP TABLE IF EXISTS Исключения_графика;",
+            "DROP TABLE IF EXISTS Графики_работы;",
+        ],
+    ),
+    Migration(
+        3, "daily_revenue_rollup",
+        up=[
+            # Завершённые приёмы и доход по дням: (дата, врач, услуга),
+            # филиал - филиал врача на момент завершения приёма.
+            # Доход считается по текущей цене услуги, как и раньше в отчётах
+            """
+            CREATE TABLE IF NOT EXISTS Доход_по_дням (
+                date DATE NOT NULL,
+                vet_id INTEGER NOT NULL,
+                service_id INTEGER NOT NULL,
+                branch_id INTEGER,
+                completed_count INTEGER NOT NULL DEFAULT 0,
+                income NUMERIC(14, 2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (date, vet_id, service_id)
+            );
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_revenue_branch_date
+                ON Доход_по_дням (branch_id, date);
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_revenue_vet_date
+                ON Доход_по_дням (vet_id, date);
+            """,
+            # Инкрементальное обновление при переходах статуса приёма
+            """
+            CREATE OR REPLACE FUNCTION revenue_rollup_apply() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE'
+                   AND OLD.status IS NOT DISTINCT FROM NEW.status
+                   AND OLD.date = NEW.date
+                   AND OLD.vet_id = NEW.vet_id
+                   AND OLD.service_id = NEW.service_id THEN
+                    RETURN NULL;
+                END IF;
+
+                IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'завершен' THEN
+                    UPDATE Доход_по_дням r
+                    SET completed_count = r.completed_count - 1,
+                        income = r.income - s.price
+                    FROM Услуги s
+                    WHERE s.id = OLD.service_id
+                      AND r.date = OLD.date AND r.vet_id = OLD.vet_id AND r.service_id = OLD.service_id;
+
+                    DELETE FROM Доход_по_дням
+                    WHERE date = OLD.date AND vet_id = OLD.vet_id AND service_id = OLD.service_id
+                      AND completed_count <= 0;
+                END IF;
+
+                IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'завершен' THEN
+                    INSERT INTO Доход_по_дням (date, vet_id, service_id, branch_id, completed_count, income)
+                    SELECT NEW.date, NEW.vet_id, NEW.service_id,
+                           (SELECT branch_id FROM Сотрудники WHERE id = NEW.vet_id),
+                           1, s.price
+                    FROM Услуги s
+                    WHERE s.id = NEW.service_id
+                    ON CONFLICT (date, vet_id, service_id) DO UPDATE
+                    SET completed_count = Доход_по_дням.completed_count + 1,
+                        income = Доход_по_дням.income + EXCLUDED.income;
+                END IF;
+
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            "DROP TRIGGER IF EXISTS trg_revenue_rollup ON Приёмы;",
+            """
+            CREATE TRIGGER trg_revenue_rollup
+                AFTER INSERT OR UPDATE OR DELETE ON Приёмы
+                FOR EACH ROW EXECUTE FUNCTION revenue_rollup_apply();
+            """,
+            # Изменение цены услуги пересчитывает её доход (доход = количество x цена)
+            """
+            CREATE OR REPLACE FUNCTION revenue_rollup_reprice() RETURNS trigger AS $$
+            BEGIN
+                UPDATE Доход_по_дням
+                SET income = completed_count * NEW.price
+                WHERE service_id = NEW.id;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+            """,
+            "DROP TRIGGER IF EXISTS trg_revenue_rollup_reprice ON Услуги;",
+            """
+            CREATE TRIGGER trg_revenue_rollup_reprice
+                AFTER UPDATE OF price ON Услуги
+                FOR EACH ROW
+                WHEN (OLD.price IS DISTINCT FROM NEW.price)
+                EXECUTE FUNCTION revenue_rollup_reprice();
+            """,
+            # Начальное заполнение по существующим приёмам
+            "LOCK TABLE Доход_по_дням IN SHARE ROW EXCLUSIVE MODE;",
+            "DELETE FROM Доход_по_дням;",
+            """
+            INSERT INTO Доход_по_дням (date, vet_id, service_id, branch_id, completed_count, income)
+            SELECT a.date, a.vet_id, a.service_id, e.branch_id, COUNT(*), SUM(s.price)
+            FROM Приёмы a
+            JOIN Услуги s ON s.id = a.service_id
+            JOIN Сотрудники e ON e.id = a.vet_id
+            WHERE a.status = 'завершен'
+            GROUP BY a.date, a.vet_id, a.service_id, e.branch_id;
+            """,
+            "ANALYZE Доход_по_дням;",
+        ],
+        down=[
+            "DROP TRIGGER IF EXISTS trg_revenue_rollup_reprice ON Услуги;",
+            "DROP TRIGGER IF EXISTS trg_revenue_rollup ON Приёмы;",
+            "DROP FUNCTION IF EXISTS revenue_rollup_reprice();",
+            "DROP FUNCTION IF EXISTS revenue_rollup_apply();",
+            "DROP TABLE IF EXISTS Доход_по_дням;",
+        ],
+    ),
+]
+
+
+class MigrationRunner:
+    """Применяет и откатывает миграции из списка MIGRATIONS"""
+
+    def __init__(self, connector=None, migrations=None):
+        self.db = connector or PostgresConnector()
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+
+        versions = [m.version for m in self.migrations]
+        if len(versions) != len(set(versions)):
+            raise ValueError("Повторяющиеся номера версий миграций")
+
+    @staticmethod
+    def _prepare(cur):
+        """Берёт блокировку миграций и создаёт служебную таблицу при необходимости"""
+        cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATIONS_LOCK_KEY,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS Миграции_схемы (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+    @staticmethod
+    def _applied_versions(cur):
+        cur.execute("SELECT version FROM Миграции_схемы;")
+        return {row[0] for row in cur.fetchall()}
+
+    def applied_versions(self):
+        """Возвращает множество применённых версий"""
+        with self.db.connection() as conn:
+            with conn.cursor() as cur:
+                self._prepare(cur)
+                versions = self._applied_versions(cur)
+            conn.commit()
+        return versions
+
+    def current_version(self):
+        """Возвращает максимальную применённую версию (0 - миграций не было)"""
+        return max(self.applied_versions(), default=0)
+
+    def migrate(self, target_version=None):
+        """
+        Применяет недостающие миграции по возрастанию версий.
+
+        Args:
+            target_version (int, optional): До какой версии включительно (по умолчанию - до последней)
+
+        Returns:
+            list: Номера применённых версий
+        """
+        applied = []
+        for migration in self.migrations:
+            if target_version is not None and migration.version > target_version:
+                break
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    self._prepare(cur)
+                    # Проверяем под блокировкой: другая копия могла успеть раньше
+                    if migration.version in self._applied_versions(cur):
+                        continue
+                    for command in migration.up:
+                        cur.execute(command)
+                    cur.execute(
+                        "INSERT INTO Миграции_схемы (version, name) VALUES (%s, %s);",
+                        (migration.version, migration.name)
+                    )
+                conn.commit()
+            applied.append(migration.version)
+            logger.info(f"Применена миграция {migration.version}: {migration.name}")
+        return applied
+
+    def rollback(self, target_version=0):
+        """
+        Откатывает миграции с версией больше target_version по убыванию.
+
+        Returns:
+            list: Номера откаченных версий
+        """
+        rolled_back = []
+        for migration in reversed(self.migrations):
+            if migration.version <= target_version:
+                break
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    self._prepare(cur)
+                    if migration.version not in self._applied_versions(cur):
+                        continue
+                    for command in migration.down:
+                        cur.execute(command)
+                    cur.execute("DELETE FROM Миграции_схемы WHERE version = %s;", (migration.version,))
+                conn.commit()
+            rolled_back.append(migration.version)
+            logger.info(f"Откачена миграция {migration.version}: {migration.name}")
+        return rolled_back
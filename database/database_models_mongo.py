@@ -1,10 +1,61 @@
 # database_models_mongo.py
+import logging
 from database.database_mongodb_connector import MongoDBConnector
+from database import database_events as events
+from database.database_instrumentation import instrument_class
 from bson.objectid import ObjectId
+from pymongo import ASCENDING, IndexModel, UpdateOne
 from datetime import datetime
+import re
+import threading
 import uuid
 
 
+logger = logging.getLogger(__name__)
+
+
+# Нормализованные (в нижнем регистре) копии полей для регистронезависимого
+# поиска по индексу: $regex с опцией 'i' индекс эффективно не использует
+SEARCH_FIELDS = {
+    'name': 'name_lower',
+    'owner_name': 'owner_name_lower',
+}
+
+# Установлено, когда нормализованные поля заполнены у всех документов;
+# до этого поиск по имени идёт регистронезависимым $regex по исходному полю
+_search_fields_ready = threading.Event()
+
+ANIMAL_INDEXES = [
+    IndexModel([('medical_history.diagnosis', ASCENDING)], name='idx_diagnosis'),
+    IndexModel([('owner_phone', ASCENDING)], name='idx_owner_phone'),
+    IndexModel([('name_lower', ASCENDING)], name='idx_name_lower'),
+    IndexModel([('owner_name_lower', ASCENDING)], name='idx_owner_name_lower'),
+]
+
+
+# Поля, которые показываются в таблице животных
+TABLE_PROJECTION = {
+    'name': 1,
+    'species': 1,
+    'breed': 1,
+    'owner_name': 1,
+    'owner_phone': 1,
+}
+
+
+# Поля для выбора животного в списке (диалог приёма)
+CHOICE_PROJECTION = {
+    'name': 1,
+    'owner_name': 1,
+}
+
+
+def normalize_search_text(text):
+    """Приводит строку к виду, в котором хранятся нормализованные поля"""
+    return str(text or '').strip().lower()
+
+
+@instrument_class('mongo')
 class MongoDBModels:
     def __init__(self):
         self.db = MongoDBConnector()
@@ -25,12 +76,15 @@ class MongoDBModels:
 
             # Добавляем timestamp создания
             animal_data['created_at'] = datetime.now()
+            self._set_search_fields(animal_data)
 
             result = self.collection.insert_one(animal_data)
-            print(f"Создано животное с ID: {result.inserted_id}")
+            logger.info(f"Создано животное с ID: {result.inserted_id}",
+                        extra={'entity': 'animal', 'op': 'insert', 'id': result.inserted_id})
+            events.publish(events.ANIMAL, animal_data['_id'], events.INSERT)
             return animal_data['_id']
         except Exception as e:
-            print(f"Ошибка при создании животного: {e}")
+            logger.error(f"Ошибка при создании животного: {e}")
             return None
 
     def get_animal_by_id(self, animal_id):
@@ -44,9 +98,26 @@ class MongoDBModels:
             animal = self.collection.find_one({'_id': animal_id})
             return animal
         except Exception as e:
-            print(f"Ошибка при получении животного по ID: {e}")
+            logger.error(f"Ошибка при получении животного по ID: {e}")
             return None
 
+    def get_animal_names(self, animal_ids):
+        """
+        Получение имён животных одним запросом
+
+        :param animal_ids: список строковых ID животных
+        :return: словарь {ID: имя}
+        """
+        ids = list({str(animal_id) for animal_id in animal_ids if animal_id})
+        if not ids:
+            return {}
+        try:
+            animals = self.collection.find({'_id': {'$in': ids}}, {'name': 1})
+            return {str(a['_id']): a.get('name', 'Неизвестно') for a in animals}
+        except Exception as e:
+            logger.error(f"Ошибка при получении имён животных: {e}")
+            return {}
+
     def update_animal(self, animal_id, update_data):
         """
         Обновление данных животного
@@ -58,15 +129,19 @@ class MongoDBModels:
         try:
             # Добавляем timestamp обновления
             update_data['updated_at'] = datetime.now()
+            self._set_search_fields(update_data)
 
             result = self.collection.update_one(
                 {'_id': animal_id},
                 {'$set': update_data}
             )
-            print(f"Обновлено {result.modified_count} документов")
+            logger.info(f"Обновлено {result.modified_count} документов",
+                        extra={'entity': 'animal', 'op': 'update', 'id': animal_id})
+            if result.modified_count:
+                events.publish(events.ANIMAL, animal_id, events.UPDATE)
             return result.modified_count
         except Exception as e:
-            print(f"Ошибка при обновлении животного: {e}")
+            logger.error(f"Ошибка при обновлении животного: {e}")
             return 0
 
     def delete_animal(self, animal_id):
@@ -78,10 +153,13 @@ class MongoDBModels:
         """
         try:
             result = self.collection.delete_one({'_id': animal_id})
-            print(f"Удалено {result.deleted_count} документов")
+            logger.info(f"Удалено {result.deleted_count} документов",
+                        extra={'entity': 'animal', 'op': 'delete', 'id': animal_id})
+            if result.deleted_count:
+                events.publish(events.ANIMAL, animal_id, events.DELETE)
             return result.deleted_count
         except Exception as e:
-            print(f"Ошибка при удалении животного: {e}")
+            logger.error(f"Ошибка при удалении животного: {e}")
             return 0
 
     def search_animals(self, search_criteria):
@@ -95,9 +173,114 @@ class MongoDBModels:
             animals = list(self.collection.find(search_criteria))
             return animals
         except Exception as e:
-            print(f"Ошибка при поиске животных: {e}")
+            logger.error(f"Ошибка при поиске животных: {e}")
+            return []
+
+    def search_animals_by_field(self, field, text):
+        """
+        Поиск животных по одному полю с использованием индексов
+
+        :param field: 'id', 'name', 'owner_name' или 'owner_phone'
+        :param text: строка поиска (подстрока для имён, префикс для телефона)
+        :return: список найденных животных
+        """
+        return self.search_animals(self.build_search_criteria(field, text))
+
+    @staticmethod
+    def build_search_criteria(field, text):
+        """
+        Формирует фильтр поиска, который обслуживается индексами коллекции
+
+        Пока backfill_search_fields не завершился, имя и хозяин ищутся
+        по исходным полям без учёта регистра (без индекса, но полно).
+
+        :param field: 'id', 'name', 'owner_name' или 'owner_phone'
+        :param text: строка поиска
+        :return: словарь-фильтр для find()
+        """
+        text = str(text).strip()
+        if field == 'id':
+            return {'_id': text}
+        if field in SEARCH_FIELDS:
+            if not _search_fields_ready.is_set():
+                # Заполнение не завершено - часть документов без нормализованных полей
+                return {field: {'$regex': re.escape(text), '$options': 'i'}}
+            return {SEARCH_FIELDS[field]: {'$regex': re.escape(normalize_search_text(text))}}
+        if field == 'owner_phone':
+            # Якорный регэксп без опций превращается в диапазон по индексу
+            return {'owner_phone': {'$regex': '^' + re.escape(text)}}
+        raise ValueError(f"Неизвестное поле поиска: {field}")
+
+    def ensure_indexes(self):
+        """
+        Создаёт индексы коллекции и заполняет нормализованные поля поиска.
+        Операция идемпотентна.
+
+        :return: список имён индексов или пустой список при ошибке
+        """
+        try:
+            names = self.collection.create_indexes(ANIMAL_INDEXES)
+            updated = self.backfill_search_fields()
+            logger.info(f"Индексы MongoDB готовы: {', '.join(names)}; обновлено документов: {updated}")
+            return names
+        except Exception as e:
+            logger.error(f"Ошибка при создании индексов MongoDB: {e}")
             return []
 
+    def backfill_search_fields(self, batch_size=1000):
+        """
+        Заполняет нормализованные поля у документов, где их ещё нет
+
+        :param batch_size: размер пакета bulk_write
+        :return: количество обновлённых документов
+        """
+        missing = {'$or': [{lower: {'$exists': False}} for lower in SEARCH_FIELDS.values()]}
+        projection = {field: 1 for field in SEARCH_FIELDS}
+        updated = 0
+        batch = []
+        for animal in self.collection.find(missing, projection):
+            values = {lower: normalize_search_text(animal.get(field))
+                      for field, lower in SEARCH_FIELDS.items()}
+            batch.append(UpdateOne({'_id': animal['_id']}, {'$set': values}))
+            if len(batch) >= batch_size:
+                updated += self.collection.bulk_write(batch, ordered=False).modified_count
+                batch = []
+        if batch:
+            updated += self.collection.bulk_write(batch, ordered=False).modified_count
+        # Поиск переходит на нормализованные поля
+        _search_fields_ready.set()
+        return updated
+
+    def get_index_info(self):
+        """
+        Состояние индексов коллекции для диагностики
+
+        :return: словарь с описанием индексов, отсутствующими индексами
+                 и признаком незаполненных нормализованных полей
+        """
+        try:
+            indexes = self.collection.index_information()
+            expected = [model.document['name'] for model in ANIMAL_INDEXES]
+            missing = {'$or': [{lower: {'$exists': False}} for lower in SEARCH_FIELDS.values()]}
+            return {
+                'indexes': indexes,
+                'missing': [name for name in expected if name not in indexes],
+                'backfill_pending': self.collection.find_one(missing, {'_id': 1}) is not None,
+            }
+        except Exception as e:
+            logger.error(f"Ошибка при получении информации об индексах: {e}")
+            return {'indexes': {}, 'missing': [], 'backfill_pending': None, 'error': str(e)}
+
+    @staticmethod
+    def _set_search_fields(source, target=None):
+        """Записывает нормализованные копии полей поиска (в source или в target)"""
+        if target is None:
+            target = source
+        for field, lower in SEARCH_FIELDS.items():
+            if field in source:
+                target[lower] = normalize_search_text(source[field])
+        return target
+
     def add_medical_record(self, animal_id, record_data):
         """
         Добавление медицинской записи в историю животного
@@ -116,10 +299,11 @@ class MongoDBModels:
                 {'$push': {'medical_history': record_data}}
             )
             if result.modified_count > 0:
+                events.publish(events.ANIMAL, animal_id, events.UPDATE)
                 return self.get_animal_by_id(animal_id)
             return None
         except Exception as e:
-            print(f"Ошибка при добавлении медицинской записи: {e}")
+            logger.error(f"Ошибка при добавлении медицинской записи: {e}")
             return None
 
     def update_medical_record(self, animal_id, record_index, update_data):
@@ -141,10 +325,11 @@ class MongoDBModels:
                 {'$set': update_query}
             )
             if result.modified_count > 0:
+                events.publish(events.ANIMAL, animal_id, events.UPDATE)
                 return self.get_animal_by_id(animal_id)
             return None
         except Exception as e:
-            print(f"Ошибка при обновлении медицинской записи: {e}")
+            logger.error(f"Ошибка при обновлении медицинской записи: {e}")
             return None
 
     def get_animals_by_diagnosis(self, diagnosis):
@@ -160,7 +345,7 @@ class MongoDBModels:
             }))
             return animals
         except Exception as e:
-            print(f"Ошибка при поиске животных по диагнозу: {e}")
+            logger.error(f"Ошибка при поиске животных по диагнозу: {e}")
             return []
 
     def get_all_animals(self):
@@ -173,9 +358,86 @@ class MongoDBModels:
             animals = list(self.collection.find())
             return animals
         except Exception as e:
-            print(f"Ошибка при получении всех животных: {e}")
+            logger.error(f"Ошибка при получении всех животных: {e}")
             return []
 
+    def get_animals_page(self, criteria=None, after_id=None, limit=100, projection=TABLE_PROJECTION):
+        """
+        Получение страницы животных для таблицы (keyset-пагинация по _id)
+
+        Возвращаются только колонки таблицы, без medical_history.
+
+        :param criteria: фильтр поиска (None - все животные)
+        :param after_id: _id последнего животного предыдущей страницы
+        :param limit: размер страницы
+        :param projection: возвращаемые поля (по умолчанию - колонки таблицы)
+        :return: список животных, отсортированный по _id
+        """
+        query = dict(criteria or {})
+        if after_id is not None:
+            keyset = {'_id': {'$gt': after_id}}
+            query = {'$and': [query, keyset]} if query else keyset
+        try:
+            cursor = self.collection.find(query, projection).sort('_id', 1).limit(limit)
+            return list(cursor)
+        except Exception as e:
+            logger.error(f"Ошибка при получении страницы животных: {e}")
+            return []
+
+    def get_animals_rows(self, animal_ids, criteria=None):
+        """
+        Получение колонок таблицы для указанных животных (для точечного обновления)
+
+        :param animal_ids: список ID животных
+        :param criteria: текущий фильтр таблицы - животные вне его не возвращаются
+        :return: список животных с полями TABLE_PROJECTION
+        """
+        query = {'_id': {'$in': list(animal_ids)}}
+        if criteria:
+            query = {'$and': [criteria, query]}
+        try:
+            return list(self.collection.find(query, TABLE_PROJECTION))
+        except Exception as e:
+            logger.error(f"Ошибка при получении животных по ID: {e}")
+            return []
+
+    def iter_animals(self, criteria=None, projection=TABLE_PROJECTION, batch_size=1000):
+        """
+        Построчная выгрузка животных курсором (для экспорта)
+
+        Курсор получает документы порциями по batch_size, поэтому в памяти
+        не держится вся выборка. Ошибки не перехватываются.
+
+        :param criteria: фильтр (None - все животные)
+        :param projection: выгружаемые поля
+        :param batch_size: размер порции курсора
+        :return: генератор документов, отсортированных по _id
+        """
+        cursor = self.collection.find(criteria or {}, projection).sort('_id', 1).batch_size(batch_size)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
+
+    def estimate_animals_count(self, criteria=None, max_count=10000):
+        """
+        Оценка количества животных
+
+        Без фильтра берётся из метаданных коллекции (без сканирования),
+        с фильтром - подсчёт, ограниченный max_count.
+
+        :param criteria: фильтр поиска
+        :param max_count: предел подсчёта с фильтром
+        :return: количество (или max_count, если найдено не меньше)
+        """
+        try:
+            if not criteria:
+                return self.collection.estimated_document_count()
+            return self.collection.count_documents(criteria, limit=max_count)
+        except Exception as e:
+            logger.error(f"Ошибка при подсчёте животных: {e}")
+            return 0
+
     def get_all_diagnoses(self):
         """Получает список уникальных диагнозов"""
         try:
@@ -187,7 +449,7 @@ class MongoDBModels:
             diagnoses = self.collection.aggregate(pipeline)
             return [d['_id'] for d in diagnoses if d['_id']]
         except Exception as e:
-            print(f"Ошибка при получении диагнозов: {e}")
+            logger.error(f"Ошибка при получении диагнозов: {e}")
             return []
 
     def get_animals_by_diagnosis(self, diagnosis):
@@ -198,6 +460,6 @@ class MongoDBModels:
             })
             return list(animals)
         except Exception as e:
-            print(f"Ошибка при поиске животных по диагнозу: {e}")
+            logger.error(f"Ошибка при поиске животных по диагнозу: {e}")
             return []
 
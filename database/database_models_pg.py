@@ -1,12 +1,124 @@
 # database_models_pg.py
 import datetime
+import itertools
+from typing import NamedTuple
 
 from PyQt6.QtCore import QDate
 import logging
+from psycopg2.extras import execute_values
 
 from database.database_postgres_connector import PostgresConnector
+from database.database_migrations_pg import MigrationRunner
+from database import database_events as events
+from database.database_instrumentation import instrument_class
 
 
+logger = logging.getLogger(__name__)
+
+
+class BookingResult(NamedTuple):
+    """Результат строки массовой записи или переноса"""
+    index: int  # Номер строки во входном списке
+    appointment_id: int = None  # ID созданного или перенесённого приёма
+    conflict_id: int = None  # ID приёма, с которым пересеклось время
+    error: str = None  # Причина отказа (None - строка записана)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class FinanceLine(NamedTuple):
+    """Строка разбивки финансового отчёта (по услуге, врачу или филиалу)"""
+    id: int
+    name: str
+    count: int  # Завершённых приёмов
+    income: float
+
+
+class FinanceStats(NamedTuple):
+    """Финансовые показатели за период"""
+    date_from: datetime.date
+    date_to: datetime.date  # Включительно
+    total_count: int
+    total_income: float
+    doctors_count: int
+    services: list  # FinanceLine по убыванию количества
+    doctors: list
+    branches: list
+
+    def to_table(self):
+        """Заголовки и строки для таблицы отчёта и экспорта"""
+        data = [
+            ["Период отчета", f"{self.date_from} - {self.date_to}"],
+            ["Всего завершенных приемов", str(self.total_count)],
+            ["Общий доход", f"{self.total_income:.2f} ₽"],
+            ["Количество работавших врачей", str(self.doctors_count)],
+        ]
+        for title, lines in (("Статистика по услугам", self.services),
+                             ("Статистика по врачам", self.doctors),
+                             ("Статистика по филиалам", self.branches)):
+            data.append(["", ""])  # Разделитель
+            data.append([title, ""])
+            for line in lines:
+                data.append([line.name, f"{line.count} приемов на {line.income:.2f} ₽"])
+        return ["Категория", "Значение"], data
+
+
+def _as_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def year_range(year):
+    """Полуинтервал дат [1 января year, 1 января year + 1)"""
+    return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+
+
+def month_range(year, month):
+    """Полуинтервал дат [1-е число месяца, 1-е число следующего месяца)"""
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    return start, end
+
+
+def _as_minutes(value):
+    if isinstance(value, str):
+        hours, minutes = value.split(':')[:2]
+        return int(hours) * 60 + int(minutes)
+    return value.hour * 60 + value.minute
+
+
+class _DaySnapshot:
+    """Занятость врачей по дням внутри транзакции: (врач, дата) -> [(начало, конец, ID)]"""
+
+    def __init__(self, rows):
+        self._busy = {}
+        for appointment_id, vet_id, day, start_time, duration in rows:
+            self.add(vet_id, day, _as_minutes(start_time), duration, appointment_id)
+
+    def add(self, vet_id, day, start, duration, appointment_id):
+        self._busy.setdefault((vet_id, day), []).append((start, start + duration, appointment_id))
+
+    def conflict(self, vet_id, day, start, duration, ignore=()):
+        """
+        Возвращает ID пересекающегося приёма (или метку строки пакета), иначе None.
+
+        Args:
+            ignore (set): Приёмы, время которых уже освобождено (перенесены)
+        """
+        end = start + duration
+        for busy_start, busy_end, appointment_id in self._busy.get((vet_id, day), ()):
+            if busy_start < end and start < busy_end and appointment_id not in ignore:
+                return appointment_id
+        return None
+
+
+# Строк, которые именованный курсор получает с сервера за один раз
+EXPORT_BATCH_SIZE = 2000
+_cursor_names = itertools.count(1)
+
+
+@instrument_class('pg')
 class PostgresModels:
     def __init__(self):
         self.db = PostgresConnector()
@@ -61,17 +173,52 @@ class PostgresModels:
             """
         )
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                for command in commands:
-                    cur.execute(command)
-                conn.commit()
-                print("Таблицы PostgreSQL успешно созданы или уже существуют.")
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    for command in commands:
+                        cur.execute(command)
+                    conn.commit()
+                    logger.info("Таблицы PostgreSQL успешно созданы или уже существуют.")
+        except Exception as e:
+            logger.error(f"Ошибка при создании таблиц PostgreSQL: {e}")
+            return
+
+        self.migrate_schema()
+
+    def migrate_schema(self, target_version=None):
+        """
+        Применяет версионные миграции схемы (индексы и т.п.).
+
+        Args:
+            target_version (int, optional): До какой версии включительно
+
+        Returns:
+            list: Номера применённых версий или None при ошибке
+        """
+        try:
+            return MigrationRunner(self.db).migrate(target_version)
+        except Exception as e:
+            logger.error(f"Ошибка при применении миграций PostgreSQL: {e}")
+
+    def rollback_schema(self, target_version=0):
+        """
+        Откатывает миграции схемы до указанной версии.
+
+        Returns:
+            list: Номера откаченных версий или None при ошибке
+        """
+        try:
+            return MigrationRunner(self.db).rollback(target_version)
         except Exception as e:
-            print(f"Ошибка при создании таблиц PostgreSQL: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при откате миграций PostgreSQL: {e}")
+
+    def get_schema_version(self):
+        """Возвращает текущую версию схемы (0 - миграции не применялись)"""
+        try:
+            return MigrationRunner(self.db).current_version()
+        except Exception as e:
+            logger.error(f"Ошибка при получении версии схемы PostgreSQL: {e}")
+            return 0
 
     def insert_branch(self, branch_data):
         """ Добавляет новый филиал в базу данных.
@@ -91,18 +238,17 @@ class PostgresModels:
 
         sql = "INSERT INTO Филиалы (name, address, phone) VALUES (%s, %s, %s) RETURNING id;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (name, address, phone))
-                branch_id = cur.fetchone()[0]
-                conn.commit()
-                print(f"Филиал {name} успешно добавлен с ID: {branch_id}")
-                return branch_id
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (name, address, phone))
+                    branch_id = cur.fetchone()[0]
+                    conn.commit()
+                    logger.info(f"Филиал {name} успешно добавлен с ID: {branch_id}",
+                                extra={'entity': 'branch', 'op': 'insert', 'id': branch_id})
+                    events.publish(events.BRANCH, branch_id, events.INSERT)
+                    return branch_id
         except Exception as e:
-            print(f"Ошибка при добавлении филиала: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при добавлении филиала: {e}")
 
     def get_all_branches(self):
         """
@@ -113,31 +259,27 @@ class PostgresModels:
         """
         sql = "SELECT id, name, address, phone FROM Филиалы ORDER BY id;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql)
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при получении всех филиалов: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при получении всех филиалов: {e}")
         return []
 
     def delete_branch(self, branch_id):
         sql = "DELETE FROM Филиалы WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (branch_id,))
-                conn.commit()
-                print(f"Филиал с ID {branch_id} успешно удален.")
-                return True
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (branch_id,))
+                    conn.commit()
+                    logger.info(f"Филиал с ID {branch_id} успешно удален.",
+                                extra={'entity': 'branch', 'op': 'delete', 'id': branch_id})
+                    events.publish(events.BRANCH, branch_id, events.DELETE)
+                    return True
         except Exception as e:
-            print(f"Ошибка при удалении филиала: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при удалении филиала: {e}")
 
     def update_branch(self, branch_id, update_data):
         """
@@ -164,17 +306,16 @@ class PostgresModels:
         params.append(branch_id)
 
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, tuple(params))
-                conn.commit()
-                print(f"Филиал с ID {branch_id} успешно обновлен.")
-                return True
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, tuple(params))
+                    conn.commit()
+                    logger.info(f"Филиал с ID {branch_id} успешно обновлен.",
+                                extra={'entity': 'branch', 'op': 'update', 'id': branch_id})
+                    events.publish(events.BRANCH, branch_id, events.UPDATE)
+                    return True
         except Exception as e:
-            print(f"Ошибка при обновлении филиала: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при обновлении филиала: {e}")
 
     def get_branch_by_id(self, branch_id):
         """
@@ -188,15 +329,12 @@ class PostgresModels:
         """
         sql = "SELECT id, name, address, phone FROM Филиалы WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (branch_id,))
-                return cur.fetchone()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (branch_id,))
+                    return cur.fetchone()
         except Exception as e:
-            print(f"Ошибка при получении филиала по ID: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при получении филиала по ID: {e}")
 
     def search_branches_by_id(self, search_text):
         """
@@ -210,15 +348,12 @@ class PostgresModels:
         """
         sql = "SELECT id, name, address, phone FROM Филиалы WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (search_text,))
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (search_text,))
+                    return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при поиске филиалов по ID: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при поиске филиалов по ID: {e}")
         return []
 
     def search_branches_by_name(self, search_text):
@@ -233,15 +368,12 @@ class PostgresModels:
         """
         sql = "SELECT id, name, address, phone FROM Филиалы WHERE name ILIKE %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (f'%{search_text}%',))
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (f'%{search_text}%',))
+                    return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при поиске филиалов по названию: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при поиске филиалов по названию: {e}")
         return []
 
     def search_branches_by_address(self, search_text):
@@ -256,15 +388,12 @@ class PostgresModels:
         """
         sql = "SELECT id, name, address, phone FROM Филиалы WHERE address ILIKE %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (f'%{search_text}%',))
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (f'%{search_text}%',))
+                    return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при поиске филиалов по адресу: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при поиске филиалов по адресу: {e}")
         return []
 
     def search_branches_by_phone(self, search_text):
@@ -279,208 +408,239 @@ class PostgresModels:
         """
         sql = "SELECT id, name, address, phone FROM Филиалы WHERE phone ILIKE %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (f'%{search_text}%',))
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (f'%{search_text}%',))
+                    return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при поиске филиалов по телефону: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при поиске филиалов по телефону: {e}")
         return []
 
     def insert_employee(self, full_name, login, password_hash, role, branch_id):
         sql = "INSERT INTO Сотрудники (full_name, login, password_hash, role, branch_id) VALUES (%s, %s, %s, %s, %s) RETURNING id;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (full_name, login, password_hash, role, branch_id))
-                employee_id = cur.fetchone()[0]
-                conn.commit()
-                print(f"Сотрудник {full_name} успешно добавлен с ID: {employee_id}")
-                return employee_id
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (full_name, login, password_hash, role, branch_id))
+                    employee_id = cur.fetchone()[0]
+                    conn.commit()
+                    logger.info(f"Сотрудник {full_name} успешно добавлен с ID: {employee_id}",
+                                extra={'entity': 'employee', 'op': 'insert', 'id': employee_id})
+                    events.publish(events.EMPLOYEE, employee_id, events.INSERT)
+                    return employee_id
         except Exception as e:
-            print(f"Ошибка при добавлении сотрудника: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при добавлении сотрудника: {e}")
 
     def get_employee_by_login(self, login):
         sql = "SELECT id, full_name, login, password_hash, role, branch_id FROM Сотрудники WHERE login = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (login,))
-                return cur.fetchone()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (login,))
+                    return cur.fetchone()
         except Exception as e:
-            print(f"Ошибка при получении сотрудника по логину: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при получении сотрудника по логину: {e}")
 
     def get_employee_by_id(self, employee_id):
         sql = "SELECT id, full_name, login, password_hash, role, branch_id FROM Сотрудники WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (employee_id,))
-                return cur.fetchone()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (employee_id,))
+                    return cur.fetchone()
         except Exception as e:
-            print(f"Ошибка при получении сотрудника по ID: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при получении сотрудника по ID: {e}")
 
     def update_employee(self, employee_id, full_name, login, password_hash, role, branch_id):
         sql = "UPDATE Сотрудники SET full_name = %s, login = %s, password_hash = %s, role = %s, branch_id = %s WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (full_name, login, password_hash, role, branch_id, employee_id))
-                conn.commit()
-                print(f"Сотрудник с ID {employee_id} успешно обновлен.")
-                return True
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (full_name, login, password_hash, role, branch_id, employee_id))
+                    conn.commit()
+                    logger.info(f"Сотрудник с ID {employee_id} успешно обновлен.",
+                                extra={'entity': 'employee', 'op': 'update', 'id': employee_id})
+                    events.publish(events.EMPLOYEE, employee_id, events.UPDATE)
+                    return True
         except Exception as e:
-            print(f"Ошибка при обновлении сотрудника: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при обновлении сотрудника: {e}")
 
     def delete_employee(self, employee_id):
         sql = "DELETE FROM Сотрудники WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (employee_id,))
-                conn.commit()
-                print(f"Сотрудник с ID {employee_id} успешно удален.")
-                return True
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (employee_id,))
+                    conn.commit()
+                    logger.info(f"Сотрудник с ID {employee_id} успешно удален.",
+                                extra={'entity': 'employee', 'op': 'delete', 'id': employee_id})
+                    events.publish(events.EMPLOYEE, employee_id, events.DELETE)
+                    return True
         except Exception as e:
-            print(f"Ошибка при удалении сотрудника: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при удалении сотрудника: {e}")
 
     def insert_service(self, title, description, price):
         """Добавление новой услуги"""
         sql = "INSERT INTO Услуги (title, description, price) VALUES (%s, %s, %s) RETURNING id;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (title, description, price))
-                service_id = cur.fetchone()[0]
-                conn.commit()
-                print(f"Услуга {title} успешно добавлена с ID: {service_id}")
-                return service_id
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (title, description, price))
+                    service_id = cur.fetchone()[0]
+                    conn.commit()
+                    logger.info(f"Услуга {title} успешно добавлена с ID: {service_id}",
+                                extra={'entity': 'service', 'op': 'insert', 'id': service_id})
+                    events.publish(events.SERVICE, service_id, events.INSERT)
+                    return service_id
         except Exception as e:
-            print(f"Ошибка при добавлении услуги: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при добавлении услуги: {e}")
 
     def get_service_by_id(self, service_id):
 
-        sql = "SELECT id, title, description, price FROM Услуги WHERE id = %s;"
+        sql = "SELECT id, title, description, price, duration_minutes FROM Услуги WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (service_id,))
-                return cur.fetchone()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (service_id,))
+                    return cur.fetchone()
         except Exception as e:
-            print(f"Ошибка при получении услуги по ID: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при получении услуги по ID: {e}")
 
     def update_service(self, service_id, title, description, price):
         """Обновление услуги"""
         sql = "UPDATE Услуги SET title = %s, description = %s, price = %s WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (title, description, price, service_id))
-                conn.commit()
-                print(f"Услуга с ID {service_id} успешно обновлена.")
-                return True
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (title, description, price, service_id))
+                    conn.commit()
+                    logger.info(f"Услуга с ID {service_id} успешно обновлена.",
+                                extra={'entity': 'service', 'op': 'update', 'id': service_id})
+                    events.publish(events.SERVICE, service_id, events.UPDATE)
+                    return True
         except Exception as e:
-            print(f"Ошибка при обновлении услуги: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при обновлении услуги: {e}")
 
     def delete_service(self, service_id):
         sql = "DELETE FROM Услуги WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (service_id,))
-                conn.commit()
-                print(f"Услуга с ID {service_id} успешно удалена.")
-                return True
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (service_id,))
+                    conn.commit()
+                    logger.info(f"Услуга с ID {service_id} успешно удалена.",
+                                extra={'entity': 'service', 'op': 'delete', 'id': service_id})
+                    events.publish(events.SERVICE, service_id, events.DELETE)
+                    return True
         except Exception as e:
-            print(f"Ошибка при удалении услуги: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при удалении услуги: {e}")
 
     def get_all_services(self):
-        """Получение всех услуг"""
-        sql = "SELECT id, title, description, price FROM Услуги;"
+        """Получение всех услуг (id, title, description, price, duration_minutes)"""
+        sql = "SELECT id, title, description, price, duration_minutes FROM Услуги;"
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении всех услуг: {e}")
+
+    def authenticate_employee(self, login, password_hash):
+        """
+        Проверка логина и запись входа одним запросом.
+
+        Сотрудник ищется по логину и паролю, запись в Журнал_входа
+        добавляется в том же запросе (одна транзакция, одно обращение
+        к серверу), а филиал сотрудника возвращается вместе с ним.
+
+        Returns:
+            tuple: (id, full_name, login, role, branch_id,
+                    branch_name, branch_address, branch_phone) или None
+        """
+        sql = """
+        WITH employee AS (
+            SELECT id, full_name, login, role, branch_id
+            FROM Сотрудники
+            WHERE login = %s AND password_hash = %s
+        ), login_log AS (
+            INSERT INTO Журнал_входа (user_id, event_type)
+            SELECT id, 'вход' FROM employee
+        )
+        SELECT e.id, e.full_name, e.login, e.role, e.branch_id, b.name, b.address, b.phone
+        FROM employee e
+        LEFT JOIN Филиалы b ON b.id = e.branch_id;
+        """
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (login, password_hash))
+                    row = cur.fetchone()
+                    conn.commit()
+                    if row:
+                        logger.info(f"Вход сотрудника {login}",
+                                    extra={'entity': 'login_log', 'op': 'insert', 'id': row[0]})
+                    return row
+        except Exception as e:
+            logger.error(f"Ошибка при проверке входа сотрудника: {e}")
+        return None
+
+    def get_reference_data(self):
+        """
+        Справочники для сессии пользователя через одно соединение.
+
+        Returns:
+            tuple: (врачи [(id, full_name)], услуги [(id, title, description, price, duration_minutes)]);
+                при ошибке - (None, None)
+        """
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql)
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT id, full_name FROM Сотрудники WHERE role = 'doctor' ORDER BY full_name;")
+                    doctors = cur.fetchall()
+                    cur.execute("SELECT id, title, description, price, duration_minutes FROM Услуги;")
+                    services = cur.fetchall()
+                    return doctors, services
         except Exception as e:
-            print(f"Ошибка при получении всех услуг: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при загрузке справочников: {e}")
+        return None, None
 
     def insert_login_log(self, user_id, event_type):
         sql = "INSERT INTO Журнал_входа (user_id, event_type) VALUES (%s, %s) RETURNING id;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (user_id, event_type))
-                log_id = cur.fetchone()[0]
-                conn.commit()
-                print(f"Запись в журнале входа успешно добавлена с ID: {log_id}")
-                return log_id
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (user_id, event_type))
+                    log_id = cur.fetchone()[0]
+                    conn.commit()
+                    logger.info(f"Запись в журнале входа успешно добавлена с ID: {log_id}",
+                                extra={'entity': 'login_log', 'op': 'insert', 'id': log_id})
+                    return log_id
         except Exception as e:
-            print(f"Ошибка при добавлении записи в журнал входа: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при добавлении записи в журнал входа: {e}")
 
     def get_all_employees(self):
         sql = "SELECT id, full_name, login, password_hash, role, branch_id FROM Сотрудники;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql)
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при получении всех сотрудников: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при получении всех сотрудников: {e}")
 
     def update_employee_password(self, employee_id, new_password_hash):
         sql = "UPDATE Сотрудники SET password_hash = %s WHERE id = %s;"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (new_password_hash, employee_id))
-                conn.commit()
-                print(f"Пароль сотрудника с ID {employee_id} успешно обновлен.")
-                return True
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (new_password_hash, employee_id))
+                    conn.commit()
+                    logger.info(f"Пароль сотрудника с ID {employee_id} успешно обновлен.",
+                                extra={'entity': 'employee', 'op': 'update_password', 'id': employee_id})
+                    return True
         except Exception as e:
-            print(f"Ошибка при обновлении пароля сотрудника: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при обновлении пароля сотрудника: {e}")
 
     def get_appointment_by_id(self, id):
         """
@@ -494,15 +654,12 @@ class PostgresModels:
         WHERE id = %s
         """
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (id,))
-                return cur.fetchone()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (id,))
+                    return cur.fetchone()
         except Exception as e:
-            print(f"Ошибка при получении приёма по ID: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при получении приёма по ID: {e}")
 
     def get_appointments_by_date(self, date, status=None):
         """
@@ -525,18 +682,78 @@ class PostgresModels:
             params.append(status)
 
         try:
-            conn = self.db.connect()
-            if not conn:
-                raise Exception("Не удалось подключиться к базе данных")
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, tuple(params))
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении приёмов по дате: {e}")
+            return []
 
-            with conn.cursor() as cur:
-                cur.execute(sql, tuple(params))
-                return cur.fetchall()
+    def get_day_view(self, date, status=None):
+        """
+        Получает приёмы на дату сразу с именем врача и данными услуги.
+
+        Один запрос вместо отдельных get_employee_by_id/get_service_by_id
+        для каждой строки.
+
+        Args:
+            date (str): Дата в формате 'YYYY-MM-DD'
+            status (str, optional): Статус приёма для фильтрации
+        Returns:
+            list: Список кортежей (id, animal_id, vet_id, vet_name, date, time,
+                  service_id, service_title, service_price, status)
+        """
+        sql = """
+        SELECT a.id, a.animal_id, a.vet_id, e.full_name, a.date, a.time,
+               a.service_id, s.title, s.price, a.status
+        FROM Приёмы a
+        LEFT JOIN Сотрудники e ON a.vet_id = e.id
+        LEFT JOIN Услуги s ON a.service_id = s.id
+        WHERE a.date = %s
+        """
+        params = [date]
+
+        if status:
+            sql += " AND a.status = %s"
+            params.append(status)
+
+        sql += " ORDER BY a.time"
+
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, tuple(params))
+                    return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при получении приёмов по дате: {e}")
+            logger.error(f"Ошибка при получении приёмов на день: {e}")
             return []
-        finally:
-            self.db.disconnect()
+
+    def get_day_view_row(self, appointment_id):
+        """
+        Получает один приём в формате строки get_day_view.
+
+        Args:
+            appointment_id (int): ID приёма
+        Returns:
+            tuple: Строка как в get_day_view или None, если приём не найден
+        """
+        sql = """
+        SELECT a.id, a.animal_id, a.vet_id, e.full_name, a.date, a.time,
+               a.service_id, s.title, s.price, a.status
+        FROM Приёмы a
+        LEFT JOIN Сотрудники e ON a.vet_id = e.id
+        LEFT JOIN Услуги s ON a.service_id = s.id
+        WHERE a.id = %s
+        """
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (appointment_id,))
+                    return cur.fetchone()
+        except Exception as e:
+            logger.error(f"Ошибка при получении приёма: {e}")
+            return None
 
     def update_appointment(self, id, animal_id, vet_id, date, time, service_id, status):
         """
@@ -554,27 +771,36 @@ class PostgresModels:
         Returns:
             bool: True при успешном обновлении
         """
+        # Прежний врач нужен подписчикам (кэш занятости врачей)
         sql = """
-        UPDATE Приёмы
+        UPDATE Приёмы AS a
         SET animal_id = %s,
             vet_id = %s,
             date = %s,
             time = %s,
             service_id = %s,
             status = %s
-        WHERE id = %s
+        FROM (SELECT id, vet_id FROM Приёмы WHERE id = %s FOR UPDATE) AS old
+        WHERE a.id = old.id
+        RETURNING old.vet_id
         """
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (animal_id, vet_id, date, time, service_id, status, id))
-                conn.commit()
-                return cur.rowcount > 0
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    if status != 'отменен':
+                        conflict_id = self._find_conflict(cur, vet_id, date, time, service_id, id, lock=True)
+                        if conflict_id is not None:
+                            logger.warning(f"Время врача {vet_id} пересекается с приёмом {conflict_id}")
+                            return False
+                    cur.execute(sql, (animal_id, vet_id, date, time, service_id, status, id))
+                    row = cur.fetchone()
+                    conn.commit()
+            if row is None:
+                return False
+            events.publish(events.APPOINTMENT, id, events.UPDATE, related={row[0], vet_id})
+            return True
         except Exception as e:
-            print(f"Ошибка при обновлении приёма: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при обновлении приёма: {e}")
         return False
 
     def delete_appointment(self, id):
@@ -585,18 +811,19 @@ class PostgresModels:
         Returns:
             bool: True при успешном удалении
         """
-        sql = "DELETE FROM Приёмы WHERE id = %s"
+        sql = "DELETE FROM Приёмы WHERE id = %s RETURNING vet_id"
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql, (id,))
-                conn.commit()
-                return cur.rowcount > 0
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (id,))
+                    row = cur.fetchone()
+                    conn.commit()
+            if row is None:
+                return False
+            events.publish(events.APPOINTMENT, id, events.DELETE, related=(row[0],))
+            return True
         except Exception as e:
-            print(f"Ошибка при удалении приёма: {e}")
-        finally:
-            self.db.disconnect()
+            logger.error(f"Ошибка при удалении приёма: {e}")
         return False
 
     def insert_appointment(self, animal_id, vet_id, date, time, service_id, status):
@@ -620,18 +847,265 @@ class PostgresModels:
         RETURNING id;
         """
         try:
-            conn = self.db.connect()
-            with conn.cursor() as cur:
-                cur.execute(sql, (animal_id, vet_id, date, time, service_id, status))
-                appointment_id = cur.fetchone()[0]
-                conn.commit()
-                return appointment_id
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    if status != 'отменен':
+                        conflict_id = self._find_conflict(cur, vet_id, date, time, service_id, lock=True)
+                        if conflict_id is not None:
+                            logger.warning(f"Время врача {vet_id} пересекается с приёмом {conflict_id}")
+                            return None
+                    cur.execute(sql, (animal_id, vet_id, date, time, service_id, status))
+                    appointment_id = cur.fetchone()[0]
+                    conn.commit()
+            events.publish(events.APPOINTMENT, appointment_id, events.INSERT, related=(vet_id,))
+            return appointment_id
         except Exception as e:
-            print(f"Ошибка при добавлении приёма: {e}")
+            logger.error(f"Ошибка при добавлении приёма: {e}")
             return None
-        finally:
-            if conn:
-                self.db.disconnect()
+
+    # --- Массовая запись и перенос ---
+
+    @staticmethod
+    def _lock_vet_days(cur, vet_days):
+        """Advisory-блокировки (врач, день) в едином порядке - без взаимных блокировок"""
+        vet_days = sorted(set(vet_days))
+        if not vet_days:
+            return
+        cur.execute(
+            """
+            SELECT pg_advisory_xact_lock(k.vet_id, (k.day - DATE '2000-01-01'))
+            FROM (
+                SELECT vet_id, day
+                FROM unnest(%s::int[], %s::date[]) AS u(vet_id, day)
+                ORDER BY vet_id, day
+                OFFSET 0
+            ) AS k;
+            """,
+            ([v for v, _d in vet_days], [d for _v, d in vet_days])
+        )
+
+    @staticmethod
+    def _load_day_snapshot(cur, vet_days):
+        """Неотменённые приёмы врачей в указанные дни (после блокировки)"""
+        vet_days = sorted(set(vet_days))
+        if not vet_days:
+            return _DaySnapshot([])
+        cur.execute(
+            """
+            SELECT a.id, a.vet_id, a.date, a.time, s.duration_minutes
+            FROM Приёмы a
+            JOIN Услуги s ON s.id = a.service_id
+            JOIN unnest(%s::int[], %s::date[]) AS k(vet_id, day)
+              ON a.vet_id = k.vet_id AND a.date = k.day
+            WHERE a.status != 'отменен';
+            """,
+            ([v for v, _d in vet_days], [d for _v, d in vet_days])
+        )
+        return _DaySnapshot(cur.fetchall())
+
+    @staticmethod
+    def _service_durations(cur, service_ids):
+        cur.execute(
+            "SELECT id, duration_minutes FROM Услуги WHERE id = ANY(%s);",
+            (list(set(service_ids)),)
+        )
+        return dict(cur.fetchall())
+
+    def bulk_insert_appointments(self, appointments, atomic=False):
+        """
+        Записывает пакет приёмов в одной транзакции.
+
+        Пересечения проверяются по снимку занятости врачей, взятому под
+        advisory-блокировками (врач, день), - и с уже существующими приёмами,
+        и между строками пакета. Строки без конфликтов вставляются одним
+        INSERT (execute_values).
+
+        Args:
+            appointments (list): Кортежи (animal_id, vet_id, date, time, service_id, status)
+            atomic (bool): Не записывать ничего, если хотя бы одна строка отклонена
+
+        Returns:
+            list: BookingResult по строкам в порядке входного списка
+                (пустой список при ошибке базы)
+        """
+        rows = [
+            (animal_id, vet_id, _as_date(day), start_time, service_id, status)
+            for animal_id, vet_id, day, start_time, service_id, status in appointments
+        ]
+        if not rows:
+            return []
+
+        results = [None] * len(rows)
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    vet_days = [(row[1], row[2]) for row in rows]
+                    self._lock_vet_days(cur, vet_days)
+                    snapshot = self._load_day_snapshot(cur, vet_days)
+                    durations = self._service_durations(cur, [row[4] for row in rows])
+
+                    accepted = []
+                    for index, (animal_id, vet_id, day, start_time, service_id, status) in enumerate(rows):
+                        if service_id not in durations:
+                            results[index] = BookingResult(index, error="Услуга не найдена")
+                            continue
+                        if status != 'отменен':
+                            start, duration = _as_minutes(start_time), durations[service_id]
+                            conflict = snapshot.conflict(vet_id, day, start, duration)
+                            if conflict is not None:
+                                results[index] = self._conflict_result(index, conflict)
+                                continue
+                            # Следующие строки пакета проверяются и против этой
+                            snapshot.add(vet_id, day, start, duration, ('row', index))
+                        accepted.append(index)
+
+                    if atomic and len(accepted) < len(rows):
+                        conn.rollback()
+                        return [
+                            result or BookingResult(index, error="Пакет отклонён целиком")
+                            for index, result in enumerate(results)
+                        ]
+
+                    if accepted:
+                        ids = execute_values(
+                            cur,
+                            """
+                            INSERT INTO Приёмы (animal_id, vet_id, date, time, service_id, status)
+                            VALUES %s
+                            RETURNING id
+                            """,
+                            [rows[index] for index in accepted],
+                            template="(%s, %s, %s, %s::time, %s, %s)",
+                            page_size=len(accepted),
+                            fetch=True
+                        )
+                        for index, (appointment_id,) in zip(accepted, ids):
+                            results[index] = BookingResult(index, appointment_id)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при массовой записи приёмов: {e}")
+            return []
+
+        for result in results:
+            if result.ok:
+                vet_id = rows[result.index][1]
+                events.publish(events.APPOINTMENT, result.appointment_id, events.INSERT, related=(vet_id,))
+        return results
+
+    def bulk_reschedule(self, moves, atomic=False):
+        """
+        Переносит пакет приёмов в одной транзакции (например, весь день
+        заболевшего врача).
+
+        Args:
+            moves (list): Кортежи (appointment_id, new_vet_id, new_date, new_time);
+                new_vet_id=None - оставить прежнего врача
+            atomic (bool): Не переносить ничего, если хотя бы одна строка отклонена
+
+        Returns:
+            list: BookingResult по строкам в порядке входного списка
+                (пустой список при ошибке базы)
+        """
+        moves = [
+            (appointment_id, new_vet_id, _as_date(new_date), new_time)
+            for appointment_id, new_vet_id, new_date, new_time in moves
+        ]
+        if not moves:
+            return []
+
+        select_sql = """
+        SELECT a.id, a.vet_id, a.date, a.status, s.duration_minutes
+        FROM Приёмы a
+        JOIN Услуги s ON s.id = a.service_id
+        WHERE a.id = ANY(%s)
+        """
+        results = [None] * len(moves)
+        updates = []  # (index, id, прежний врач, новый врач)
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    ids = [move[0] for move in moves]
+                    cur.execute(select_sql, (ids,))
+                    current = {row[0]: row for row in cur.fetchall()}
+
+                    # Блокируем и исходные, и целевые дни врачей
+                    vet_days = []
+                    for appointment_id, new_vet_id, new_date, _new_time in moves:
+                        if appointment_id in current:
+                            _id, vet_id, day, _status, _duration = current[appointment_id]
+                            vet_days += [(vet_id, day), (new_vet_id or vet_id, new_date)]
+                    self._lock_vet_days(cur, vet_days)
+
+                    # Перечитываем под блокировками и с блокировкой строк
+                    cur.execute(select_sql + " FOR UPDATE OF a", (ids,))
+                    locked = {row[0]: row for row in cur.fetchall()}
+                    snapshot = self._load_day_snapshot(cur, vet_days)
+                    # Прежнее время освобождается, только когда перенос принят:
+                    # отклонённый приём остаётся на своём месте
+                    moved = set()
+
+                    for index, (appointment_id, new_vet_id, new_date, new_time) in enumerate(moves):
+                        row = locked.get(appointment_id)
+                        if row is None:
+                            results[index] = BookingResult(index, appointment_id, error="Приём не найден")
+                            continue
+                        _id, vet_id, day, status, duration = row
+                        if current.get(appointment_id, row)[1:3] != (vet_id, day):
+                            results[index] = BookingResult(index, appointment_id, error="Приём изменён параллельно")
+                            continue
+                        target_vet = new_vet_id or vet_id
+                        if status != 'отменен':
+                            start = _as_minutes(new_time)
+                            conflict = snapshot.conflict(
+                                target_vet, new_date, start, duration, moved | {appointment_id}
+                            )
+                            if conflict is not None:
+                                results[index] = self._conflict_result(index, conflict, appointment_id)
+                                continue
+                            snapshot.add(target_vet, new_date, start, duration, ('row', index))
+                        moved.add(appointment_id)
+                        updates.append((index, appointment_id, vet_id, target_vet))
+
+                    if atomic and len(updates) < len(moves):
+                        conn.rollback()
+                        return [
+                            result or BookingResult(index, moves[index][0], error="Пакет отклонён целиком")
+                            for index, result in enumerate(results)
+                        ]
+
+                    if updates:
+                        execute_values(
+                            cur,
+                            """
+                            UPDATE Приёмы AS a
+                            SET vet_id = v.vet_id, date = v.date, time = v.time
+                            FROM (VALUES %s) AS v(id, vet_id, date, time)
+                            WHERE a.id = v.id
+                            """,
+                            [
+                                (appointment_id, target_vet, moves[index][2], moves[index][3])
+                                for index, appointment_id, _vet_id, target_vet in updates
+                            ],
+                            template="(%s::int, %s::int, %s::date, %s::time)",
+                            page_size=len(updates)
+                        )
+                        for index, appointment_id, _vet_id, _target_vet in updates:
+                            results[index] = BookingResult(index, appointment_id)
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при массовом переносе приёмов: {e}")
+            return []
+
+        for _index, appointment_id, vet_id, target_vet in updates:
+            events.publish(events.APPOINTMENT, appointment_id, events.UPDATE, related={vet_id, target_vet})
+        return results
+
+    @staticmethod
+    def _conflict_result(index, conflict, appointment_id=None):
+        if isinstance(conflict, tuple):
+            # Пересечение со строкой этого же пакета
+            return BookingResult(index, appointment_id, error=f"Пересекается со строкой {conflict[1] + 1}")
+        return BookingResult(index, appointment_id, conflict, "Врач занят в это время")
 
     def get_appointment_by_date_range(self, date_from, date_to):
         """
@@ -643,11 +1117,11 @@ class PostgresModels:
             list: Список приёмов или пустой список при ошибке
         """
         if not date_from or not date_to:
-            logging.error("Пустые даты в get_appointment_by_date_range")
+            logger.error("Пустые даты в get_appointment_by_date_range")
             return []
 
         if date_from > date_to:
-            logging.warning(f"Некорректный диапазон дат: {date_from} > {date_to}")
+            logger.warning(f"Некорректный диапазон дат: {date_from} > {date_to}")
             return []
 
         sql = """
@@ -657,21 +1131,15 @@ class PostgresModels:
         ORDER BY date, time
         """
         try:
-            conn = self.db.connect()
-            if not conn:
-                logging.error("Не удалось подключиться к базе данных")
-                return []
-
-            with conn.cursor() as cur:
-                cur.execute(sql, (date_from, date_to))
-                result = cur.fetchall()
-                logging.debug(f"Найдено {len(result)} записей за период {date_from} - {date_to}")
-                return result
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (date_from, date_to))
+                    result = cur.fetchall()
+                    logger.debug(f"Найдено {len(result)} записей за период {date_from} - {date_to}")
+                    return result
         except Exception as e:
-            logging.error(f"Ошибка в get_appointment_by_date_range: {str(e)}")
+            logger.error(f"Ошибка в get_appointment_by_date_range: {str(e)}")
             return []
-        finally:
-            self.db.disconnect()
 
     def get_appointments_by_doctor(self, vet_id, date_from, date_to):
         """Получаем приемы конкретного доктора"""
@@ -682,16 +1150,106 @@ class PostgresModels:
         ORDER BY date, time
         """
         try:
-            conn = self.db.connect()
-            if conn:
+            with self.db.connection() as conn:
                 with conn.cursor() as cur:
                     cur.execute(sql, (vet_id, date_from, date_to))
                     return cur.fetchall()
         except Exception as e:
-            print(f"Ошибка при получении приемов врача: {e}")
+            logger.error(f"Ошибка при получении приемов врача: {e}")
             return []
-        finally:
-            self.db.disconnect()
+
+    def iter_query(self, sql, params=None, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Построчно отдаёт результат запроса через именованный (серверный) курсор.
+
+        В памяти одновременно не больше batch_size строк, поэтому так можно
+        выгружать таблицы любого размера. Соединение занято, пока генератор
+        не исчерпан или не закрыт. Ошибки не перехватываются - их
+        обрабатывает вызывающий код.
+
+        Yields:
+            tuple: Строки результата
+        """
+        with self.db.connection() as conn:
+            with conn.cursor(name=f"export_{next(_cursor_names)}") as cur:
+                cur.itersize = batch_size
+                cur.execute(sql, params)
+                yield from cur
+
+    APPOINTMENTS_EXPORT_SQL = """
+        SELECT a.id, a.date, a.time, a.animal_id, e.full_name, s.title, a.status
+        FROM Приёмы a
+        JOIN Сотрудники e ON a.vet_id = e.id
+        JOIN Услуги s ON a.service_id = s.id
+        WHERE a.date >= %s AND a.date < %s
+        ORDER BY a.date, a.time
+    """
+
+    def iter_appointments(self, date_from, date_to, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Приёмы за период для выгрузки (см. iter_query).
+
+        Args:
+            date_from (date|str): Первый день периода
+            date_to (date|str): Последний день периода (включительно)
+
+        Yields:
+            tuple: (id, дата, время, ID животного, врач, услуга, статус)
+        """
+        params = (_as_date(date_from), _as_date(date_to) + datetime.timedelta(days=1))
+        return self.iter_query(self.APPOINTMENTS_EXPORT_SQL, params, batch_size)
+
+    def count_appointments(self, date_from, date_to):
+        """
+        Количество приёмов за период (включительно).
+
+        Returns:
+            int: Количество или None при ошибке
+        """
+        sql = "SELECT COUNT(*) FROM Приёмы WHERE date >= %s AND date < %s;"
+        params = (_as_date(date_from), _as_date(date_to) + datetime.timedelta(days=1))
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    return cur.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Ошибка подсчёта приёмов: {str(e)}")
+            return None
+
+    def get_vet_bookings(self, date_from, date_to, vet_ids=None):
+        """
+        Занятое время врачей за период (одним запросом, для карты занятости)
+
+        Args:
+            date_from (str|date): Начало периода (включительно)
+            date_to (str|date): Конец периода (включительно)
+            vet_ids (list, optional): ID врачей; по умолчанию - все врачи
+
+        Returns:
+            list: Кортежи (vet_id, date, time, duration_minutes) неотменённых приёмов
+            или None при ошибке (занятость неизвестна)
+        """
+        sql = """
+        SELECT a.vet_id, a.date, a.time, s.duration_minutes
+        FROM Приёмы a
+        JOIN Услуги s ON s.id = a.service_id
+        WHERE a.date BETWEEN %s AND %s AND a.status != 'отменен'
+        """
+        params = [date_from, date_to]
+
+        if vet_ids is not None:
+            sql += " AND a.vet_id = ANY(%s)"
+            params.append(list(vet_ids))
+
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении занятости врачей: {e}")
+            return None
 
     def get_all_appointments(self, status_filter=None):
         """Получает все приёмы из базы данных с опциональной фильтрацией по статусу
@@ -710,111 +1268,120 @@ class PostgresModels:
         sql += " ORDER BY date, time"
 
         try:
-            conn = self.db.connect()
-            if not conn:
-                logging.error("Не удалось подключиться к базе данных")
-                return []
-
-            with conn.cursor() as cur:
-                cur.execute(sql, tuple(params))
-                result = cur.fetchall()
-                logging.debug(f"Найдено {len(result)} приемов" +
-                              (f" со статусом {status_filter}" if status_filter else ""))
-                return result
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, tuple(params))
+                    result = cur.fetchall()
+                    logger.debug(f"Найдено {len(result)} приемов" +
+                                  (f" со статусом {status_filter}" if status_filter else ""))
+                    return result
         except Exception as e:
-            logging.error(f"Ошибка в get_all_appointments: {str(e)}")
+            logger.error(f"Ошибка в get_all_appointments: {str(e)}")
             return []
-        finally:
-            self.db.disconnect()
+
+    # Итог, услуги, врачи и филиалы - один проход по Доход_по_дням.
+    # GROUPING() отличает строку набора от NULL в данных (врач без филиала).
+    FINANCE_SQL = """
+        WITH totals AS (
+            SELECT
+                GROUPING(r.service_id, r.vet_id, r.branch_id) AS grouping_set,
+                r.service_id, r.vet_id, r.branch_id,
+                SUM(r.completed_count) AS completed,
+                SUM(r.income) AS income,
+                COUNT(DISTINCT r.vet_id) AS doctors_count
+            FROM Доход_по_дням r
+            WHERE r.date >= %s AND r.date < %s
+            GROUP BY GROUPING SETS ((), (r.service_id), (r.vet_id), (r.branch_id))
+        )
+        SELECT t.grouping_set, COALESCE(t.service_id, t.vet_id, t.branch_id),
+               COALESCE(s.title, e.full_name, b.name),
+               t.completed, t.income, t.doctors_count
+        FROM totals t
+        LEFT JOIN Услуги s ON t.grouping_set = 3 AND s.id = t.service_id
+        LEFT JOIN Сотрудники e ON t.grouping_set = 5 AND e.id = t.vet_id
+        LEFT JOIN Филиалы b ON t.grouping_set = 6 AND b.id = t.branch_id
+        ORDER BY t.completed DESC, t.income DESC
+    """
 
     def get_financial_stats(self, date_from, date_to):
-        """Получает финансовую статистику за период"""
-        try:
-            conn = self.db.connect()
-            if not conn:
-                raise Exception("Не удалось подключиться к базе данных")
-
-            # Основные показатели
-            sql_main = """
-                SELECT 
-                    COUNT(*) as total_count,
-                    COALESCE(SUM(s.price), 0) as total_income,
-                    COUNT(DISTINCT a.vet_id) as doctors_count
-                FROM Приёмы a
-                JOIN Услуги s ON a.service_id = s.id
-                WHERE a.status = 'завершен' 
-                    AND a.date BETWEEN %s AND %s
-                """
-
-            # Статистика по услугам
-            sql_services = """
-                SELECT 
-                    s.title as service_name,
-                    COUNT(*) as service_count,
-                    COALESCE(SUM(s.price), 0) as service_income
-                FROM Приёмы a
-                JOIN Услуги s ON a.service_id = s.id
-                WHERE a.status = 'завершен' 
-                    AND a.date BETWEEN %s AND %s
-                GROUP BY s.title
-                ORDER BY service_count DESC
-                """
-
-            # Статистика по врачам
-            sql_doctors = """
-                SELECT 
-                    e.full_name as doctor_name,
-                    COUNT(*) as appointment_count,
-                    COALESCE(SUM(s.price), 0) as doctor_income
-                FROM Приёмы a
-                JOIN Услуги s ON a.service_id = s.id
-                JOIN Сотрудники e ON a.vet_id = e.id
-                WHERE a.status = 'завершен' 
-                    AND a.date BETWEEN %s AND %s
-                GROUP BY e.full_name
-                ORDER BY appointment_count DESC
-                """
-
-            params = (date_from, date_to)
-
-            with conn.cursor() as cur:
-                # Основные показатели
-                cur.execute(sql_main, params)
-                main_stats = cur.fetchone()
-
-                # Статистика по услугам
-                cur.execute(sql_services, params)
-                services = []
-                for row in cur.fetchall():
-                    services.append({
-                        'service_name': row[0],
-                        'service_count': row[1],
-                        'service_income': float(row[2])
-                    })
-
-                # Статистика по врачам
-                cur.execute(sql_doctors, params)
-                doctors = []
-                for row in cur.fetchall():
-                    doctors.append({
-                        'doctor_name': row[0],
-                        'appointment_count': row[1],
-                        'doctor_income': float(row[2])
-                    })
-
-                return {
-                    'total_count': main_stats[0] if main_stats else 0,
-                    'total_income': float(main_stats[1]) if main_stats else 0.0,
-                    'doctors_count': main_stats[2] if main_stats else 0,
-                    'services': services,
-                    'doctors': doctors
-                }
+        """
+        Финансовая статистика за период из сводной таблицы Доход_по_дням.
+
+        Итоги и разбивки по услугам, врачам и филиалам считаются одним
+        запросом (GROUPING SETS) по полуинтервалу дат.
 
+        Args:
+            date_from (date|str): Первый день периода
+            date_to (date|str): Последний день периода (включительно)
+
+        Returns:
+            FinanceStats: Показатели или None при ошибке
+        """
+        date_from, date_to = _as_date(date_from), _as_date(date_to)
+        total_count, total_income, doctors_count = 0, 0.0, 0
+        sets = {3: [], 5: [], 6: []}  # Номер набора GROUPING() -> строки разбивки
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(self.FINANCE_SQL, (date_from, date_to + datetime.timedelta(days=1)))
+                    for grouping_set, key, name, count, income, doctors in cur.fetchall():
+                        if grouping_set == 7:
+                            total_count, total_income, doctors_count = int(count or 0), float(income or 0), doctors
+                        else:
+                            if name is None:
+                                name = "Без филиала" if grouping_set == 6 else f"#{key}"
+                            sets[grouping_set].append(FinanceLine(key, name, int(count), float(income)))
         except Exception as e:
-            logging.error(f"Ошибка при получении финансовой статистики: {str(e)}")
+            logger.error(f"Ошибка при получении финансовой статистики: {str(e)}")
+            return None
+
+        return FinanceStats(
+            date_from, date_to, total_count, total_income, doctors_count,
+            services=sets[3], doctors=sets[5], branches=sets[6]
+        )
+
+    def rebuild_revenue_rollup(self, date_from=None, date_to=None):
+        """
+        Пересчитывает сводную таблицу Доход_по_дням по приёмам (за период или целиком).
+
+        Обычно таблица ведётся триггером; пересчёт нужен после ручной правки
+        данных или восстановления из резервной копии.
+
+        Returns:
+            int: Количество строк сводной таблицы за период или None при ошибке
+        """
+        conditions = []
+        params = []
+        if date_from is not None:
+            conditions.append("date >= %s")
+            params.append(date_from)
+        if date_to is not None:
+            conditions.append("date <= %s")
+            params.append(date_to)
+        rollup_where = " AND ".join(conditions) or "TRUE"
+        source_where = " AND ".join("a." + c for c in conditions) or "TRUE"
+
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    # Изменения приёмов ждут окончания пересчёта и применяются после него
+                    cur.execute("LOCK TABLE Доход_по_дням IN SHARE ROW EXCLUSIVE MODE;")
+                    cur.execute(f"DELETE FROM Доход_по_дням WHERE {rollup_where};", params)
+                    cur.execute(f"""
+                        INSERT INTO Доход_по_дням (date, vet_id, service_id, branch_id, completed_count, income)
+                        SELECT a.date, a.vet_id, a.service_id, e.branch_id, COUNT(*), SUM(s.price)
+                        FROM Приёмы a
+                        JOIN Услуги s ON s.id = a.service_id
+                        JOIN Сотрудники e ON e.id = a.vet_id
+                        WHERE a.status = 'завершен' AND {source_where}
+                        GROUP BY a.date, a.vet_id, a.service_id, e.branch_id;
+                    """, params)
+                    rows = cur.rowcount
+                    conn.commit()
+            return rows
+        except Exception as e:
+            logger.error(f"Ошибка пересчёта сводной таблицы доходов: {str(e)}")
             return None
-        finally:
-            self.db.disconnect()
 
     def get_all_doctors(self):
         """Получаем всех сотрудников с ролью 'doctor"""
@@ -825,48 +1392,165 @@ class PostgresModels:
         ORDER BY full_name
         """
         try:
-            conn = self.db.connect()
-            cur = self.db.get_cursor()
-            if conn and cur:
-                cur.execute(sql)
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    return cur.fetchall()
         except Exception as e:
-            logging.error(f"Ошибка при получении списка врачей: {str(e)}")
+            logger.error(f"Ошибка при получении списка врачей: {str(e)}")
             return []
-        finally:
-            self.db.disconnect()
 
-    def get_monthly_stats(self, year=None):
-        """Статистика приемов и услуг по месяцам"""
+    def get_branch_doctors(self, branch_id):
+        """Врачи филиала (id, full_name)"""
         sql = """
-        SELECT 
-            EXTRACT(MONTH FROM date) AS month,
-            COUNT(*) AS total_appointments,
-            COUNT(DISTINCT animal_id) AS unique_animals,
-            COUNT(DISTINCT vet_id) AS unique_vets,
-            SUM(CASE WHEN status = 'завершен' THEN 1 ELSE 0 END) AS completed,
-            SUM(s.price) AS total_income
-        FROM Приёмы a
-        JOIN Услуги s ON a.service_id = s.id
+        SELECT id, full_name
+        FROM Сотрудники
+        WHERE role = 'doctor' AND branch_id = %s
+        ORDER BY full_name
+        """
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (branch_id,))
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении врачей филиала: {str(e)}")
+            return []
+
+    def get_monthly_stats(self, year=None):
         """
+        Статистика приемов и услуг по месяцам.
+
+        Фильтр по году - полуинтервал дат (использует индексы по date),
+        группировка - date_trunc('month'). Завершённые приёмы и доход берутся
+        из сводной таблицы Доход_по_дням; общее количество приёмов и
+        уникальных животных - из Приёмы (без соединения с Услуги).
 
+        Returns:
+            list: (начало месяца, всего приёмов, животных, врачей, завершено, доход)
+        """
+        where = ""
         params = []
         if year:
-            sql += " WHERE EXTRACT(YEAR FROM date) = %s"
-            params.append(year)
-
-        sql += " GROUP BY month ORDER BY month"
+            where = " WHERE date >= %s AND date < %s"
+            params = list(year_range(year))
+
+        sql = f"""
+        WITH visits AS (
+            SELECT
+                date_trunc('month', date)::date AS month,
+                COUNT(*) AS total_appointments,
+                COUNT(DISTINCT animal_id) AS unique_animals,
+                COUNT(DISTINCT vet_id) AS unique_vets
+            FROM Приёмы{where}
+            GROUP BY 1
+        ),
+        revenue AS (
+            SELECT
+                date_trunc('month', date)::date AS month,
+                SUM(completed_count) AS completed,
+                SUM(income) AS total_income
+            FROM Доход_по_дням{where}
+            GROUP BY 1
+        )
+        SELECT v.month, v.total_appointments, v.unique_animals, v.unique_vets,
+               COALESCE(r.completed, 0), COALESCE(r.total_income, 0)
+        FROM visits v
+        LEFT JOIN revenue r ON r.month = v.month
+        ORDER BY v.month
+        """
+        params = params * 2
 
         try:
-            conn = self.db.connect()
-            with conn.cursor() as cur:
-                cur.execute(sql, params)
-                return cur.fetchall()
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    return cur.fetchall()
         except Exception as e:
-            logging.error(f"Ошибка получения статистики: {str(e)}")
+            logger.error(f"Ошибка получения статистики: {str(e)}")
             return []
 
-    def check_vet_availability(self, vet_id, date, time, exclude_id=None):
+    def get_revenue_by_period(self, ranges, grain='month'):
+        """
+        Завершённые приёмы и доход по нескольким периодам одним запросом.
+
+        Каждый период - полуинтервал дат, поэтому по сводной таблице
+        выполняется поиск по диапазону индекса, а не полный просмотр
+        (например, сравнение нескольких лет).
+
+        Args:
+            ranges (list): Кортежи (метка, начало, конец) - конец не включается
+            grain (str): Шаг группировки date_trunc: 'day', 'week', 'month', 'quarter', 'year'
+
+        Returns:
+            list: (метка, начало шага, завершено, доход) по возрастанию или None при ошибке
+        """
+        if grain not in ('day', 'week', 'month', 'quarter', 'year'):
+            raise ValueError(f"Недопустимый шаг группировки: {grain}")
+        if not ranges:
+            return []
+
+        sql = """
+        SELECT p.label, date_trunc(%s, r.date)::date AS period,
+               SUM(r.completed_count), SUM(r.income)
+        FROM unnest(%s::text[], %s::date[], %s::date[]) AS p(label, date_from, date_to)
+        JOIN Доход_по_дням r ON r.date >= p.date_from AND r.date < p.date_to
+        GROUP BY p.label, period
+        ORDER BY period
+        """
+        params = (
+            grain,
+            [str(label) for label, _start, _end in ranges],
+            [start for _label, start, _end in ranges],
+            [end for _label, _start, end in ranges],
+        )
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params)
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка получения дохода по периодам: {str(e)}")
+            return None
+
+    # Приёмы врача в тот же день, пересекающиеся с интервалом [time, time + длительность)
+    CONFLICT_SQL = """
+    SELECT a.id
+    FROM Приёмы a
+    JOIN Услуги s ON s.id = a.service_id
+    WHERE a.vet_id = %(vet_id)s AND a.date = %(date)s AND a.status != 'отменен'
+      AND a.id != COALESCE(%(exclude_id)s, -1)
+      AND a.time < %(time)s::time + make_interval(mins => COALESCE(
+            (SELECT duration_minutes FROM Услуги WHERE id = %(service_id)s), 30))
+      AND %(time)s::time < a.time + make_interval(mins => s.duration_minutes)
+    LIMIT 1
+    """
+
+    @classmethod
+    def _find_conflict(cls, cur, vet_id, date, time, service_id=None, exclude_id=None, lock=False):
+        """
+        Ищет приём врача, пересекающийся с новым по времени с учётом длительности услуг.
+
+        Args:
+            lock (bool): Взять advisory-блокировку (врач, день) до конца транзакции,
+                чтобы параллельная запись не прошла между проверкой и вставкой
+
+        Returns:
+            int: ID пересекающегося приёма или None
+        """
+        if lock:
+            cur.execute(
+                "SELECT pg_advisory_xact_lock(%s, (%s::date - DATE '2000-01-01'));",
+                (vet_id, date)
+            )
+        cur.execute(cls.CONFLICT_SQL, {
+            'vet_id': vet_id, 'date': date, 'time': time,
+            'service_id': service_id, 'exclude_id': exclude_id,
+        })
+        row = cur.fetchone()
+        return row[0] if row else None
+
+    def check_vet_availability(self, vet_id, date, time, exclude_id=None, service_id=None):
         """
         Проверяет доступность ветеринара в указанное время
 
@@ -875,29 +1559,178 @@ class PostgresModels:
             date (str): Дата в формате 'YYYY-MM-DD'
             time (str): Время в формате 'HH:MM'
             exclude_id (int, optional): ID приёма для исключения (при редактировании)
+            service_id (int, optional): Услуга нового приёма (её длительность;
+                без услуги - 30 минут)
 
         Returns:
             bool: True если время занято, False если свободно
         """
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    return self._find_conflict(cur, vet_id, date, time, service_id, exclude_id) is not None
+        except Exception as e:
+            logger.error(f"Ошибка при проверке доступности ветеринара: {e}")
+            return True
+
+    def get_service_duration(self, service_id):
+        """Длительность услуги в минутах (30, если не удалось получить)"""
+        sql = "SELECT duration_minutes FROM Услуги WHERE id = %s;"
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (service_id,))
+                    row = cur.fetchone()
+                    return row[0] if row else 30
+        except Exception as e:
+            logger.error(f"Ошибка при получении длительности услуги: {e}")
+            return 30
+
+    # --- Графики работы ---
+
+    def get_schedule_templates(self):
+        """
+        Шаблоны рабочего времени филиалов и врачей.
+
+        Returns:
+            list: Кортежи (branch_id, vet_id, weekday, start_time, end_time, slot_minutes)
+            или None при ошибке
+        """
+        sql = """
+        SELECT branch_id, vet_id, weekday, start_time, end_time, slot_minutes
+        FROM Графики_работы
+        ORDER BY weekday, start_time
+        """
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении графиков работы: {e}")
+            return None
+
+    def get_schedule_exceptions(self):
+        """
+        Исключения из графиков (праздники, выходные, особые часы).
+
+        Returns:
+            list: Кортежи (branch_id, vet_id, date, start_time, end_time, slot_minutes)
+            или None при ошибке
+        """
         sql = """
-        SELECT id FROM Приёмы
-        WHERE vet_id = %s AND date = %s AND time = %s AND status != 'отменен'
+        SELECT branch_id, vet_id, date, start_time, end_time, slot_minutes
+        FROM Исключения_графика
+        ORDER BY date, start_time
         """
-        params = [vet_id, date, time]
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении исключений графика: {e}")
+            return None
 
-        if exclude_id:
-            sql += " AND id != %s"
-            params.append(exclude_id)
+    def get_doctor_branches(self):
+        """Филиалы врачей: список кортежей (vet_id, branch_id)"""
+        sql = "SELECT id, branch_id FROM Сотрудники WHERE role = 'doctor';"
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    return cur.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении филиалов врачей: {e}")
+            return []
+
+    def insert_schedule_template(self, weekday, start_time, end_time, branch_id=None, vet_id=None,
+                                 slot_minutes=30):
+        """
+        Добавляет смену в график филиала или врача.
+
+        Args:
+            weekday (int): День недели (1 - понедельник, 7 - воскресенье)
+            start_time (str): Начало смены 'HH:MM'
+            end_time (str): Конец смены 'HH:MM' (последний приём должен закончиться к нему)
+            branch_id (int, optional): Филиал
+            vet_id (int, optional): Врач (график врача важнее графика филиала)
+            slot_minutes (int): Шаг записи в минутах
 
+        Returns:
+            int: ID смены или None при ошибке
+        """
+        sql = """
+        INSERT INTO Графики_работы (branch_id, vet_id, weekday, start_time, end_time, slot_minutes)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id;
+        """
         try:
-            conn = self.db.connect()
-            with conn.cursor() as cur:
-                cur.execute(sql, params)
-                return cur.fetchone() is not None
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (branch_id, vet_id, weekday, start_time, end_time, slot_minutes))
+                    template_id = cur.fetchone()[0]
+                    conn.commit()
+            events.publish(events.SCHEDULE, template_id, events.INSERT)
+            return template_id
         except Exception as e:
-            print(f"Ошибка при проверке доступности ветеринара: {e}")
-            return True
-        finally:
-            if conn:
-                self.db.disconnect()
+            logger.error(f"Ошибка при добавлении смены в график: {e}")
+            return None
+
+    def delete_schedule_template(self, template_id):
+        sql = "DELETE FROM Графики_работы WHERE id = %s;"
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (template_id,))
+                    conn.commit()
+                    deleted = cur.rowcount > 0
+            if deleted:
+                events.publish(events.SCHEDULE, template_id, events.DELETE)
+            return deleted
+        except Exception as e:
+            logger.error(f"Ошибка при удалении смены из графика: {e}")
+            return False
+
+    def insert_schedule_exception(self, date, branch_id=None, vet_id=None, start_time=None,
+                                  end_time=None, slot_minutes=30, reason=None):
+        """
+        Добавляет исключение из графика на дату.
+
+        Без времени - выходной (праздник), со временем - особые часы работы.
+        Без филиала и врача исключение действует на всю клинику.
+
+        Returns:
+            int: ID исключения или None при ошибке
+        """
+        sql = """
+        INSERT INTO Исключения_графика (branch_id, vet_id, date, start_time, end_time, slot_minutes, reason)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        RETURNING id;
+        """
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (branch_id, vet_id, date, start_time, end_time, slot_minutes, reason))
+                    exception_id = cur.fetchone()[0]
+                    conn.commit()
+            events.publish(events.SCHEDULE, exception_id, events.INSERT)
+            return exception_id
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении исключения графика: {e}")
+            return None
 
+    def delete_schedule_exception(self, exception_id):
+        sql = "DELETE FROM Исключения_графика WHERE id = %s;"
+        try:
+            with self.db.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, (exception_id,))
+                    conn.commit()
+                    deleted = cur.rowcount > 0
+            if deleted:
+                events.publish(events.SCHEDULE, exception_id, events.DELETE)
+            return deleted
+        except Exception as e:
+            logger.error(f"Ошибка при удалении исключения графика: {e}")
+            return False
@@ -1,8 +1,62 @@
 # database_mongodb_connector.py
+import logging
 import os
+import threading
+
 from pymongo import MongoClient
 from dotenv import load_dotenv
 
+from database import database_instrumentation as instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+
+# Клиенты общие на процесс: у MongoClient собственный пул соединений и
+# фоновые потоки мониторинга, поэтому на один адрес держим один клиент
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(connection_string, max_pool_size=None, server_selection_timeout_ms=None):
+    """
+    Возвращает общий для процесса MongoClient.
+
+    Клиент создаётся с connect=False: подключение и потоки мониторинга
+    запускаются при первой операции, а не при создании.
+    """
+    if max_pool_size is None:
+        max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+    if server_selection_timeout_ms is None:
+        server_selection_timeout_ms = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+    key = (connection_string, max_pool_size, server_selection_timeout_ms)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = MongoClient(
+                connection_string,
+                maxPoolSize=max_pool_size,
+                serverSelectionTimeoutMS=server_selection_timeout_ms,
+                event_listeners=instrumentation.mongo_event_listeners(),
+                connect=False
+            )
+            _clients[key] = client
+            logger.info("Создан клиент MongoDB")
+        return client
+
+
+def close_all_clients():
+    """Закрывает все общие клиенты MongoDB (при завершении приложения)"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+    if clients:
+        logger.info("Отключение от MongoDB")
+
+
 class MongoDBConnector:
     def __init__(self):
         load_dotenv()
@@ -14,20 +68,18 @@ class MongoDBConnector:
         self.collection = None
 
     def connect(self):
+        """Привязывается к общему клиенту; сетевое подключение откладывается до первого запроса"""
         try:
-            self.client = MongoClient(self.connection_string)
+            self.client = get_client(self.connection_string)
             self.db = self.client[self.database_name]
             self.collection = self.db[self.collection_name]
-            print("Успешное подключение к MongoDB")
             return True
         except Exception as e:
-            print(f"Ошибка подключения к MongoDB: {e}")
+            logger.error(f"Ошибка подключения к MongoDB: {e}")
             return False
 
     def disconnect(self):
-        if self.client:
-            self.client.close()
-            print("Отключение от MongoDB")
+        """Отвязывается от общего клиента; сам клиент закрывает close_all_clients()"""
         self.client = None
         self.db = None
         self.collection = None
@@ -39,4 +91,4 @@ class MongoDBConnector:
         return self.db
 
     def get_client(self):
-        return self.client
\ No newline at end of file
+        return self.client
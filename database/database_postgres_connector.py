@@ -1,8 +1,254 @@
 #  database_postgres_connector.py
+import logging
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2 import extensions
 from dotenv import load_dotenv
 
+from database import database_instrumentation as instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class PostgresConnectionPool:
+    """
+    Потокобезопасный ограниченный пул соединений с PostgreSQL.
+
+    - держит не менее min_size и не более max_size соединений;
+    - закрывает соединения, простаивающие дольше idle_timeout секунд
+      (но не опускается ниже min_size);
+    - при выдаче проверяет соединение: закрытые отбрасываются, а
+      простоявшие дольше health_check_interval секунд пингуются SELECT 1;
+    - соединения выдаются через контекстный менеджер connection().
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, idle_timeout=300,
+                 health_check_interval=30, acquire_timeout=10):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Некорректные размеры пула соединений")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = deque()  # (соединение, время возврата в пул)
+        self._size = 0  # Всего открытых соединений (свободные + выданные)
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _new_connection(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=instrumentation.cursor_factory())
+        logger.info("Успешное подключение к PostgreSQL")
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle_locked(self, now):
+        """Закрывает соединения, простаивающие дольше idle_timeout (под блокировкой)"""
+        if not self.idle_timeout:
+            return
+        # Самые старые соединения лежат слева
+        while self._idle and self._size > self.min_size:
+            conn, released_at = self._idle[0]
+            if now - released_at < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._close_quietly(conn)
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Выдаёт соединение из пула, при необходимости открывая новое"""
+        started = time.monotonic()
+        try:
+            return self._acquire()
+        finally:
+            instrumentation.record_acquire(time.monotonic() - started)
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            conn = None
+            idle_for = 0.0
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeoutError("Пул соединений закрыт")
+                    now = time.monotonic()
+                    self._evict_idle_locked(now)
+                    if self._idle:
+                        conn, released_at = self._idle.pop()
+                        idle_for = now - released_at
+                        break
+                    if self._size < self.max_size:
+                        # Резервируем место под новое соединение
+                        self._size += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"Нет свободных соединений PostgreSQL (максимум {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    return self._new_connection()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+
+            if self._is_healthy(conn, idle_for):
+                return conn
+
+            # Соединение умерло: освобождаем место и пробуем ещё раз
+            self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    def release(self, conn, discard=False):
+        """Возвращает соединение в пул"""
+        if not discard and not conn.closed:
+            try:
+                # Не оставляем в пуле соединений с открытой транзакцией
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Контекстный менеджер для работы с соединением из пула.
+
+        При нормальном выходе незавершённая транзакция фиксируется,
+        при исключении - откатывается. Соединение возвращается в пул.
+        """
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+            if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_INTRANS:
+                conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def fill(self):
+        """Открывает соединения до min_size"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._new_connection()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            self.release(conn)
+
+    def close(self):
+        """Закрывает все свободные соединения; выданные закроются при возврате"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+        logger.info("Отключение от PostgreSQL")
+
+    def stats(self):
+        """Текущее состояние пула"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            }
+
+
+# Пулы общие на процесс: все PostgresConnector с одинаковым DSN делят один пул
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn):
+    """Возвращает общий для процесса пул соединений для указанного DSN"""
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None or pool._closed:
+            pool = PostgresConnectionPool(
+                dsn,
+                min_size=int(os.getenv("POSTGRES_POOL_MIN", "1")),
+                max_size=int(os.getenv("POSTGRES_POOL_MAX", "10")),
+                idle_timeout=float(os.getenv("POSTGRES_POOL_IDLE_TIMEOUT", "300")),
+                health_check_interval=float(os.getenv("POSTGRES_POOL_HEALTH_CHECK", "30")),
+                acquire_timeout=float(os.getenv("POSTGRES_POOL_ACQUIRE_TIMEOUT", "10")),
+            )
+            _pools[dsn] = pool
+        return pool
+
+
+def close_all_pools():
+    """Закрывает все пулы соединений (при завершении приложения)"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
 class PostgresConnector:
     def __init__(self):
         load_dotenv()
@@ -10,24 +256,35 @@ class PostgresConnector:
         self.conn = None
         self.cur = None
 
+    @property
+    def pool(self):
+        return get_pool(self.db_url)
+
+    def connection(self):
+        """Контекстный менеджер: соединение из общего пула"""
+        return self.pool.connection()
+
     def connect(self):
+        """Берёт соединение из пула для ручного управления (парный вызов - disconnect)"""
         if self.conn is None or self.conn.closed:
             try:
-                self.conn = psycopg2.connect(self.db_url)
+                self.conn = self.pool.acquire()
                 self.cur = self.conn.cursor()
-                print("Успешное подключение к PostgreSQL")
             except Exception as e:
-                print(f"Ошибка подключения к PostgreSQL: {e}")
+                logger.error(f"Ошибка подключения к PostgreSQL: {e}")
                 self.conn = None
                 self.cur = None
         return self.conn
 
     def disconnect(self):
+        """Возвращает соединение, взятое через connect(), обратно в пул"""
         if self.cur:
-            self.cur.close()
+            try:
+                self.cur.close()
+            except Exception:
+                pass
         if self.conn:
-            self.conn.close()
-            print("Отключение от PostgreSQL")
+            self.pool.release(self.conn)
         self.conn = None
         self.cur = None
 
@@ -36,4 +293,3 @@ class PostgresConnector:
 
     def get_cursor(self):
         return self.cur
-
@@ -5,6 +5,7 @@
 """
 import hashlib
 from database.database_models_pg import PostgresModels
+from logic.logic_session import start_session, end_session
 
 
 class AuthManager:
@@ -16,6 +17,10 @@ class AuthManager:
         """
         Аутентификация пользователя
 
+        Проверка пароля и запись в журнал входа выполняются одним запросом;
+        после входа открывается сессия и загружаются справочники (метод
+        вызывается в фоновой задаче окна входа).
+
         Параметры:
             login (str): Логин пользователя
             password (str): Пароль пользователя
@@ -24,27 +29,24 @@ class AuthManager:
             dict: Данные пользователя при успешной аутентификации
             None: При неудачной аутентификации
         """
-        # Получаем пользователя из базы данных
-        employee = self.db.get_employee_by_login(login)
+        # Простая проверка пароля БЕЗ хеширования (сравнение в запросе)
+        employee = self.db.authenticate_employee(login, password)
 
         if not employee:
             return None
 
-        # Простая проверка пароля БЕЗ хеширования
-        if password != employee[3]:  # 3 - индекс password_hash в кортеже
-            return None
-
         # Формируем данные пользователя
         user_data = {
             'id': employee[0],
             'full_name': employee[1],
             'login': employee[2],
-            'role': employee[4],
-            'branch_id': employee[5]
+            'role': employee[3],
+            'branch_id': employee[4]
         }
+        branch = (employee[4], *employee[5:]) if employee[4] is not None else None
 
-        # Логируем вход
-        self.db.insert_login_log(user_data['id'], 'вход')
+        session = start_session(user_data, branch, self.db)
+        session.prefetch()
 
         self.current_user = user_data
         return user_data
@@ -90,4 +92,5 @@ class AuthManager:
         if self.current_user:
             self.db.insert_login_log(self.current_user['id'], 'выход')
             self.current_user = None
+            end_session()
 
@@ -0,0 +1,320 @@
+# logic_availability.py
+"""
+Карта занятости врачей.
+
+День врача хранится как битовая маска фиксированной ширины: сутки
+разбиты на ячейки по CELL_MINUTES минут, бит ячейки установлен, если
+её занимает неотменённый приём (с учётом длительности услуги). Слоты
+записи берутся из графика работы (logic_schedule), а проверка слота -
+одна операция над маской. Карта загружается одним запросом за период
+и дальше отвечает на вопросы о свободном времени без обращений к базе.
+
+Сетка занятости (врачи x дни x слоты) для календаря на неделю или месяц
+кэшируется по филиалам (последние GRIDS_PER_BRANCH периодов) и
+сбрасывается событиями изменения приёмов.
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from database import database_events as events
+from logic.logic_schedule import ScheduleIndex, get_schedule_index, to_date, to_minutes, from_minutes
+
+
+CELL_MINUTES = 5  # Ширина ячейки маски
+CELLS_PER_DAY = 24 * 60 // CELL_MINUTES
+DEFAULT_DURATION = 30  # Длительность приёма, если услуга неизвестна
+GRID_SLOT_MINUTES = 30  # Шаг слотов сетки занятости
+GRIDS_PER_BRANCH = 8  # Сколько последних сеток хранить на филиал
+
+
+def cell_range_mask(start, duration):
+    """Маска ячеек, которые занимает интервал [start, start + duration) в минутах"""
+    first = start // CELL_MINUTES
+    last = min(-(-(start + duration) // CELL_MINUTES), CELLS_PER_DAY)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def _to_minutes(value):
+    return value if isinstance(value, int) else to_minutes(value)
+
+
+class AvailabilityMap:
+    """Занятость врачей за период: (врач, день) -> маска занятых ячеек"""
+
+    def __init__(self, vet_ids, date_from, date_to, bookings=(), schedule=None):
+        """
+        Args:
+            vet_ids (iterable): ID врачей, для которых строится карта
+            date_from (date|str): Первый день периода
+            date_to (date|str): Последний день периода (включительно)
+            bookings (iterable): Кортежи (vet_id, date, time, duration_minutes) занятого времени
+            schedule (ScheduleIndex, optional): Графики работы (по умолчанию - пн-пт 9:00-18:30)
+        """
+        self.vet_ids = list(dict.fromkeys(vet_ids))
+        self.date_from = to_date(date_from)
+        self.date_to = to_date(date_to)
+        self.schedule = schedule or ScheduleIndex()
+        self._busy = {}  # (vet_id, date) -> маска занятых ячеек
+        for vet_id, day, booked_time, duration in bookings:
+            self.mark_busy(vet_id, day, booked_time, duration)
+
+    @classmethod
+    def load(cls, db, vet_ids, date_from, date_to, schedule=None):
+        """
+        Строит карту одним запросом к базе.
+
+        Args:
+            db (PostgresModels): Модель PostgreSQL
+            vet_ids (iterable): ID врачей
+            schedule (ScheduleIndex, optional): Графики (по умолчанию - общий индекс)
+
+        Returns:
+            AvailabilityMap: Карта или None, если занятость получить не удалось
+        """
+        vet_ids = list(vet_ids)
+        bookings = db.get_vet_bookings(date_from, date_to, vet_ids)
+        if bookings is None:
+            return None
+        return cls(vet_ids, date_from, date_to, bookings, schedule or get_schedule_index(db))
+
+    def covers(self, day):
+        """Входит ли день в период карты"""
+        return self.date_from <= to_date(day) <= self.date_to
+
+    def mark_busy(self, vet_id, day, booked_time, duration=None):
+        """Отмечает время приёма [booked_time, booked_time + duration) как занятое"""
+        mask = cell_range_mask(_to_minutes(booked_time), duration or DEFAULT_DURATION)
+        key = (vet_id, to_date(day))
+        self._busy[key] = self._busy.get(key, 0) | mask
+
+    def busy_mask(self, vet_id, day):
+        return self._busy.get((vet_id, to_date(day)), 0)
+
+    def is_free(self, vet_id, day, at, duration=None):
+        """Укладывается ли приём в график врача и не пересекается ли с другими"""
+        start = _to_minutes(at)
+        if not self.schedule.fits(vet_id, day, start, duration):
+            return False
+        length = duration or self._slot_length(vet_id, day, start)
+        return not self.busy_mask(vet_id, day) & cell_range_mask(start, length)
+
+    def _slot_length(self, vet_id, day, start):
+        for interval in self.schedule.intervals(vet_id, day):
+            if interval.start <= start < interval.end:
+                return interval.slot_minutes
+        return DEFAULT_DURATION
+
+    def _free_starts(self, vet_id, day, duration=None):
+        busy = self.busy_mask(vet_id, day)
+        return [
+            start for start, length in self.schedule.slots(vet_id, day, duration)
+            if not busy & cell_range_mask(start, length)
+        ]
+
+    def free_slots(self, vet_id, day, duration=None):
+        """
+        Свободные слоты врача на день.
+
+        Args:
+            duration (int, optional): Длительность приёма (по умолчанию - шаг графика)
+
+        Returns:
+            list: Время начала свободных слотов (datetime.time)
+        """
+        return [from_minutes(start) for start in self._free_starts(vet_id, day, duration)]
+
+    def first_free(self, day, after=None, vet_ids=None, duration=None):
+        """
+        Ближайший свободный слот дня у любого из врачей.
+
+        Args:
+            day (date|str): День
+            after (time, optional): Искать слоты, начинающиеся не раньше этого времени
+            vet_ids (iterable, optional): Среди каких врачей искать (по умолчанию - все)
+            duration (int, optional): Длительность приёма
+
+        Returns:
+            tuple: (время слота, ID врача) или None, если свободных слотов нет
+        """
+        earliest = _to_minutes(after) if after is not None else 0
+        best = None
+        for vet_id in (self.vet_ids if vet_ids is None else vet_ids):
+            for start in self._free_starts(vet_id, day, duration):
+                if start >= earliest:
+                    if best is None or start < best[0]:
+                        best = (start, vet_id)
+                    break
+        if best is None:
+            return None
+        return from_minutes(best[0]), best[1]
+
+    def vets_free_at(self, day, at, duration=None):
+        """ID врачей, у которых приём в это время укладывается в график и не пересекается с другими"""
+        return [vet_id for vet_id in self.vet_ids if self.is_free(vet_id, day, at, duration)]
+
+
+class AvailabilityGrid:
+    """
+    Плотная сетка свободного времени: free[врач][день][слот] -> bool.
+
+    Порядок врачей - vet_ids, дней - days, слотов - slots (общая для всех
+    врачей ось с шагом GRID_SLOT_MINUTES от самого раннего начала до самого
+    позднего конца смен в периоде). Слот свободен, если врач в это время
+    работает и не занят приёмом.
+    """
+
+    def __init__(self, availability, slot_minutes=GRID_SLOT_MINUTES):
+        """
+        Args:
+            availability (AvailabilityMap): Карта занятости, по которой строится сетка
+            slot_minutes (int): Шаг слотов сетки
+        """
+        self.availability = availability
+        self.vet_ids = list(availability.vet_ids)
+        self.days = [
+            availability.date_from + timedelta(days=offset)
+            for offset in range((availability.date_to - availability.date_from).days + 1)
+        ]
+
+        schedule = availability.schedule
+        intervals = [
+            interval
+            for vet_id in self.vet_ids for day in self.days
+            for interval in schedule.intervals(vet_id, day)
+        ]
+        first = min((i.start for i in intervals), default=0) // slot_minutes * slot_minutes
+        last = max((i.end for i in intervals), default=0)
+        starts = list(range(first, last - slot_minutes + 1, slot_minutes))
+        self.slots = [from_minutes(start) for start in starts]
+
+        self.free = []
+        for vet_id in self.vet_ids:
+            vet_rows = []
+            for day in self.days:
+                busy = availability.busy_mask(vet_id, day)
+                vet_rows.append([
+                    schedule.fits(vet_id, day, start, slot_minutes)
+                    and not busy & cell_range_mask(start, slot_minutes)
+                    for start in starts
+                ])
+            self.free.append(vet_rows)
+
+    def day_row(self, vet_id, day):
+        """Свободные слоты врача на день (список bool по slots)"""
+        return self.free[self.vet_ids.index(vet_id)][self.days.index(to_date(day))]
+
+    def is_free(self, vet_id, day, at, duration=None):
+        return self.availability.is_free(vet_id, day, at, duration)
+
+
+class AvailabilityCache:
+    """
+    Кэш сеток занятости по филиалам.
+
+    На филиал хранится не больше max_grids сеток: при переходе по неделям
+    и месяцам вытесняется сетка, к которой дольше всего не обращались.
+    Сетки сбрасываются при добавлении, изменении и удалении приёмов
+    затронутых врачей (а при изменении сотрудников и графиков - целиком).
+    События приходят в потоке записи, а сетки строятся в фоновых задачах,
+    поэтому доступ к кэшу защищён блокировкой, а сетка, запрос которой
+    начался до сброса, в кэш не попадает.
+    """
+
+    def __init__(self, db=None, max_grids=GRIDS_PER_BRANCH):
+        """
+        Args:
+            db (PostgresModels, optional): Модель PostgreSQL
+            max_grids (int): Сколько сеток хранить на филиал
+        """
+        if db is None:
+            from database.database_models_pg import PostgresModels
+            db = PostgresModels()
+        self.db = db
+        self.max_grids = max_grids
+        self._grids = {}  # филиал -> OrderedDict{(врачи, с, по): AvailabilityGrid}, LRU
+        self._generation = 0  # Номер сброса кэша
+        self._lock = threading.Lock()
+        events.subscribe(self.on_data_event)
+
+    def get_availability_grid(self, vet_ids, date_from, date_to, branch_id=None):
+        """
+        Сетка свободного времени врачей за период (одним запросом к базе).
+
+        Args:
+            vet_ids (iterable): ID врачей
+            date_from (date|str): Первый день
+            date_to (date|str): Последний день (включительно)
+            branch_id (int, optional): Филиал, в кэше которого хранится сетка
+
+        Returns:
+            AvailabilityGrid: Сетка или None, если занятость получить не удалось
+        """
+        vet_ids = tuple(dict.fromkeys(vet_ids))
+        key = (vet_ids, to_date(date_from), to_date(date_to))
+        with self._lock:
+            grids = self._grids.get(branch_id)
+            grid = grids.get(key) if grids is not None else None
+            if grid is not None:
+                grids.move_to_end(key)
+            generation = self._generation
+        if grid is not None:
+            return grid
+
+        availability = AvailabilityMap.load(self.db, vet_ids, key[1], key[2])
+        if availability is None:
+            return None
+        grid = AvailabilityGrid(availability)
+        with self._lock:
+            if generation == self._generation:
+                grids = self._grids.setdefault(branch_id, OrderedDict())
+                grids[key] = grid
+                grids.move_to_end(key)
+                while len(grids) > self.max_grids:
+                    grids.popitem(last=False)
+        return grid
+
+    def get_branch_grid(self, branch_id, date_from, date_to):
+        """Сетка свободного времени всех врачей филиала"""
+        vet_ids = [vet_id for vet_id, _name in self.db.get_branch_doctors(branch_id)]
+        return self.get_availability_grid(vet_ids, date_from, date_to, branch_id)
+
+    def invalidate(self, vet_ids=None):
+        """Сбрасывает сетки, в которые входят vet_ids (None - все сетки)"""
+        with self._lock:
+            self._generation += 1
+            if vet_ids is None:
+                self._grids.clear()
+                return
+            vet_ids = set(vet_ids)
+            for grids in self._grids.values():
+                for key in [key for key in grids if vet_ids.intersection(key[0])]:
+                    del grids[key]
+
+    def on_data_event(self, event):
+        if event.entity == events.APPOINTMENT:
+            self.invalidate(event.related)
+        elif event.entity in (events.EMPLOYEE, events.SCHEDULE, events.SERVICE):
+            # Врач мог перейти в другой филиал, изменились часы работы
+            # или длительность услуги
+            self.invalidate()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_availability_cache():
+    """Общий кэш сеток занятости"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AvailabilityCache()
+        return _cache
+
+
+def get_availability_grid(vet_ids, date_from, date_to, branch_id=None):
+    """Сетка свободного времени врачей за период (см. AvailabilityCache)"""
+    return get_availability_cache().get_availability_grid(vet_ids, date_from, date_to, branch_id)
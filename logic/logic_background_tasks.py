@@ -0,0 +1,174 @@
+# logic_background_tasks.py
+"""
+Фоновое выполнение обращений к базам данных.
+
+Запросы из интерфейса выполняются в QThreadPool, а результат, ошибка и
+прогресс возвращаются в поток интерфейса через сигналы. Задачи
+группируются по ключу: новая задача с тем же ключом вытесняет
+предыдущую (например, при быстрой смене даты в расписании), и результат
+вытесненной задачи уже не попадает в интерфейс.
+
+Задача, запущенная внутри трассируемого действия (logic_tracing),
+выполняется и обрабатывается в его контексте и продлевает действие до
+своего завершения.
+"""
+import logging
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from logic import logic_tracing as tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+class TaskCancelled(Exception):
+    """Задача отменена (бросается из функции задачи при проверке отмены)"""
+
+
+class TaskSignals(QObject):
+    """Сигналы задачи (QRunnable сам не может иметь сигналов)"""
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)
+    progress = pyqtSignal(int)
+    finished = pyqtSignal()
+
+
+class BackgroundTask(QRunnable):
+    """
+    Задача для QThreadPool.
+
+    Отмена кооперативная: уже выполняющийся запрос к базе не прерывается,
+    но функция, принимающая задачу (with_task=True), может проверять
+    is_cancelled() между шагами, а результат отменённой задачи не
+    отправляется в интерфейс.
+    """
+
+    def __init__(self, fn, *args, with_task=False, **kwargs):
+        """
+        Args:
+            fn (callable): Функция, выполняемая в фоновом потоке
+            with_task (bool): Передать задачу первым аргументом fn
+                (для report_progress и is_cancelled)
+        """
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.with_task = with_task
+        self.signals = TaskSignals()
+        self._cancelled = threading.Event()
+        self.action = tracing.current_action()  # Трассируемое действие, запустившее задачу
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        """Прерывает функцию задачи, если задача отменена"""
+        if self._cancelled.is_set():
+            raise TaskCancelled()
+
+    def report_progress(self, percent):
+        if not self._cancelled.is_set():
+            self.signals.progress.emit(int(percent))
+
+    def run(self):
+        with tracing.resume(self.action):
+            self._run()
+
+    def _run(self):
+        try:
+            if self.with_task:
+                result = self.fn(self, *self.args, **self.kwargs)
+            else:
+                result = self.fn(*self.args, **self.kwargs)
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            if not self._cancelled.is_set():
+                logger.error(f"Ошибка фоновой задачи: {e}")
+                self.signals.error.emit(e)
+        else:
+            if not self._cancelled.is_set():
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class TaskRunner:
+    """
+    Запускает фоновые задачи и вытесняет устаревшие.
+
+    На каждый ключ активна не более чем одна задача; обработчики
+    on_result/on_error/on_progress вызываются в потоке интерфейса и только
+    для актуальной задачи своего ключа.
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool or QThreadPool.globalInstance()
+        self._tasks = {}  # ключ -> актуальная задача
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, on_progress=None,
+               on_finished=None, with_task=False, **kwargs):
+        """
+        Запускает fn(*args, **kwargs) в фоне, отменяя предыдущую задачу с тем же ключом.
+
+        Returns:
+            BackgroundTask: Запущенная задача
+        """
+        self.cancel(key)
+        task = BackgroundTask(fn, *args, with_task=with_task, **kwargs)
+        action = task.action
+        if action is not None:
+            action.hold()
+
+        def is_current():
+            return self._tasks.get(key) is task and not task.is_cancelled()
+
+        def handler(callback):
+            def handle(value):
+                if is_current():
+                    with tracing.resume(action):
+                        callback(value)
+            return handle
+
+        if on_result is not None:
+            task.signals.result.connect(handler(on_result))
+        if on_error is not None:
+            task.signals.error.connect(handler(on_error))
+        if on_progress is not None:
+            task.signals.progress.connect(lambda percent: is_current() and on_progress(percent))
+
+        def finished():
+            current = is_current()
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+            try:
+                if current and on_finished is not None:
+                    with tracing.resume(action):
+                        on_finished()
+            finally:
+                if action is not None:
+                    action.release()
+
+        task.signals.finished.connect(finished)
+        self._tasks[key] = task
+        self.pool.start(task)
+        return task
+
+    def cancel(self, key):
+        """Отменяет актуальную задачу ключа (если есть)"""
+        task = self._tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def cancel_all(self):
+        for key in list(self._tasks):
+            self.cancel(key)
+
+    def is_running(self, key):
+        return key in self._tasks
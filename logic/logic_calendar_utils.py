@@ -3,8 +3,16 @@ from PyQt6.QtCore import QDate, QTime
 import logging
 from datetime import datetime
 
+from logic.logic_availability import get_availability_grid
+from logic.logic_schedule import get_schedule_index, to_date
+
+
+logger = logging.getLogger(__name__)
+
 
 class CalendarUtils:
+    # Часы работы, когда врач и дата неизвестны; для конкретного врача
+    # и дня действует график из logic_schedule
     WORKING_HOURS = {
         'start': QTime(9, 0),
         'end': QTime(18, 0),
@@ -12,34 +20,46 @@ class CalendarUtils:
     }
 
     @staticmethod
-    def get_available_slots(vet_id, date, db_connection):
-        """Возвращает список доступных временных слотов для врача на указанную дату"""
+    def get_available_slots(vet_id, date, duration=None):
+        """
+        Свободные слоты врача на дату (через общий кэш сеток занятости).
+
+        Args:
+            duration (int, optional): Длительность приёма в минутах
+
+        Returns:
+            list: Время начала слотов ('HH:MM')
+        """
         try:
             # Преобразуем date в строку, если это QDate
             date_str = date.toString('yyyy-MM-dd') if isinstance(date, QDate) else date
+            grid = get_availability_grid([vet_id], date_str, date_str)
+            if grid is None:
+                return []
+            return [slot.strftime('%H:%M') for slot in grid.availability.free_slots(vet_id, date_str, duration)]
+        except Exception as e:
+            logger.error(f"Ошибка при получении слотов: {str(e)}")
+            return []
 
-            booked_slots = db_connection.get_appointments_by_date(
-                date_str,
-                vet_id=vet_id
-            )
-            booked_times = {QTime.fromString(appt[4].strftime('%H:%M'), '%H:%M') for appt in booked_slots}
-
-            available_slots = []
-            current_time = CalendarUtils.WORKING_HOURS['start']
-
-            while current_time <= CalendarUtils.WORKING_HOURS['end']:
-                if current_time not in booked_times:
-                    available_slots.append(current_time.toString('HH:mm'))
-                current_time = current_time.addSecs(CalendarUtils.WORKING_HOURS['slot_duration'] * 60)
+    @staticmethod
+    def get_availability_grid(vet_ids, date_from, date_to, branch_id=None):
+        """
+        Сетка свободного времени врачей на неделю/месяц одним запросом.
 
-            return available_slots
+        Returns:
+            AvailabilityGrid: free[врач][день][слот] или None при ошибке
+        """
+        try:
+            date_from = date_from.toString('yyyy-MM-dd') if isinstance(date_from, QDate) else date_from
+            date_to = date_to.toString('yyyy-MM-dd') if isinstance(date_to, QDate) else date_to
+            return get_availability_grid(vet_ids, date_from, date_to, branch_id)
         except Exception as e:
-            logging.error(f"Ошибка при получении слотов: {str(e)}")
-            return []
+            logger.error(f"Ошибка при получении сетки занятости: {str(e)}")
+            return None
 
     @staticmethod
-    def validate_appointment_time(vet_id, date, time, db_connection, exclude_id=None):
-        """Проверяет, доступно ли время для записи"""
+    def validate_appointment_time(vet_id, date, time, db_connection, exclude_id=None, service_id=None):
+        """Проверяет, доступно ли время для записи (с учётом длительности услуги)"""
         try:
             # Преобразуем дату и время в строки
             date_str = date.toString('yyyy-MM-dd') if isinstance(date, QDate) else date
@@ -49,39 +69,56 @@ class CalendarUtils:
                 vet_id,
                 date_str,
                 time_str,
-                exclude_id
+                exclude_id,
+                service_id
             )
         except Exception as e:
-            logging.error(f"Ошибка валидации времени: {str(e)}")
+            logger.error(f"Ошибка валидации времени: {str(e)}")
             return False
 
     @staticmethod
-    def get_next_available_time():
-        """Возвращает ближайшее доступное время (округлённое до 30 минут)"""
+    def get_next_available_time(vet_id=None, date=None, duration=None):
+        """Возвращает ближайшее время записи по графику врача (или клиники)"""
         now = datetime.now()
-        current_time = QTime(now.hour, now.minute)
+        after = now
+        if date is not None and to_date(date) > now.date():
+            after = datetime.combine(to_date(date), datetime.min.time())
 
-        if not CalendarUtils.is_within_working_hours(current_time):
+        slot = get_schedule_index().next_slot(after, vet_id=vet_id, duration=duration)
+        if slot is None:
             return CalendarUtils.WORKING_HOURS['start']
-
-        if now.minute < 30:
-            return QTime(now.hour, 30)
-        return QTime(now.hour + 1 if now.hour < 23 else 23, 0)
+        return QTime(slot.hour, slot.minute)
 
     @staticmethod
-    def is_working_day(date):
-        """Проверяет, является ли день рабочим"""
-        if isinstance(date, str):
-            date = QDate.fromString(date, 'yyyy-MM-dd')
-        return date.dayOfWeek() not in (6, 7)
+    def is_working_day(date, vet_id=None, branch_id=None):
+        """Проверяет, является ли день рабочим по графику врача, филиала или клиники"""
+        try:
+            return get_schedule_index().is_working_day(to_date(date), vet_id, branch_id)
+        except Exception as e:
+            logger.error(f"Ошибка проверки рабочего дня: {str(e)}")
+            if isinstance(date, str):
+                date = QDate.fromString(date, 'yyyy-MM-dd')
+            return date.dayOfWeek() not in (6, 7)
 
     @staticmethod
-    def is_within_working_hours(time):
-        """Проверяет, попадает ли время в рабочие часы (9:00-18:00)"""
+    def is_within_working_hours(time, vet_id=None, date=None, duration=None):
+        """
+        Проверяет, попадает ли время в рабочие часы.
+
+        Без даты - часы по умолчанию (9:00-18:00), с датой - приём
+        должен уложиться в смену по графику врача.
+        """
         if isinstance(time, str):
             time = QTime.fromString(time, 'HH:mm')
-        return (CalendarUtils.WORKING_HOURS['start'] <= time <=
-                CalendarUtils.WORKING_HOURS['end'])
+        if date is None:
+            return (CalendarUtils.WORKING_HOURS['start'] <= time <=
+                    CalendarUtils.WORKING_HOURS['end'])
+        return get_schedule_index().fits(vet_id, to_date(date), time, duration)
+
+    @staticmethod
+    def describe_working_hours(date, vet_id=None):
+        """Часы работы на дату текстом (для сообщений)"""
+        return get_schedule_index().describe(vet_id, to_date(date))
 
     @staticmethod
     def is_past_time(date, time):
@@ -100,15 +137,16 @@ class CalendarUtils:
 
             return selected_datetime < current_datetime
         except Exception as e:
-            logging.error(f"Ошибка в is_past_time: {str(e)}")
+            logger.error(f"Ошибка в is_past_time: {str(e)}")
             return True  # В случае ошибки считаем время прошедшим
 
     @staticmethod
-    def validate_appointment_datetime(date, time, is_admin=False):
+    def validate_appointment_datetime(date, time, is_admin=False, vet_id=None, duration=None):
         """Проверяет корректность даты и времени приёма"""
-        # Проверка рабочего времени (9:00-18:00)
-        if not CalendarUtils.is_within_working_hours(time):
-            return False, "Запись возможна только с 9:00 до 18:00"
+        # Проверка рабочего времени по графику врача
+        if not CalendarUtils.is_within_working_hours(time, vet_id, date, duration):
+            hours = CalendarUtils.describe_working_hours(date, vet_id)
+            return False, f"Время вне графика работы ({hours})"
 
         # Проверка на прошедшее время (если не админ)
         if not is_admin and CalendarUtils.is_past_time(date, time):
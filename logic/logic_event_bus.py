@@ -0,0 +1,91 @@
+# logic_event_bus.py
+"""
+Шина событий изменения данных для интерфейса.
+
+Модели публикуют DataEvent(entity, id, op) после фиксации изменения
+(database_events), шина переправляет их в поток интерфейса сигналом
+data_changed. Виджеты подписываются через EventSubscription: события
+нужных сущностей применяются точечно, а пока виджет скрыт (неактивная
+вкладка), события копятся и применяются при его показе.
+"""
+from PyQt6.QtCore import QObject, QEvent, pyqtSignal
+
+from database import database_events
+
+
+class EventBus(QObject):
+    """Переправляет события моделей в поток интерфейса"""
+    data_changed = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        # emit из потока записи: получатели в потоке интерфейса
+        # вызываются через очередь событий Qt
+        database_events.subscribe(self.data_changed.emit)
+
+
+_bus = None
+
+
+def get_event_bus():
+    """
+    Возвращает общую шину событий.
+
+    Первый вызов должен быть из потока интерфейса (после создания
+    QApplication), чтобы шина принадлежала ему.
+    """
+    global _bus
+    if _bus is None:
+        _bus = EventBus()
+    return _bus
+
+
+class EventSubscription(QObject):
+    """
+    Доставляет виджету события указанных сущностей.
+
+    handler(events) получает список событий; пока виджет скрыт, события
+    копятся (не более max_pending), а при переполнении handler вызывается
+    с None - виджету нужно перезагрузить данные целиком.
+    """
+
+    def __init__(self, widget, entities, handler, max_pending=50):
+        super().__init__(widget)
+        self.widget = widget
+        self.entities = set(entities)
+        self.handler = handler
+        self.max_pending = max_pending
+        self._pending = []
+        self._overflow = False
+
+        widget.installEventFilter(self)
+        get_event_bus().data_changed.connect(self._on_event)
+
+    def _on_event(self, event):
+        if event.entity not in self.entities:
+            return
+        if self.widget.isVisible():
+            self.handler([event])
+            return
+        if self._overflow:
+            return
+        if len(self._pending) >= self.max_pending:
+            self._pending = []
+            self._overflow = True
+        else:
+            self._pending.append(event)
+
+    def eventFilter(self, obj, event):
+        if obj is self.widget and event.type() == QEvent.Type.Show:
+            self.flush()
+        return False
+
+    def flush(self):
+        """Применяет накопленные события"""
+        if self._overflow:
+            self._overflow = False
+            self._pending = []
+            self.handler(None)
+        elif self._pending:
+            pending, self._pending = self._pending, []
+            self.handler(pending)
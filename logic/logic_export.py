@@ -0,0 +1,387 @@
+# logic_export.py
+"""
+Потоковая выгрузка отчётов в CSV, Excel и PDF.
+
+Строки идут из источника (серверный курсор PostgreSQL, курсор MongoDB
+или модель таблицы) прямо в файл: CSV пишется модулем csv, XLSX -
+книгой openpyxl в режиме write_only, которая не держит лист в памяти.
+Поэтому объём памяти не зависит от числа строк, а выгрузку можно
+запускать в фоновой задаче (TaskRunner) с прогрессом и отменой.
+
+PDF собирается из таблиц по PDF_CHUNK_ROWS строк с повторяющимся
+заголовком: reportlab не разбивает по страницам одну огромную таблицу,
+а Paragraph создаётся только для ячеек, которые не помещаются в строку.
+Шрифт и стили регистрируются один раз на процесс.
+
+openpyxl и reportlab импортируются при первой выгрузке соответствующего
+формата, а не при импорте модуля: окно отчётов открывается без них.
+"""
+import csv
+import logging
+import os
+import threading
+from datetime import date, datetime, time
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, NamedTuple
+from xml.sax.saxutils import escape
+
+
+logger = logging.getLogger(__name__)
+
+
+PROGRESS_EVERY = 1000  # Строк между отчётами о прогрессе и проверками отмены
+ANIMAL_NAMES_BATCH = 1000  # Приёмов на один запрос имён животных в MongoDB
+PDF_CHUNK_ROWS = 40  # Строк в одной таблице PDF (примерно страница A4)
+PDF_BODY_FONT_SIZE = 8
+
+APPOINTMENT_HEADERS = ["ID", "Дата", "Время", "Животное", "Врач", "Услуга", "Статус"]
+ANIMAL_HEADERS = ["ID", "Имя", "Вид", "Порода", "Хозяин", "Телефон"]
+
+
+class ExportSource(NamedTuple):
+    """Что выгружать: заголовки, строки и (если известно) их количество"""
+    headers: list
+    rows: Iterable
+    total: int = None
+
+
+def _text_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%d.%m.%Y %H:%M")
+    if isinstance(value, date):
+        return value.strftime("%d.%m.%Y")
+    if isinstance(value, time):
+        return value.strftime("%H:%M")
+    return value
+
+
+def _xlsx_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (str, int, float, date, time)) or value is None:
+        return value
+    return str(value)
+
+
+class CsvWriter:
+    """Построчная запись в CSV (UTF-8 с BOM, чтобы Excel открыл кириллицу)"""
+
+    def __init__(self, path, headers):
+        self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file, delimiter=';')
+        self._writer.writerow(headers)
+
+    def write(self, row):
+        self._writer.writerow([_text_value(value) for value in row])
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxWriter:
+    """Построчная запись в XLSX через книгу openpyxl в режиме write_only"""
+
+    def __init__(self, path, headers, sheet_name="Данные"):
+        from openpyxl import Workbook
+
+        self.path = path
+        self._workbook = Workbook(write_only=True)
+        # Имя листа Excel - не длиннее 31 символа
+        self._sheet = self._workbook.create_sheet(title=sheet_name[:31])
+        self._sheet.append(list(headers))
+
+    def write(self, row):
+        self._sheet.append([_xlsx_value(value) for value in row])
+
+    def close(self):
+        self._workbook.save(self.path)
+        self._workbook.close()
+
+
+def open_writer(path, headers, sheet_name="Данные"):
+    """Писатель по расширению файла: .csv - CsvWriter, иначе XlsxWriter"""
+    if os.path.splitext(path)[1].lower() == '.csv':
+        return CsvWriter(path, headers)
+    return XlsxWriter(path, headers, sheet_name)
+
+
+def export_rows(task, path, source, sheet_name="Данные"):
+    """
+    Записывает строки источника в файл.
+
+    Функция фоновой задачи (with_task=True): каждые PROGRESS_EVERY строк
+    сообщает прогресс и проверяет отмену. При ошибке или отмене
+    недописанный файл удаляется.
+
+    Args:
+        task (BackgroundTask): Задача (None - без прогресса и отмены)
+        path (str): Файл .csv или .xlsx
+        source (ExportSource): Заголовки и строки
+
+    Returns:
+        int: Количество записанных строк
+    """
+    writer = open_writer(path, source.headers, sheet_name)
+    count = 0
+    try:
+        for row in source.rows:
+            writer.write(row)
+            count += 1
+            if task is not None and count % PROGRESS_EVERY == 0:
+                task.check_cancelled()
+                if source.total:
+                    task.report_progress(min(99, count * 100 // source.total))
+        writer.close()
+    except BaseException:
+        close = getattr(source.rows, 'close', None)
+        if close is not None:
+            # Освобождаем курсор источника
+            close()
+        try:
+            writer.close()
+        except Exception:
+            pass
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    if task is not None:
+        task.report_progress(100)
+    return count
+
+
+# --- PDF ---
+
+_pdf_lock = threading.Lock()
+_pdf_font = None
+_pdf_styles = None
+_pdf_table_style = None
+
+
+def pdf_font():
+    """
+    Шрифт с кириллицей (регистрируется один раз).
+
+    Приоритет: DejaVuSans, Arial, Helvetica (без кириллицы).
+    """
+    global _pdf_font
+    with _pdf_lock:
+        if _pdf_font is None:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            _pdf_font = 'Helvetica'
+            for name in ('DejaVuSans', 'Arial'):
+                try:
+                    pdfmetrics.registerFont(TTFont(name, f'{name}.ttf'))
+                    _pdf_font = name
+                    break
+                except Exception:
+                    continue
+            else:
+                logger.warning("Используется стандартный шрифт")
+        return _pdf_font
+
+
+def pdf_styles():
+    """Стили абзацев: Title - заголовок документа, Header/Body - ячейки таблицы"""
+    global _pdf_styles
+    font_name = pdf_font()
+    with _pdf_lock:
+        if _pdf_styles is None:
+            from reportlab.lib import colors
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+            styles = getSampleStyleSheet()
+            styles.add(ParagraphStyle(
+                name='Header', parent=styles['Normal'], fontName=font_name,
+                fontSize=9, leading=11, alignment=1, textColor=colors.white,
+                spaceBefore=2, spaceAfter=2
+            ))
+            styles.add(ParagraphStyle(
+                name='Body', parent=styles['Normal'], fontName=font_name,
+                fontSize=PDF_BODY_FONT_SIZE, leading=10, alignment=1, textColor=colors.black,
+                spaceBefore=2, spaceAfter=2
+            ))
+            styles['Title'].fontName = font_name
+            styles['Title'].fontSize = 14
+            styles['Title'].alignment = 1
+            _pdf_styles = styles
+        return _pdf_styles
+
+
+def pdf_table_style():
+    """Оформление таблицы: тёмный заголовок, серая сетка, светлый фон строк"""
+    global _pdf_table_style
+    font_name = pdf_font()
+    with _pdf_lock:
+        if _pdf_table_style is None:
+            from reportlab.lib import colors
+            from reportlab.platypus import TableStyle
+
+            _pdf_table_style = TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 0), (-1, -1), font_name),
+                ('FONTSIZE', (0, 0), (-1, 0), 9),
+                ('FONTSIZE', (0, 1), (-1, -1), PDF_BODY_FONT_SIZE),
+                ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+                ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('LEFTPADDING', (0, 0), (-1, -1), 3),
+                ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+            ])
+        return _pdf_table_style
+
+
+def pdf_column_widths(columns_count):
+    """Равные колонки по ширине альбомного A4 за вычетом полей"""
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import mm
+
+    page_width = landscape(A4)[0] - 20 * mm
+    return [page_width / columns_count * 0.95] * columns_count
+
+
+def _pdf_table(header, rows, widths):
+    from reportlab.platypus import Paragraph, Table
+
+    styles = pdf_styles()
+    cells = [Paragraph(f"<b>{escape(str(text))}</b>", styles['Header']) for text in header]
+    table = Table([cells] + rows, colWidths=widths, repeatRows=1)
+    table.setStyle(pdf_table_style())
+    return table
+
+
+def export_pdf(task, path, source, title):
+    """
+    Записывает строки источника в PDF (альбомный A4).
+
+    Функция фоновой задачи (with_task=True): первая половина прогресса -
+    чтение строк, вторая - вёрстка страниц; отмена проверяется на обоих
+    этапах. При ошибке или отмене недописанный файл удаляется.
+
+    Args:
+        task (BackgroundTask): Задача (None - без прогресса и отмены)
+        path (str): Файл .pdf
+        source (ExportSource): Заголовки и строки
+        title (str): Заголовок документа
+
+    Returns:
+        int: Количество строк в документе
+    """
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    styles = pdf_styles()
+    widths = pdf_column_widths(max(len(source.headers), 1))
+    # Примерно столько символов помещается в строку колонки
+    wrap_limits = [int(width / (PDF_BODY_FONT_SIZE * 0.55)) for width in widths]
+
+    elements = [Paragraph(escape(title), styles['Title']), Spacer(1, 5 * mm)]
+    chunk = []
+    count = 0
+    try:
+        for row in source.rows:
+            cells = []
+            for value, limit in zip(row, wrap_limits):
+                text = str(_text_value(value)).strip()
+                cells.append(Paragraph(escape(text), styles['Body']) if len(text) > limit else text)
+            chunk.append(cells)
+            count += 1
+            if len(chunk) == PDF_CHUNK_ROWS:
+                elements.append(_pdf_table(source.headers, chunk, widths))
+                chunk = []
+            if task is not None and count % PROGRESS_EVERY == 0:
+                task.check_cancelled()
+                if source.total:
+                    task.report_progress(min(49, count * 50 // source.total))
+        if chunk or not count:
+            elements.append(_pdf_table(source.headers, chunk, widths))
+    except BaseException:
+        close = getattr(source.rows, 'close', None)
+        if close is not None:
+            close()
+        raise
+
+    doc = SimpleDocTemplate(
+        path,
+        pagesize=landscape(A4),
+        leftMargin=10 * mm,
+        rightMargin=10 * mm,
+        topMargin=15 * mm,
+        bottomMargin=15 * mm
+    )
+    if task is not None:
+        total_flowables = len(elements)
+
+        def on_progress(kind, value):
+            if kind == 'PROGRESS':
+                task.check_cancelled()
+                task.report_progress(50 + min(49, value * 50 // total_flowables))
+
+        doc.setProgressCallBack(on_progress)
+
+    try:
+        doc.build(elements)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    if task is not None:
+        task.report_progress(100)
+    return count
+
+
+# --- Источники ---
+
+def table_source(table_model):
+    """Строки модели таблицы в отображаемом виде"""
+    return ExportSource(table_model.headers(), table_model.iter_display_rows(), table_model.total_rows())
+
+
+def appointments_source(db_pg, db_mongo, date_from, date_to):
+    """
+    Приёмы за период прямо из базы: серверный курсор PostgreSQL, имена
+    животных - одним запросом к MongoDB на каждые ANIMAL_NAMES_BATCH приёмов.
+    """
+    def rows():
+        appointments = db_pg.iter_appointments(date_from, date_to)
+        try:
+            while True:
+                batch = list(islice(appointments, ANIMAL_NAMES_BATCH))
+                if not batch:
+                    return
+                names = db_mongo.get_animal_names(row[3] for row in batch)
+                for appt_id, day, at, animal_id, vet_name, service_name, status in batch:
+                    yield [appt_id, day, at, names.get(str(animal_id), 'Неизвестно'),
+                           vet_name, service_name, status]
+        finally:
+            appointments.close()
+
+    return ExportSource(APPOINTMENT_HEADERS, rows(), db_pg.count_appointments(date_from, date_to))
+
+
+def animals_source(db_mongo, criteria=None):
+    """Животные по фильтру из курсора MongoDB"""
+    def rows():
+        animals = db_mongo.iter_animals(criteria)
+        try:
+            for animal in animals:
+                yield [
+                    str(animal['_id']),
+                    animal.get('name', ''),
+                    animal.get('species', ''),
+                    animal.get('breed', ''),
+                    animal.get('owner_name', ''),
+                    animal.get('owner_phone', ''),
+                ]
+        finally:
+            animals.close()
+
+    return ExportSource(ANIMAL_HEADERS, rows(), db_mongo.estimate_animals_count(criteria, max_count=10 ** 9))
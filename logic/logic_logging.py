@@ -0,0 +1,144 @@
+# logic_logging.py
+"""
+Журнал приложения.
+
+Модули пишут в журнал через logging.getLogger(__name__), а запись в файл
+и на консоль выполняет фоновый поток: корневой логгер получает только
+QueueHandler (постановка записи в очередь), а QueueListener в отдельном
+потоке передаёт записи обработчикам. Поэтому вызов logger.info() в методе
+модели не ждёт дискового ввода-вывода.
+
+Структурные поля передаются через extra и выводятся после сообщения:
+    logger.info("Филиал добавлен", extra={'entity': 'branch', 'op': 'insert', 'id': 5})
+    -> ... - Филиал добавлен | entity=branch op=insert id=5
+В формате json каждая запись - объект JSON в отдельной строке.
+
+Переменные окружения:
+    VET_LOG_FILE - файл журнала (по умолчанию app_errors_<дата>.log);
+    VET_LOG_LEVEL - общий уровень (по умолчанию INFO);
+    VET_LOG_LEVELS - уровни модулей: database=WARNING,database.database_models_pg=DEBUG;
+    VET_LOG_CONSOLE_LEVEL - уровень вывода на консоль (по умолчанию WARNING, OFF - без консоли);
+    VET_LOG_FORMAT - text (по умолчанию) или json;
+    VET_LOG_MAX_BYTES - размер файла до ротации (по умолчанию 5 МБ);
+    VET_LOG_BACKUPS - сколько старых файлов хранить (по умолчанию 5).
+"""
+import json
+import logging
+import os
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from dotenv import load_dotenv
+
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+# Атрибуты LogRecord, которые не считаются структурными полями
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+
+
+def structured_fields(record):
+    """Поля, переданные в запись через extra"""
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class StructuredFormatter(logging.Formatter):
+    """Текстовый формат: сообщение и поля extra в виде key=value"""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = structured_fields(record)
+        if fields:
+            text += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Формат json: одна запись - один объект JSON в строке"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        entry.update(structured_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def parse_levels(spec):
+    """
+    Разбирает уровни модулей из строки "модуль=УРОВЕНЬ,...".
+
+    Returns:
+        dict: Имя логгера -> уровень (нераспознанные элементы пропускаются)
+    """
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def setup_logging():
+    """
+    Настраивает журнал приложения по переменным окружения и запускает
+    фоновую запись. Повторный вызов перенастраивает журнал.
+
+    Returns:
+        QueueListener: Запущенный поток записи
+    """
+    global _listener
+    load_dotenv()
+    stop_logging()
+
+    formatter = JsonFormatter() if os.getenv("VET_LOG_FORMAT") == "json" else StructuredFormatter(TEXT_FORMAT)
+    file_handler = RotatingFileHandler(
+        os.getenv("VET_LOG_FILE") or f'app_errors_{datetime.now().strftime("%Y-%m-%d")}.log',
+        maxBytes=int(os.getenv("VET_LOG_MAX_BYTES", str(5 * 1024 * 1024))),
+        backupCount=int(os.getenv("VET_LOG_BACKUPS", "5")),
+        encoding='utf-8',
+    )
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+
+    console_level = os.getenv("VET_LOG_CONSOLE_LEVEL", "WARNING").upper()
+    if console_level != "OFF":
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(console_level)
+        console_handler.setFormatter(StructuredFormatter(TEXT_FORMAT))
+        handlers.append(console_handler)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(os.getenv("VET_LOG_LEVEL", "INFO").upper())
+    for name, level in parse_levels(os.getenv("VET_LOG_LEVELS")).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает фоновую запись"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
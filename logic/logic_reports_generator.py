@@ -1,11 +1,20 @@
 # logic_reports_generator.py
 from datetime import datetime, timedelta
 from PyQt6.QtCore import QDate
-from database.database_models_pg import PostgresModels
+from database.database_models_pg import PostgresModels, month_range, year_range
 from database.database_models_mongo import MongoDBModels
 import logging
 
 
+logger = logging.getLogger(__name__)
+
+
+MONTH_NAMES = [
+    "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
+]
+
+
 class ReportsGenerator:
     def __init__(self):
         self.db_pg = PostgresModels()
@@ -51,8 +60,7 @@ class ReportsGenerator:
                 ORDER BY a.date, a.time
             """
 
-            conn = self.db_pg.db.connect()
-            if conn:
+            with self.db_pg.db.connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(query, (date_from, date_to))
                     appointments = cursor.fetchall()
@@ -85,7 +93,7 @@ class ReportsGenerator:
             return headers, report_data
 
         except Exception as e:
-            logging.error(f"Ошибка генерации отчета по приемам: {str(e)}")
+            logger.error(f"Ошибка генерации отчета по приемам: {str(e)}")
             raise
 
     def generate_animals_by_diagnosis(self, diagnosis):
@@ -121,29 +129,27 @@ class ReportsGenerator:
             return headers, report_data
 
         except Exception as e:
-            logging.error(f"Ошибка генерации отчета по животным: {str(e)}")
+            logger.error(f"Ошибка генерации отчета по животным: {str(e)}")
             raise
 
     def generate_services_by_doctor(self, vet_id, date_from, date_to):
         """Генерация отчета по услугам врача с агрегацией на стороне БД"""
         try:
-            # Используем агрегирующий запрос для получения статистики по услугам
+            # Завершённые приёмы врача уже сгруппированы по дням в Доход_по_дням
             query = """
-                SELECT 
+                SELECT
                     s.title AS service_name,
-                    COUNT(a.id) AS service_count,
-                    SUM(s.price) AS service_total
-                FROM Приёмы a
-                JOIN Услуги s ON a.service_id = s.id
-                WHERE a.vet_id = %s 
-                    AND a.date BETWEEN %s AND %s
-                    AND a.status = 'завершен'
+                    SUM(r.completed_count) AS service_count,
+                    SUM(r.income) AS service_total
+                FROM Доход_по_дням r
+                JOIN Услуги s ON r.service_id = s.id
+                WHERE r.vet_id = %s
+                    AND r.date BETWEEN %s AND %s
                 GROUP BY s.title
                 ORDER BY service_count DESC
             """
 
-            conn = self.db_pg.db.connect()
-            if conn:
+            with self.db_pg.db.connection() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute(query, (vet_id, date_from, date_to))
                     services = cursor.fetchall()
@@ -161,167 +167,103 @@ class ReportsGenerator:
             return headers, report_data
 
         except Exception as e:
-            logging.error(f"Ошибка генерации отчета по услугам: {str(e)}")
+            logger.error(f"Ошибка генерации отчета по услугам: {str(e)}")
             raise
 
     def generate_finance_report(self, date_from, date_to):
         """Генерация финансового отчета за период с агрегацией"""
 
-        conn = None
-
         try:
-            conn = self.db_pg.db.connect()
-            if not conn:
-                raise Exception("Не удалось подключиться к базе данных")
-
-            # Основные показатели с агрегацией в одном запросе
-            main_query = """
-                   SELECT 
-                       COUNT(*) as total_count,
-                       COALESCE(SUM(s.price), 0) as total_income,
-                       COUNT(DISTINCT a.vet_id) as doctors_count
-                   FROM Приёмы a
-                   JOIN Услуги s ON a.service_id = s.id
-                   WHERE a.status = 'завершен' 
-                       AND a.date BETWEEN %s AND %s
-               """
-
-            # Статистика по услугам с агрегацией
-            services_query = """
-                   SELECT 
-                       s.title as service_name,
-                       COUNT(*) as service_count,
-                       COALESCE(SUM(s.price), 0) as service_income
-                   FROM Приёмы a
-                   JOIN Услуги s ON a.service_id = s.id
-                   WHERE a.status = 'завершен' 
-                       AND a.date BETWEEN %s AND %s
-                   GROUP BY s.title
-                   ORDER BY service_count DESC
-               """
-
-            # Статистика по врачам с агрегацией
-            doctors_query = """
-                   SELECT 
-                       e.full_name as doctor_name,
-                       COUNT(*) as appointment_count,
-                       COALESCE(SUM(s.price), 0) as doctor_income
-                   FROM Приёмы a
-                   JOIN Услуги s ON a.service_id = s.id
-                   JOIN Сотрудники e ON a.vet_id = e.id
-                   WHERE a.status = 'завершен' 
-                       AND a.date BETWEEN %s AND %s
-                   GROUP BY e.full_name
-                   ORDER BY appointment_count DESC
-               """
-
-            # Выполняем все запросы в рамках одного соединения
-            with conn.cursor() as cursor:
-                cursor.execute(main_query, (date_from, date_to))
-                main_stats = cursor.fetchone()
-
-                cursor.execute(services_query, (date_from, date_to))
-                services = cursor.fetchall()
-
-                cursor.execute(doctors_query, (date_from, date_to))
-                doctors = cursor.fetchall()
-
-            if not main_stats:
-                return ["Период", "Данные"], [["Нет данных за выбранный период"]]
-
-            headers = ["Категория", "Значение"]
-            data = [
-                ["Период отчета", f"{date_from} - {date_to}"],
-                ["Всего завершенных приемов", str(main_stats[0])],
-                ["Общий доход", f"{float(main_stats[1]):.2f} ₽"],
-                ["Количество работавших врачей", str(main_stats[2])],
-                ["", ""],  # Разделитель
-                ["Статистика по услугам", ""]
-            ]
-
-            # Добавляем данные по услугам
-            for service in services:
-                data.append([
-                    service[0],
-                    f"{service[1]} приемов на {float(service[2]):.2f} ₽"
-                ])
-
-            data.append(["", ""])  # Разделитель
-            data.append(["Статистика по врачам", ""])
-
-            # Добавляем данные по врачам
-            for doctor in doctors:
-                data.append([
-                    doctor[0],
-                    f"{doctor[1]} приемов на {float(doctor[2]):.2f} ₽"
-                ])
-
-            return headers, data
+            # Итоги и разбивки - один запрос по сводной таблице Доход_по_дням
+            stats = self.db_pg.get_financial_stats(date_from, date_to)
+            if stats is None:
+                raise RuntimeError("Не удалось получить финансовую статистику")
+            return stats.to_table()
 
         except Exception as e:
-            logging.error(f"Ошибка генерации финансового отчета: {str(e)}")
+            logger.error(f"Ошибка генерации финансового отчета: {str(e)}")
             return ["Ошибка", "Детали"], [[f"Не удалось сформировать отчет", str(e)]]
-        finally:
-            if conn:
-                self.db_pg.db.disconnect()
 
     def generate_monthly_stats_report(self, year=None, month=None):
         """Генерация месячной статистики с агрегацией"""
         try:
-            # Основной агрегирующий запрос
-            query = """
-                SELECT
-                    EXTRACT(MONTH FROM date) AS month,
-                    COUNT(*) FILTER (WHERE status = 'завершен') AS completed_count,
-                    COALESCE(SUM(s.price), 0) AS income
-                FROM Приёмы a
-                JOIN Услуги s ON a.service_id = s.id
-                WHERE status = 'завершен'
-            """
+            # Период - полуинтервал дат по Доход_по_дням (поиск по индексу),
+            # группировка - date_trunc('month') на стороне базы
+            year = year or datetime.now().year
+            period = month_range(year, month) if month else year_range(year)
+            stats = self.db_pg.get_revenue_by_period([(year, *period)])
+            if stats is None:
+                return ["Ошибка"], [["Не удалось получить данные статистики"]]
 
-            params = []
+            # Форматируем данные для отчета
+            data = []
+            for _label, month_start, completed, income in stats:
+                count = int(completed) if completed else 0
+                income = float(income) if income else 0.0
+                data.append([MONTH_NAMES[month_start.month - 1], count, f"{income:.2f} ₽"])
 
-            if year:
-                query += " AND EXTRACT(YEAR FROM date) = %s"
-                params.append(year)
-            if month:
-                query += " AND EXTRACT(MONTH FROM date) = %s"
-                params.append(month)
+            headers = ["Месяц", "Завершенных приемов", "Доход"]
+            return headers, data
 
-            query += " GROUP BY month ORDER BY month;"
+        except Exception as e:
+            logger.error(f"Ошибка генерации месячного отчета: {str(e)}", exc_info=True)
+            return ["Ошибка"], [[f"Ошибка формирования отчета: {str(e)}"]]
 
-            conn = self.db_pg.db.connect()
-            if not conn:
-                raise Exception("Не удалось подключиться к базе данных")
+    def generate_year_over_year_report(self, years, month=None):
+        """
+        Сравнение по годам: месяцы строками, годы колонками.
 
-            with conn.cursor() as cursor:
-                cursor.execute(query, tuple(params))
-                stats = cursor.fetchall()
+        Все годы запрашиваются одним запросом - по полуинтервалу дат на
+        каждый год (или на выбранный месяц каждого года).
 
-            month_names = [
-                "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
-                "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"
+        Args:
+            years (list): Сравниваемые годы
+            month (int, optional): Ограничить сравнение одним месяцем
+
+        Returns:
+            tuple: (заголовки, строки); последняя колонка - изменение дохода
+                последнего года к предыдущему в процентах
+        """
+        try:
+            years = sorted(set(years))
+            ranges = [
+                (year, *(month_range(year, month) if month else year_range(year)))
+                for year in years
             ]
+            stats = self.db_pg.get_revenue_by_period(ranges)
+            if stats is None:
+                return ["Ошибка"], [["Не удалось получить данные статистики"]]
+
+            # (месяц, год) -> (завершено, доход)
+            by_month = {}
+            for label, month_start, completed, income in stats:
+                by_month[(month_start.month, int(label))] = (
+                    int(completed or 0), float(income or 0)
+                )
+
+            months = [month] if month else sorted({m for m, _year in by_month})
+            headers = ["Месяц"]
+            for year in years:
+                headers += [f"Приемов {year}", f"Доход {year}"]
+            if len(years) > 1:
+                headers.append("Изменение дохода")
 
-            # Форматируем данные для отчета
             data = []
-            for row in stats:
-                try:
-                    month_num = int(row[0]) if row[0] else 1
-                    count = int(row[1]) if row[1] else 0
-                    income = float(row[2]) if row[2] else 0.0
-
-                    month_name = month_names[month_num - 1] if 1 <= month_num <= 12 else "Неизвестно"
-                    data.append([month_name, count, f"{income:.2f} ₽"])
-                except (IndexError, ValueError) as e:
-                    logging.error(f"Ошибка обработки данных: {row}. Ошибка: {str(e)}")
-                    continue
+            for month_num in months:
+                row = [MONTH_NAMES[month_num - 1]]
+                for year in years:
+                    count, income = by_month.get((month_num, year), (0, 0.0))
+                    row += [count, f"{income:.2f} ₽"]
+                if len(years) > 1:
+                    previous = by_month.get((month_num, years[-2]), (0, 0.0))[1]
+                    current = by_month.get((month_num, years[-1]), (0, 0.0))[1]
+                    row.append(f"{(current - previous) / previous * 100:+.1f}%" if previous else "—")
+                data.append(row)
 
-            headers = ["Месяц", "Завершенных приемов", "Доход"]
             return headers, data
 
         except Exception as e:
-            logging.error(f"Ошибка генерации месячного отчета: {str(e)}", exc_info=True)
+            logger.error(f"Ошибка генерации сравнения по годам: {str(e)}", exc_info=True)
             return ["Ошибка"], [[f"Ошибка формирования отчета: {str(e)}"]]
 
     # def generate_yearly_stats_report(self, year=None):
@@ -346,7 +288,7 @@ class ReportsGenerator:
     #
     #             query += " GROUP BY year ORDER BY year DESC"
     #
-    #             logging.debug(f"Executing yearly stats query: {query} with params: {params}")
+    #             logger.debug(f"Executing yearly stats query: {query} with params: {params}")
     #             cur.execute(query, params)
     #             stats = cur.fetchall()
     #
@@ -364,11 +306,11 @@ class ReportsGenerator:
     #                 income = float(row[2]) if row[2] is not None else 0.0
     #                 data.append([year, appointments, income])
     #             except Exception as e:
-    #                 logging.error(f"Ошибка обработки строки статистики: {row}. Ошибка: {str(e)}")
+    #                 logger.error(f"Ошибка обработки строки статистики: {row}. Ошибка: {str(e)}")
     #                 continue
     #
     #         return headers, data
     #
     #     except Exception as e:
-    #         logging.error(f"Ошибка генерации годового отчета: {str(e)}")
+    #         logger.error(f"Ошибка генерации годового отчета: {str(e)}")
     #         return ["Ошибка"], [[f"Не удалось получить данные: {str(e)}"]]
@@ -0,0 +1,256 @@
+# logic_schedule.py
+"""
+Графики работы филиалов и врачей.
+
+Шаблоны (смены по дням недели) и исключения на даты хранятся в
+PostgreSQL (Графики_работы, Исключения_графика) и компилируются в
+индекс интервалов в памяти: для врача и дня он сразу отдаёт список смен
+(начало, конец, шаг записи) в минутах от полуночи.
+
+Порядок применения для врача на дату:
+    1. исключение врача, филиала, всей клиники (в этом порядке);
+    2. шаблон врача, шаблон филиала на день недели;
+    3. график по умолчанию: пн-пт 9:00-18:30 с шагом 30 минут
+       (последняя запись в 18:00 - как было до появления графиков).
+Если у врача или филиала есть шаблон, но на этот день недели смен нет,
+день выходной.
+"""
+import bisect
+import threading
+from time import monotonic
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+
+from database import database_events as events
+
+
+class WorkingInterval(NamedTuple):
+    start: int  # Начало смены, минуты от полуночи
+    end: int  # Конец смены (приём должен закончиться к нему)
+    slot_minutes: int  # Шаг записи
+
+
+DEFAULT_SLOT_MINUTES = 30
+DEFAULT_WEEK = {
+    weekday: [WorkingInterval(9 * 60, 18 * 60 + 30, DEFAULT_SLOT_MINUTES)]
+    for weekday in range(1, 6)
+}
+
+CLINIC = ('clinic', None)
+
+
+def to_minutes(value):
+    """Минуты от полуночи для time, QTime или строки 'HH:MM'"""
+    if isinstance(value, str):
+        value = datetime.strptime(value[:5], '%H:%M').time()
+    if isinstance(value, timedelta):
+        return int(value.total_seconds()) // 60
+    if callable(getattr(value, 'hour', None)):
+        # QTime
+        return value.hour() * 60 + value.minute()
+    return value.hour * 60 + value.minute
+
+
+def from_minutes(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def to_date(value):
+    """datetime.date для date, datetime, QDate или строки 'YYYY-MM-DD'"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    # QDate
+    return date(value.year(), value.month(), value.day())
+
+
+def _scopes(branch_id, vet_id):
+    scopes = []
+    if vet_id is not None:
+        scopes.append(('vet', vet_id))
+    if branch_id is not None:
+        scopes.append(('branch', branch_id))
+    return scopes
+
+
+class ScheduleIndex:
+    """Скомпилированные графики: (область, день недели / дата) -> смены"""
+
+    def __init__(self, templates=(), exceptions=(), vet_branches=()):
+        """
+        Args:
+            templates (iterable): (branch_id, vet_id, weekday, start_time, end_time, slot_minutes)
+            exceptions (iterable): (branch_id, vet_id, date, start_time, end_time, slot_minutes);
+                без времени - выходной
+            vet_branches (iterable): (vet_id, branch_id)
+        """
+        self.vet_branches = dict(vet_branches)
+        self._templates = {}  # область -> {день недели: [смены]}
+        self._exceptions = {}  # дата -> {область: [смены]}
+
+        for branch_id, vet_id, weekday, start, end, slot_minutes in templates:
+            scope = _scopes(branch_id, vet_id)[0]
+            week = self._templates.setdefault(scope, {})
+            self._add(week.setdefault(weekday, []), start, end, slot_minutes)
+
+        for branch_id, vet_id, day, start, end, slot_minutes in exceptions:
+            scopes = _scopes(branch_id, vet_id) or [CLINIC]
+            intervals = self._exceptions.setdefault(to_date(day), {}).setdefault(scopes[0], [])
+            if start is not None and end is not None:
+                self._add(intervals, start, end, slot_minutes)
+
+    @staticmethod
+    def _add(intervals, start, end, slot_minutes):
+        interval = WorkingInterval(to_minutes(start), to_minutes(end), slot_minutes or DEFAULT_SLOT_MINUTES)
+        bisect.insort(intervals, interval)
+
+    @classmethod
+    def load(cls, db):
+        """
+        Загружает графики из базы.
+
+        Returns:
+            ScheduleIndex: Индекс или None, если графики получить не удалось
+        """
+        templates = db.get_schedule_templates()
+        exceptions = db.get_schedule_exceptions()
+        if templates is None or exceptions is None:
+            return None
+        return cls(templates, exceptions, db.get_doctor_branches())
+
+    def intervals(self, vet_id, day, branch_id=None):
+        """
+        Смены врача (или филиала, если vet_id не указан) на дату.
+
+        Returns:
+            list: WorkingInterval по возрастанию начала; пустой - выходной
+        """
+        day = to_date(day)
+        if branch_id is None and vet_id is not None:
+            branch_id = self.vet_branches.get(vet_id)
+        scopes = _scopes(branch_id, vet_id)
+
+        day_exceptions = self._exceptions.get(day)
+        if day_exceptions:
+            for scope in scopes + [CLINIC]:
+                if scope in day_exceptions:
+                    return day_exceptions[scope]
+
+        for scope in scopes:
+            week = self._templates.get(scope)
+            if week is not None:
+                return week.get(day.isoweekday(), [])
+        return DEFAULT_WEEK.get(day.isoweekday(), [])
+
+    def is_working_day(self, day, vet_id=None, branch_id=None):
+        return bool(self.intervals(vet_id, day, branch_id))
+
+    def fits(self, vet_id, day, start, duration=None, branch_id=None):
+        """
+        Укладывается ли приём [start, start + duration) в одну смену.
+
+        Args:
+            start: Время начала (time, QTime, 'HH:MM' или минуты)
+            duration (int, optional): Длительность в минутах (по умолчанию - шаг смены)
+        """
+        start = start if isinstance(start, int) else to_minutes(start)
+        for interval in self.intervals(vet_id, day, branch_id):
+            length = duration or interval.slot_minutes
+            if interval.start <= start and start + length <= interval.end:
+                return True
+        return False
+
+    def slots(self, vet_id, day, duration=None, branch_id=None):
+        """
+        Слоты записи на дату, в которые укладывается приём.
+
+        Args:
+            duration (int, optional): Длительность приёма (по умолчанию - шаг смены)
+
+        Returns:
+            list: Пары (начало в минутах, длительность в минутах)
+        """
+        slots = []
+        for interval in self.intervals(vet_id, day, branch_id):
+            length = duration or interval.slot_minutes
+            slots.extend(
+                (start, length)
+                for start in range(interval.start, interval.end - length + 1, interval.slot_minutes)
+            )
+        return slots
+
+    def slot_starts(self, vet_id, day, duration=None, branch_id=None):
+        """Начала слотов записи на дату (в минутах)"""
+        return [start for start, _length in self.slots(vet_id, day, duration, branch_id)]
+
+    def describe(self, vet_id, day, branch_id=None):
+        """Часы работы текстом, например '9:00-13:00, 14:00-18:30'"""
+        intervals = self.intervals(vet_id, day, branch_id)
+        if not intervals:
+            return "выходной"
+        return ", ".join(
+            f"{i.start // 60}:{i.start % 60:02d}-{i.end // 60}:{i.end % 60:02d}" for i in intervals
+        )
+
+    def next_slot(self, after, vet_id=None, branch_id=None, duration=None, days_ahead=31):
+        """
+        Ближайший слот записи, начинающийся не раньше after.
+
+        Args:
+            after (datetime): Момент, от которого искать
+            days_ahead (int): Сколько дней просматривать
+
+        Returns:
+            datetime: Начало слота или None, если в пределах days_ahead слотов нет
+        """
+        day = after.date()
+        earliest = after.hour * 60 + after.minute + (1 if after.second or after.microsecond else 0)
+        for offset in range(days_ahead + 1):
+            current = day + timedelta(days=offset)
+            for start in self.slot_starts(vet_id, current, duration, branch_id):
+                if offset or start >= earliest:
+                    return datetime.combine(current, from_minutes(start))
+        return None
+
+
+RELOAD_RETRY_SECONDS = 60  # Пауза перед повторной загрузкой после ошибки
+
+_index = None
+_index_stale = True
+_index_retry_at = 0.0
+_index_lock = threading.Lock()
+
+
+def _on_data_event(event):
+    global _index_stale
+    if event.entity in (events.SCHEDULE, events.EMPLOYEE, events.BRANCH):
+        _index_stale = True
+
+
+events.subscribe(_on_data_event)
+
+
+def get_schedule_index(db=None):
+    """
+    Общий индекс графиков; перестраивается после изменения графиков,
+    сотрудников или филиалов. Если графики получить не удалось, действует
+    график по умолчанию.
+    """
+    global _index, _index_stale, _index_retry_at
+    with _index_lock:
+        if (_index is None or _index_stale) and monotonic() >= _index_retry_at:
+            if db is None:
+                from database.database_models_pg import PostgresModels
+                db = PostgresModels()
+            _index_stale = False
+            loaded = ScheduleIndex.load(db)
+            if loaded is None:
+                # Не повторяем загрузку при каждом обращении, пока база недоступна
+                _index_stale = True
+                _index_retry_at = monotonic() + RELOAD_RETRY_SECONDS
+                loaded = _index or ScheduleIndex()
+            _index = loaded
+        return _index or ScheduleIndex()
@@ -0,0 +1,153 @@
+# logic_search_controller.py
+"""
+Поиск по мере ввода для списков (животные, филиалы, услуги).
+
+Контроллер откладывает запрос, пока пользователь печатает (debounce),
+вытесняет незавершённый запрос новым и кэширует результаты по ключу
+(фильтр, текст); текст в ключе без учёта регистра только для фильтров,
+которые уточняются локально (поиск подстроки или префикса). Если новый текст продолжает ранее найденный и тот
+результат полный, результат уточняется локально, без обращения к серверу.
+"""
+from collections import OrderedDict
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from logic.logic_background_tasks import TaskRunner
+
+
+class SearchController(QObject):
+    """
+    Сигналы:
+        results_ready(filter_type, text, rows) - результаты поиска
+        cleared() - строка поиска пуста, нужно показать полный список
+        failed(error) - ошибка запроса к базе
+    """
+    results_ready = pyqtSignal(str, str, object)
+    cleared = pyqtSignal()
+    failed = pyqtSignal(object)
+
+    def __init__(self, search, refine=None, delay_ms=300, cache_size=32,
+                 background=True, parent=None):
+        """
+        Args:
+            search (callable): search(filter_type, text) -> (rows, complete);
+                complete=False, если результат усечён (например, первая страница)
+            refine (callable, optional): refine(filter_type, text, rows) -> rows или None;
+                отбирает из полного результата более короткого запроса строки,
+                подходящие под продолжение текста. None - фильтр не уточняется
+                локально (например, точное совпадение по ID); для таких фильтров
+                должна возвращать None независимо от rows - по этому признаку
+                ключ кэша сохраняет регистр текста
+            delay_ms (int): Пауза после последнего нажатия перед запросом
+            cache_size (int): Сколько результатов хранить в кэше
+            background (bool): Выполнять search в фоновом потоке
+                (False - для поиска по уже загруженным данным)
+        """
+        super().__init__(parent)
+        self.search = search
+        self.refine = refine
+        self.cache_size = cache_size
+        self.background = background
+        self.tasks = TaskRunner()
+        self._cache = OrderedDict()  # (фильтр, текст) -> (rows, complete)
+        self._pending = None  # (фильтр, текст) для отложенного запроса
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay_ms)
+        self._timer.timeout.connect(self._run_pending)
+
+    def request(self, filter_type, text):
+        """Запрос по мере ввода: выполняется после паузы в наборе"""
+        self._pending = (filter_type, text.strip())
+        self._timer.start()
+
+    def search_now(self, filter_type, text):
+        """Немедленный запрос (кнопка «Поиск», Enter)"""
+        self._timer.stop()
+        self._pending = None
+        self._execute(filter_type, text.strip())
+
+    def invalidate(self):
+        """Сбрасывает кэш (после изменения данных)"""
+        self._cache.clear()
+
+    def cancel(self):
+        """Отменяет отложенный и выполняющийся запросы"""
+        self._timer.stop()
+        self._pending = None
+        self.tasks.cancel('search')
+
+    def _run_pending(self):
+        if self._pending is not None:
+            filter_type, text = self._pending
+            self._pending = None
+            self._execute(filter_type, text)
+
+    def _execute(self, filter_type, text):
+        if not text:
+            self.tasks.cancel('search')
+            self.cleared.emit()
+            return
+
+        key = self._key(filter_type, text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.tasks.cancel('search')
+            self.results_ready.emit(filter_type, text, cached[0])
+            return
+
+        rows = self._refine_cached(filter_type, text)
+        if rows is not None:
+            self.tasks.cancel('search')
+            self._store(key, rows, True)
+            self.results_ready.emit(filter_type, text, rows)
+            return
+
+        if not self.background:
+            try:
+                result = self.search(filter_type, text)
+            except Exception as e:
+                self.failed.emit(e)
+                return
+            self._on_result(filter_type, text, result)
+            return
+
+        self.tasks.submit(
+            'search', self.search, filter_type, text,
+            on_result=lambda result: self._on_result(filter_type, text, result),
+            on_error=self.failed.emit
+        )
+
+    def _refine_cached(self, filter_type, text):
+        """Уточняет самый длинный полный результат, текст которого - начало text"""
+        if self.refine is None:
+            return None
+        lowered = text.lower()
+        best = None
+        for (cached_filter, cached_text), (rows, complete) in self._cache.items():
+            if (complete and cached_filter == filter_type and lowered.startswith(cached_text)
+                    and (best is None or len(cached_text) > len(best[0]))):
+                best = (cached_text, rows)
+        if best is None:
+            return None
+        return self.refine(filter_type, text, best[1])
+
+    def _on_result(self, filter_type, text, result):
+        rows, complete = result
+        self._store(self._key(filter_type, text), rows, complete)
+        self.results_ready.emit(filter_type, text, rows)
+
+    def _key(self, filter_type, text):
+        """Ключ кэша: регистр не учитывается только у уточняемых фильтров"""
+        text = text.strip()
+        if self.refine is not None and self.refine(filter_type, text, ()) is not None:
+            text = text.lower()
+        return (filter_type, text)
+
+    def _store(self, key, rows, complete):
+        self._cache[key] = (rows, complete)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
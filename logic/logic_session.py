@@ -0,0 +1,130 @@
+# logic_session.py
+"""
+Сессия вошедшего пользователя.
+
+После входа AuthManager создаёт сессию и в той же фоновой задаче
+заранее загружает справочники (врачи, услуги) - вкладки и диалоги берут
+их из сессии, а не запрашивают базу при каждом открытии. Филиал
+пользователя приходит вместе с проверкой логина, права определяются
+ролью (ROLE_PERMISSIONS).
+
+Справочники сбрасываются по событиям изменения сотрудников и услуг
+(database_events) и загружаются заново при следующем обращении.
+"""
+import threading
+
+from database import database_events as events
+from database.database_models_pg import PostgresModels
+
+
+# Права
+MANAGE_SERVICES = 'manage_services'  # Добавление, изменение и удаление услуг
+BOOK_ANY_TIME = 'book_any_time'  # Запись на прошедшее время текущего дня
+
+ROLE_PERMISSIONS = {
+    'admin': frozenset({MANAGE_SERVICES, BOOK_ANY_TIME}),
+}
+
+
+class UserSession:
+    """Пользователь, его филиал, права и справочники"""
+
+    def __init__(self, user, branch=None, db=None):
+        """
+        Args:
+            user (dict): Данные пользователя (id, full_name, login, role, branch_id)
+            branch (tuple, optional): Филиал (id, name, address, phone)
+            db (PostgresModels, optional): Модель PostgreSQL
+        """
+        self.user = user
+        self.branch = branch
+        self.permissions = ROLE_PERMISSIONS.get(user.get('role'), frozenset())
+        self.db = db or PostgresModels()
+        self._doctors = None
+        self._services = None
+        self._lock = threading.Lock()
+        events.subscribe(self._on_data_event)
+
+    def can(self, permission):
+        """Есть ли у пользователя право permission"""
+        return permission in self.permissions
+
+    def prefetch(self):
+        """Загружает справочники одним соединением (вызывается в фоне после входа)"""
+        doctors, services = self.db.get_reference_data()
+        with self._lock:
+            self._doctors = doctors
+            self._services = services
+
+    def doctors(self):
+        """Врачи (id, full_name), по ФИО"""
+        with self._lock:
+            doctors = self._doctors
+        if doctors is None:
+            doctors = self.db.get_all_doctors() or []
+            with self._lock:
+                self._doctors = doctors
+        return doctors
+
+    def services(self):
+        """Услуги (id, title, description, price, duration_minutes)"""
+        with self._lock:
+            services = self._services
+        if services is None:
+            services = self.db.get_all_services() or []
+            with self._lock:
+                self._services = services
+        return services
+
+    def close(self):
+        events.unsubscribe(self._on_data_event)
+
+    def _on_data_event(self, event):
+        with self._lock:
+            if event.entity == events.EMPLOYEE:
+                self._doctors = None
+            elif event.entity == events.SERVICE:
+                self._services = None
+
+
+_session = None
+
+
+def start_session(user, branch=None, db=None):
+    """Открывает сессию пользователя (предыдущая закрывается)"""
+    global _session
+    end_session()
+    _session = UserSession(user, branch, db)
+    return _session
+
+
+def get_session():
+    """Текущая сессия или None, если вход не выполнен"""
+    return _session
+
+
+def end_session():
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def get_doctors(db):
+    """Врачи из сессии, а без неё - из базы через db"""
+    session = get_session()
+    return session.doctors() if session is not None else db.get_all_doctors() or []
+
+
+def get_services(db):
+    """Услуги из сессии, а без неё - из базы через db"""
+    session = get_session()
+    return session.services() if session is not None else db.get_all_services() or []
+
+
+def has_permission(user_data, permission):
+    """Право пользователя: по сессии, а без неё - по роли из user_data"""
+    session = get_session()
+    if session is not None and session.user.get('id') == user_data.get('id'):
+        return session.can(permission)
+    return permission in ROLE_PERMISSIONS.get(user_data.get('role'), frozenset())
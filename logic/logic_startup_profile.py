@@ -0,0 +1,133 @@
+# logic_startup_profile.py
+"""
+Замер времени запуска приложения.
+
+При VET_STARTUP_PROFILE=1 модуль подменяет встроенный __import__ и
+считает для каждого впервые импортируемого модуля собственное время и
+время вместе с вложенными импортами (как python -X importtime). Этапы
+запуска отмечаются mark(), создание вкладок и окон замеряется measure().
+report() пишет в журнал сводку: этапы, замеры и самые долгие импорты;
+с VET_STARTUP_PROFILE_FILE сводка дописывается и в файл.
+
+Модуль должен импортироваться в main.py первым - до PyQt и модулей
+приложения, иначе их импорт не попадёт в замер. По той же причине
+переменные читаются до загрузки .env и задаются в окружении процесса:
+    VET_STARTUP_PROFILE=1 python main.py
+"""
+import builtins
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("VET_STARTUP_PROFILE") == "1"
+REPORT_FILE = os.getenv("VET_STARTUP_PROFILE_FILE")
+TOP_IMPORTS = 20  # Сколько самых долгих импортов выводить
+
+_started = time.perf_counter()
+_original_import = builtins.__import__
+_imports = {}  # модуль -> [собственное время, полное время], мкс
+_import_order = []
+_marks = []  # (этап, мс от старта)
+_timings = []  # (замер, мс)
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _elapsed_ms():
+    return (time.perf_counter() - _started) * 1000
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Замеряются только первые импорты по абсолютному имени из главного потока
+    if level or name in sys.modules or threading.current_thread() is not threading.main_thread():
+        return _original_import(name, globals, locals, fromlist, level)
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(0)  # Время вложенных импортов
+    started = time.perf_counter_ns()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        cumulative = (time.perf_counter_ns() - started) // 1000
+        nested = stack.pop()
+        if stack:
+            stack[-1] += cumulative
+        if name not in _imports:
+            _import_order.append(name)
+        _imports[name] = [cumulative - nested, cumulative]
+
+
+def install():
+    """Включает замер импортов (при VET_STARTUP_PROFILE=1)"""
+    if ENABLED and builtins.__import__ is not _timed_import:
+        builtins.__import__ = _timed_import
+
+
+def uninstall():
+    """Возвращает стандартный __import__"""
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+
+def mark(stage):
+    """Отмечает этап запуска (время от старта процесса)"""
+    if ENABLED:
+        with _lock:
+            _marks.append((stage, _elapsed_ms()))
+
+
+@contextmanager
+def measure(name):
+    """Замеряет блок (создание вкладки, окна); при включённом замере - пишет в журнал"""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        with _lock:
+            _timings.append((name, elapsed))
+        logger.info(f"[startup] {name}: {elapsed:.1f} мс", extra={'op': name, 'duration_ms': round(elapsed, 3)})
+
+
+def format_report(top=TOP_IMPORTS):
+    """Сводка замеров в виде текста"""
+    lines = [f"Запуск: {_elapsed_ms():.1f} мс от импорта профилировщика"]
+    with _lock:
+        marks = list(_marks)
+        timings = list(_timings)
+    if marks:
+        lines.append("Этапы (мс от старта):")
+        lines.extend(f"  {at:10.1f}  {stage}" for stage, at in marks)
+    if timings:
+        lines.append("Замеры (мс):")
+        lines.extend(f"  {elapsed:10.1f}  {name}" for name, elapsed in timings)
+    if _imports:
+        slowest = sorted(_import_order, key=lambda name: _imports[name][1], reverse=True)[:top]
+        lines.append(f"Импорты: {len(_imports)}, самые долгие (мкс):")
+        lines.append(f"  {'self':>10} | {'cumulative':>10} | module")
+        lines.extend(f"  {_imports[name][0]:>10} | {_imports[name][1]:>10} | {name}" for name in slowest)
+    return "\n".join(lines)
+
+
+def report(top=TOP_IMPORTS):
+    """Пишет сводку в журнал (и в VET_STARTUP_PROFILE_FILE)"""
+    if not ENABLED:
+        return
+    text = format_report(top)
+    logger.info(f"[startup]\n{text}")
+    if REPORT_FILE:
+        try:
+            with open(REPORT_FILE, 'a', encoding='utf-8') as file:
+                file.write(text + "\n\n")
+        except Exception as e:
+            logger.error(f"Ошибка записи отчёта о запуске: {e}")
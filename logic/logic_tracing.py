@@ -0,0 +1,248 @@
+# logic_tracing.py
+"""
+Трассировка действий интерфейса.
+
+Действие (загрузка расписания, карточка животного, формирование отчёта)
+открывается через trace_action(): внутри него каждый вызов метода модели,
+каждое обращение к серверу и каждое заполнение таблицы (trace_span)
+становятся дочерними интервалами. Действие продолжается в фоновых
+задачах TaskRunner, запущенных внутри него, и в их обработчиках
+результата, а завершается, когда закончились все такие задачи.
+
+По завершении действия:
+    - интервалы дописываются в файл трассировки в формате Chrome trace
+      events (открывается в chrome://tracing или ui.perfetto.dev);
+    - в журнал пишется сводка "N запросов, M мс БД, K мс отрисовки";
+      если запросов больше бюджета или один метод модели вызван много
+      раз (признак N+1), сводка пишется как предупреждение;
+    - сводка передаётся слушателям (например, строке состояния окна).
+
+Обращения к базам видны только при включённых метриках (VET_METRICS).
+Настройки читает configure() - её вызывают после загрузки .env.
+Переменные окружения:
+    VET_TRACE=1 - включить трассировку (файл trace_<дата>.json);
+    VET_TRACE_FILE - файл трассировки (включает трассировку);
+    VET_TRACE_QUERY_BUDGET - бюджет запросов на действие (по умолчанию 20);
+    VET_TRACE_REPEAT_LIMIT - сколько вызовов одного метода считать N+1 (по умолчанию 10).
+"""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from database import database_instrumentation as instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+
+# Заполняются configure()
+TRACE_FILE = None
+ENABLED = False
+QUERY_BUDGET = 20
+REPEAT_LIMIT = 10
+
+_PID = os.getpid()
+_action_ids = itertools.count(1)
+_local = threading.local()
+_file_lock = threading.Lock()
+_listeners = []
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+class Action:
+    """Трассируемое действие: интервалы и счётчики до завершения всех его задач"""
+
+    def __init__(self, name):
+        self.id = next(_action_ids)
+        self.name = name
+        self.started_us = _now_us()
+        self.tid = threading.get_ident()
+        self.events = []
+        self.queries = 0
+        self.db_ms = 0.0
+        self.render_ms = 0.0
+        self.calls = Counter()  # метод модели -> количество вызовов
+        self._holds = 1  # Открытый блок trace_action
+        self._lock = threading.Lock()
+
+    def hold(self):
+        """Продлевает действие (например, на время фоновой задачи)"""
+        with self._lock:
+            self._holds += 1
+
+    def release(self):
+        """Снимает продление; последнее снятие завершает действие"""
+        with self._lock:
+            self._holds -= 1
+            finished = self._holds == 0
+        if finished:
+            _finish(self)
+
+    def add_span(self, name, category, started_us, duration_us, args=None):
+        event = {
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': started_us, 'dur': duration_us,
+            'pid': _PID, 'tid': threading.get_ident(),
+            'args': dict(args or {}, action=self.id),
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        total_ms = (_now_us() - self.started_us) / 1000
+        return (f"{self.name}: {self.queries} запросов, {self.db_ms:.1f} мс БД, "
+                f"{self.render_ms:.1f} мс отрисовки, {total_ms:.1f} мс всего")
+
+
+def current_action():
+    """Действие, в контексте которого выполняется поток (или None)"""
+    return getattr(_local, 'action', None)
+
+
+@contextmanager
+def resume(action):
+    """Выполняет блок в контексте действия (в фоновой задаче или обработчике результата)"""
+    previous = current_action()
+    _local.action = action
+    try:
+        yield action
+    finally:
+        _local.action = previous
+
+
+@contextmanager
+def trace_action(name):
+    """
+    Открывает действие интерфейса.
+
+    Если трассировка выключена или действие уже открыто (вложенный вызов),
+    новое действие не создаётся.
+    """
+    if not ENABLED or current_action() is not None:
+        yield current_action()
+        return
+    action = Action(name)
+    try:
+        with resume(action):
+            yield action
+    finally:
+        action.release()
+
+
+@contextmanager
+def trace_span(name, category='render'):
+    """Дочерний интервал текущего действия (по умолчанию - отрисовка)"""
+    action = current_action()
+    if action is None:
+        yield
+        return
+    started = _now_us()
+    try:
+        yield
+    finally:
+        duration = _now_us() - started
+        action.add_span(name, category, started, duration)
+        if category == 'render':
+            with action._lock:
+                action.render_ms += duration / 1000
+
+
+def add_summary_listener(listener):
+    """Подписывает listener(action, summary) на завершение действий"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def _on_measure(name, elapsed_ms, failed, frame):
+    """Наблюдатель instrumentation: обращения к базам внутри действия"""
+    action = current_action()
+    if action is None:
+        return
+    duration = int(elapsed_ms * 1000)
+    started = _now_us() - duration
+    if name == 'pg.execute' or name.startswith('mongo.cmd.'):
+        action.add_span(name, 'query', started, duration, {'failed': failed})
+        with action._lock:
+            action.queries += 1
+            action.db_ms += elapsed_ms
+    elif name == 'pg.pool.acquire':
+        action.add_span(name, 'pool', started, duration)
+    elif frame is not None:
+        action.add_span(name, 'db', started, duration, {
+            'rows': frame.rows, 'docs': frame.docs,
+            'round_trips': frame.round_trips, 'failed': failed,
+        })
+        with action._lock:
+            action.calls[name] += 1
+
+
+def _finish(action):
+    duration = _now_us() - action.started_us
+    events = list(action.events)
+    events.append({
+        'name': action.name, 'cat': 'action', 'ph': 'X',
+        'ts': action.started_us, 'dur': duration, 'pid': _PID, 'tid': action.tid,
+        'args': {'action': action.id, 'queries': action.queries,
+                 'db_ms': round(action.db_ms, 3), 'render_ms': round(action.render_ms, 3)},
+    })
+    try:
+        _write_events(events)
+    except Exception as e:
+        logger.error(f"Ошибка записи трассировки: {e}")
+
+    summary = action.summary()
+    repeated = [(name, count) for name, count in action.calls.most_common() if count >= REPEAT_LIMIT]
+    if repeated:
+        summary += "; повторные вызовы (N+1?): " + ", ".join(f"{name} x{count}" for name, count in repeated)
+    if action.queries > QUERY_BUDGET or repeated:
+        logger.warning(f"[trace] {summary} (бюджет {QUERY_BUDGET} запросов)")
+    else:
+        logger.info(f"[trace] {summary}")
+    for listener in _listeners:
+        try:
+            listener(action, summary)
+        except Exception as e:
+            logger.error(f"Ошибка обработчика трассировки: {e}")
+
+
+def _write_events(events):
+    """
+    Дописывает события в файл (формат JSON Array: закрывающая скобка
+    не обязательна, поэтому файл можно дописывать между запусками).
+    """
+    with _file_lock:
+        new_file = not os.path.exists(TRACE_FILE) or os.path.getsize(TRACE_FILE) == 0
+        with open(TRACE_FILE, 'a', encoding='utf-8') as file:
+            if new_file:
+                file.write("[\n")
+            for event in events:
+                file.write(json.dumps(event, ensure_ascii=False) + ",\n")
+
+
+def configure():
+    """
+    Читает настройки трассировки из окружения и, если она включена,
+    подписывается на измерения instrumentation.
+
+    Returns:
+        bool: Включена ли трассировка
+    """
+    global TRACE_FILE, ENABLED, QUERY_BUDGET, REPEAT_LIMIT
+    TRACE_FILE = os.getenv("VET_TRACE_FILE") or (
+        f'trace_{datetime.now().strftime("%Y-%m-%d")}.json' if os.getenv("VET_TRACE") == "1" else None
+    )
+    ENABLED = TRACE_FILE is not None
+    QUERY_BUDGET = int(os.getenv("VET_TRACE_QUERY_BUDGET", "20"))
+    REPEAT_LIMIT = int(os.getenv("VET_TRACE_REPEAT_LIMIT", "10"))
+    if ENABLED:
+        instrumentation.add_observer(_on_measure)
+    return ENABLED
@@ -1,25 +1,44 @@
 # main
+# Первым - чтобы замер запуска (VET_STARTUP_PROFILE=1) учёл все импорты
+from logic import logic_startup_profile as startup
+startup.install()
+
+# .env - до импорта модулей приложения: database_instrumentation и другие
+# модули читают свои настройки (VET_METRICS, VET_LOG_SLOW_MS) при импорте
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
 import sys
 
-from PyQt6.QtWidgets import QApplication, QDialog
+from PyQt6.QtWidgets import QApplication, QDialog, QMessageBox
+from PyQt6.QtCore import QTimer
 import logging
-from datetime import datetime
+import threading
 
-from ui.ui_main_window import MainWindow
 from ui.ui_login_window import LoginWindow
+from logic.logic_event_bus import get_event_bus
+from database.database_postgres_connector import close_all_pools
+from database.database_mongodb_connector import close_all_clients
+from database import database_instrumentation as instrumentation
+from logic.logic_logging import setup_logging, stop_logging
+from logic import logic_tracing as tracing
 
 
-logging.basicConfig(
-    filename=f'app_errors_{datetime.now().strftime("%Y-%m-%d")}.log',
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Журнал пишется в файл фоновым потоком (настройки - VET_LOG_* в .env)
+setup_logging()
+logger = logging.getLogger(__name__)
+# Трассировка действий интерфейса (VET_TRACE*)
+tracing.configure()
+startup.mark("Модули загружены")
 
 
 def create_test_user():
     """Создание тестового пользователя для отладки"""
     from database.database_models_pg import PostgresModels
     db = PostgresModels()
+    if db.get_employee_by_login("test"):
+        return
     db.insert_employee(
         full_name="Тестовый Пользователь",
         login="test",
@@ -27,23 +46,74 @@ def create_test_user():
         role="admin",
         branch_id=1
     )
-    print("Тестовый пользователь создан: login='test', password='test'")
+    logger.info("Тестовый пользователь создан: login='test', password='test'")
+
+
+
+def migrate_databases():
+    """
+    Миграции схемы PostgreSQL (идемпотентно). Выполняются до окна входа:
+    запросы приёмов и отчётов рассчитывают на столбцы и таблицы миграций.
 
+    Returns:
+        bool: Схема в актуальном состоянии
+    """
+    from database.database_models_pg import PostgresModels
+    return PostgresModels().migrate_schema() is not None
+
+
+def init_mongo_indexes():
+    """Индексы MongoDB и заполнение полей поиска (идемпотентно, в фоне)"""
+    from database.database_models_mongo import MongoDBModels
+    try:
+        MongoDBModels().ensure_indexes()
+    except Exception as e:
+        logger.error(f"Ошибка инициализации MongoDB: {str(e)}")
 
 
 def main():
     try:
-        # Для отладки можно раскомментировать создание тестового пользователя
-        create_test_user()
+        # Периодическая выгрузка метрик баз данных (если задан VET_METRICS_FILE)
+        instrumentation.start_from_env()
 
         # Создание приложения
         app = QApplication(sys.argv)
-        print("Приложение создано")
+        startup.mark("QApplication создано")
+
+        # Схема PostgreSQL обновляется до появления окон; без неё запись
+        # приёмов и отчёты не работают, поэтому при ошибке приложение закрывается
+        if not migrate_databases():
+            QMessageBox.critical(
+                None, "Ошибка базы данных",
+                "Не удалось обновить схему базы данных PostgreSQL.\n"
+                "Подробности - в журнале приложения."
+            )
+            stop_logging()
+            sys.exit(1)
+        startup.mark("Миграции применены")
+
+        # Тестовый пользователь для отладки - только по VET_CREATE_TEST_USER=1
+        if os.getenv("VET_CREATE_TEST_USER") == "1":
+            create_test_user()
+
+        # Индексы MongoDB создаются в фоне, чтобы не задерживать появление окна
+        threading.Thread(target=init_mongo_indexes, name="mongo-bootstrap", daemon=True).start()
+        app.aboutToQuit.connect(close_all_pools)
+        app.aboutToQuit.connect(close_all_clients)
+        app.aboutToQuit.connect(instrumentation.stop_periodic_dump)
+        # Последним - чтобы дописать записи, сделанные при остановке
+        app.aboutToQuit.connect(stop_logging)
+        # Шина событий изменения данных создаётся в потоке интерфейса
+        get_event_bus()
+        logger.info("Приложение создано")
 
         # Создаем окно авторизации
         login_window = LoginWindow()
         login_window.show()
-        print("Окно авторизации показано")
+        logger.info("Окно авторизации показано")
+        startup.mark("Окно авторизации показано")
+        # Сводка - после первой отрисовки окна
+        QTimer.singleShot(0, startup.report)
 
         # Создаем переменную для главного окна (пока None)
         main_window = None
@@ -51,19 +121,22 @@ def main():
         # Обработчик успешного входа
         def on_login_success(user_data):
             nonlocal main_window
-            print(f"Получены данные пользователя: {user_data}")
+            logger.debug(f"Получены данные пользователя: {user_data}")
 
             if not user_data or 'role' not in user_data or 'full_name' not in user_data:
-                print("Ошибка: некорректные данные пользователя")
+                logger.error("Ошибка: некорректные данные пользователя")
                 return
 
             try:
-                main_window = MainWindow(user_data)
-                main_window.show()
+                # Модули вкладок импортируются при их открытии (ui_main_window)
+                with startup.measure("Главное окно"):
+                    from ui.ui_main_window import MainWindow
+                    main_window = MainWindow(user_data)
+                    main_window.show()
                 login_window.close()
-                print("Главное окно успешно показано")
+                logger.info("Главное окно успешно показано")
             except Exception as e:
-                print(f"Ошибка при создании главного окна: {e}")
+                logger.error(f"Ошибка при создании главного окна: {e}", exc_info=True)
 
         # Подключаем сигнал успешного входа
         login_window.login_success.connect(on_login_success)
@@ -75,7 +148,8 @@ def main():
         sys.exit(exit_code)
 
     except Exception as e:
-        logging.critical(f"Fatal error: {str(e)}", exc_info=True)
+        logger.critical(f"Fatal error: {str(e)}", exc_info=True)
+        stop_logging()
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -3,14 +3,23 @@ import logging
 import os
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QFormLayout,
+    QTableView, QAbstractItemView, QMessageBox, QDialog, QFormLayout,
     QListWidget, QListWidgetItem, QTextEdit, QDateEdit, QFileDialog,
     QComboBox, QGroupBox, QHeaderView, QTabWidget, QStyleOptionViewItem, QStyledItemDelegate, QMenu
 )
 from PyQt6.QtCore import Qt, QDate, QEvent, QRect, QUrl
 from PyQt6.QtGui import QPixmap, QIcon, QDesktopServices
 from datetime import datetime
-from database.database_models_mongo import MongoDBModels
+from database.database_models_mongo import MongoDBModels, normalize_search_text
+from logic.logic_background_tasks import TaskRunner
+from logic.logic_tracing import trace_action, trace_span
+from logic.logic_search_controller import SearchController
+from logic.logic_event_bus import EventSubscription
+from database import database_events as events
+from ui.ui_table_model import ColumnTableModel, make_sort_proxy, selected_row_key, selected_row_values
+
+
+logger = logging.getLogger(__name__)
 
 
 class AnimalsWidget(QWidget):
@@ -31,8 +40,23 @@ class AnimalsWidget(QWidget):
         self.current_animal_id = None  # ID текущего выбранного животного
         self.attachments = []  # Список вложений для новой мед.записи
 
+        # Состояние постраничной загрузки таблицы
+        self.current_criteria = None  # Текущий фильтр поиска
+        self.last_loaded_id = None  # _id последней загруженной строки
+        self.has_more_animals = False  # Есть ли ещё страницы
+        self.total_estimate = 0  # Оценка общего количества по фильтру
+        self.tasks = TaskRunner()  # Запросы к MongoDB выполняются в фоне
+
+        # Поиск по мере ввода: пауза в наборе, кэш и локальное уточнение результатов
+        self.search_controller = SearchController(self.query_search, self.refine_search, parent=self)
+        self.search_controller.results_ready.connect(self.on_search_results)
+        self.search_controller.cleared.connect(self.load_all_animals)
+        self.search_controller.failed.connect(self.on_load_error)
+
         self.init_ui()  # Инициализация интерфейса
         self.load_all_animals()  # Загрузка всех животных при старте
+        # Изменения животных применяются к таблице точечно
+        self.subscription = EventSubscription(self, [events.ANIMAL], self.on_animals_changed)
 
     def init_ui(self):
         """Инициализация пользовательского интерфейса."""
@@ -62,6 +86,9 @@ class AnimalsWidget(QWidget):
         self.search_input = QLineEdit() # Создает поле ввода для поиска
         self.search_input.setPlaceholderText("Введите значение для поиска...") # Устанавливает подсказку в поле ввода
         self.search_input.setClearButtonEnabled(True) # Включает кнопку очистки в поле ввода
+        self.search_input.textChanged.connect(self.on_search_text_changed) # Поиск по мере ввода
+        self.search_input.returnPressed.connect(self.search_animals) # Enter - поиск сразу
+        self.filter_combo.currentIndexChanged.connect(self.on_search_text_changed) # Смена фильтра - новый поиск
 
         # Кнопка поиска
         search_btn = QPushButton("Поиск") # Создает кнопку "Поиск"
@@ -119,42 +146,122 @@ class AnimalsWidget(QWidget):
         top_layout.addWidget(buttons_group) # Добавляет группу действий в верхнюю панель
 
         # Таблица животных
-        self.animals_table = QTableWidget() # Создает таблицу для отображения животных
-        self.animals_table.setColumnCount(6)  # Устанавливает количество колонок в таблице - 6 колонок
-        self.animals_table.setHorizontalHeaderLabels(["ID", "Имя", "Вид", "Порода", "Хозяин", "Телефон"]) #  Устанавливает
-        # заголовки колонок таблицы
+        self.animals_model = ColumnTableModel(
+            ["ID", "Имя", "Вид", "Порода", "Хозяин", "Телефон"], key_column=0
+        ) # Модель с данными таблицы: 6 колонок, ключ строки - ID животного
+        self.animals_model.modelReset.connect(self.update_count_label) # Счётчик обновляется при новой
+        self.animals_model.rowsInserted.connect(self.update_count_label) # загрузке и при подгрузке страниц
+        self.animals_table = QTableView() # Создает таблицу для отображения животных
+        self.animals_table.setModel(make_sort_proxy(self.animals_model, self)) # Сортировка по клику на заголовок
+        self.animals_table.setSortingEnabled(True)
 
         # Настройка отображения таблицы
         self.animals_table.horizontalHeader().setSectionResizeMode(
             QHeaderView.ResizeMode.Stretch)  # Равномерное растяжение
         self.animals_table.verticalHeader().setVisible(False) # Скрывает вертикальные заголовки (номера строк) в таблице
-        self.animals_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows) #выделяется вся строка, а не
+        self.animals_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows) #выделяется вся строка, а не
         # только одна ячейка.
-        self.animals_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection) # Разрешает выделять только одну
+        self.animals_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection) # Разрешает выделять только одну
         # строку за раз (запрещает множественный выбор)
-        self.animals_table.cellDoubleClicked.connect(self.show_animal_details) # Привязывает двойной клик по ячейке
-        # таблицы к методу self.show_animal_details
+        self.animals_table.doubleClicked.connect(lambda _index: self.show_current_animal_details()) # Привязывает двойной клик по ячейке
+        # таблицы к методу self.show_current_animal_details; следующие страницы модель подгружает сама
+        # при прокрутке к концу таблицы (fetchMore)
+
+        # Счётчик загруженных записей
+        self.count_label = QLabel()
 
         # Сборка основного интерфейса
         main_layout.addWidget(top_panel) # Добавляет верхнюю панель (с поиском и кнопками) в основной вертикальный макет
         main_layout.addWidget(self.animals_table) # Добавляет таблицу животных в основной вертикальный
         # макет (под верхней панелью)
+        main_layout.addWidget(self.count_label) # Добавляет счётчик записей под таблицей
 
         self.setLayout(main_layout) #  Устанавливает основной вертикальный макет (содержащий верхнюю панель и таблицу)
         # как главный макет для текущего виджета/окна
 
+    # Размер страницы при загрузке таблицы животных
+    PAGE_SIZE = 200
+
     def load_all_animals(self):
-        """Загружает всех животных из базы данных и отображает их в таблице."""
-        try:
-            animals = self.mongo_db.get_all_animals()
-            self.display_animals(animals)
-        except Exception as e:
-            logging.error(f"Ошибка при загрузке животных: {str(e)}")
-            QMessageBox.critical(
-                self,
-                "Ошибка",
-                f"Не удалось загрузить данные о животных: {str(e)}"
-            )
+        """Загружает первую страницу всех животных и отображает её в таблице."""
+        self.load_animals(None)
+
+    def load_animals(self, criteria):
+        """Начинает постраничную загрузку животных по фильтру.
+
+        Args:
+            criteria (dict): Фильтр MongoDB или None для всех животных
+        """
+        self.current_criteria = criteria
+        self.last_loaded_id = None
+        self.has_more_animals = False
+        self.count_label.setText("Загрузка...")
+        self.tasks.cancel('animals_count')
+        # Новая загрузка вытесняет незавершённые запросы предыдущего фильтра
+        self.tasks.submit(
+            'animals', self.query_first_page, criteria,
+            on_result=self.on_first_page_loaded,
+            on_error=self.on_load_error
+        )
+
+    def query_first_page(self, criteria):
+        """Запрашивает оценку количества и первую страницу (в фоновом потоке)."""
+        total = self.mongo_db.estimate_animals_count(criteria)
+        animals = self.mongo_db.get_animals_page(criteria, None, self.PAGE_SIZE)
+        return total, animals
+
+    def on_first_page_loaded(self, result):
+        """Показывает первую страницу животных."""
+        self.total_estimate, animals = result
+        self.accept_page(animals)
+        self.animals_model.set_rows(self.animal_rows(animals), fetcher=self.fetch_next_page)
+
+    def fetch_next_page(self):
+        """Запускает загрузку следующей страницы животных для модели таблицы.
+
+        Returns:
+            list: Пустой список, если страниц больше нет, иначе None -
+            страница придёт в модель после загрузки в фоне
+        """
+        if not self.has_more_animals:
+            return []
+        self.tasks.submit(
+            'animals', self.mongo_db.get_animals_page,
+            self.current_criteria, self.last_loaded_id, self.PAGE_SIZE,
+            on_result=self.on_next_page_loaded,
+            on_error=self.on_load_error
+        )
+        return None
+
+    def on_next_page_loaded(self, animals):
+        """Добавляет загруженную страницу в таблицу."""
+        self.accept_page(animals)
+        # Добавленные точечно животные могут снова прийти со следующей страницей
+        rows = [row for row in self.animal_rows(animals) if self.animals_model.find_row(row[0]) is None]
+        self.animals_model.append_rows(rows, exhausted=not self.has_more_animals)
+        self.update_count_label()
+
+    def accept_page(self, animals):
+        """Запоминает позицию для следующей страницы."""
+        self.has_more_animals = len(animals) == self.PAGE_SIZE
+        if animals:
+            self.last_loaded_id = animals[-1]['_id']
+
+    def on_load_error(self, error):
+        """Сообщает об ошибке фоновой загрузки."""
+        logger.error(f"Ошибка при загрузке животных: {str(error)}")
+        QMessageBox.critical(
+            self,
+            "Ошибка",
+            f"Не удалось загрузить данные о животных: {str(error)}"
+        )
+
+    def update_count_label(self):
+        """Обновляет счётчик загруженных записей."""
+        loaded = self.animals_model.total_rows()
+        total = max(self.total_estimate, loaded)
+        suffix = " (прокрутите вниз для загрузки)" if self.has_more_animals else ""
+        self.count_label.setText(f"Показано {loaded} из ~{total}{suffix}")
 
     def display_animals(self, animals):
         """Отображает список животных в таблице.
@@ -162,124 +269,191 @@ class AnimalsWidget(QWidget):
         Args:
             animals (list): Список словарей с данными животных
         """
-        self.animals_table.setRowCount(len(animals))
-        for row, animal in enumerate(animals):
-            self.animals_table.setItem(row, 0, QTableWidgetItem(animal['_id']))
-            self.animals_table.setItem(row, 1, QTableWidgetItem(animal.get('name', '')))
-            self.animals_table.setItem(row, 2, QTableWidgetItem(animal.get('species', '')))
-            self.animals_table.setItem(row, 3, QTableWidgetItem(animal.get('breed', '')))
-            self.animals_table.setItem(row, 4, QTableWidgetItem(animal.get('owner_name', '')))
-            self.animals_table.setItem(row, 5, QTableWidgetItem(animal.get('owner_phone', '')))
+        self.has_more_animals = False
+        self.animals_model.set_rows(self.animal_rows(animals))
+
+    @staticmethod
+    def animal_rows(animals):
+        """Преобразует документы животных в строки таблицы.
+
+        Args:
+            animals (list): Список словарей с данными животных
+        """
+        return [
+            (
+                animal['_id'],
+                animal.get('name', ''),
+                animal.get('species', ''),
+                animal.get('breed', ''),
+                animal.get('owner_name', ''),
+                animal.get('owner_phone', ''),
+            )
+            for animal in animals
+        ]
+
+    # Поле поиска в зависимости от выбранного фильтра
+    SEARCH_FIELDS = {"ID": 'id', "Имя": 'name', "Хозяин": 'owner_name', "Телефон": 'owner_phone'}
 
     def search_animals(self):
-        """Выполняет поиск животных по выбранному фильтру."""
-        search_text = self.search_input.text().strip()
-        if not search_text:
-            self.load_all_animals()
+        """Выполняет поиск животных по выбранному фильтру сразу."""
+        self.search_controller.search_now(self.filter_combo.currentText(), self.search_input.text())
+
+    def on_search_text_changed(self, *args):
+        """Запускает поиск после паузы в наборе."""
+        self.search_controller.request(self.filter_combo.currentText(), self.search_input.text())
+
+    def query_search(self, filter_type, text):
+        """Запрашивает первую страницу результатов поиска (в фоновом потоке).
+
+        Returns:
+            tuple: (животные, полный ли результат)
+        """
+        criteria = self.mongo_db.build_search_criteria(self.SEARCH_FIELDS[filter_type], text)
+        animals = self.mongo_db.get_animals_page(criteria, None, self.PAGE_SIZE)
+        return animals, len(animals) < self.PAGE_SIZE
+
+    def refine_search(self, filter_type, text, animals):
+        """Отбирает из полного результата поиска животных, подходящих под уточнённый текст."""
+        field = self.SEARCH_FIELDS[filter_type]
+        if field in ('name', 'owner_name'):
+            needle = normalize_search_text(text)
+            return [a for a in animals if needle in normalize_search_text(a.get(field))]
+        if field == 'owner_phone':
+            return [a for a in animals if str(a.get('owner_phone') or '').startswith(text)]
+        # Точное совпадение по ID локально не уточняется
+        return None
+
+    def on_search_results(self, filter_type, text, animals):
+        """Показывает первую страницу результатов поиска."""
+        self.tasks.cancel('animals')
+        self.tasks.cancel('animals_count')
+        self.current_criteria = self.mongo_db.build_search_criteria(self.SEARCH_FIELDS[filter_type], text)
+        self.last_loaded_id = None
+        self.accept_page(animals)
+        self.total_estimate = len(animals)
+        self.animals_model.set_rows(self.animal_rows(animals), fetcher=self.fetch_next_page)
+        if self.has_more_animals:
+            # Общее количество уточняем отдельным запросом
+            self.tasks.submit(
+                'animals_count', self.mongo_db.estimate_animals_count, self.current_criteria,
+                on_result=self.on_count_estimated
+            )
+
+    def on_count_estimated(self, total):
+        self.total_estimate = total
+        self.update_count_label()
+
+    def on_animals_changed(self, changes):
+        """Применяет изменения животных к таблице (None - перечитать таблицу)."""
+        self.search_controller.invalidate()
+        if changes is None:
+            self.search_animals()
             return
 
-        filter_type = self.filter_combo.currentText()
+        changed_ids = []
+        for event in changes:
+            if event.op == events.DELETE:
+                self.animals_model.remove_key(event.id)
+            elif event.id not in changed_ids:
+                changed_ids.append(event.id)
+        if not changed_ids:
+            self.update_count_label()
+            return
 
-        # Определяем критерии поиска в зависимости от выбранного фильтра
-        if filter_type == "ID":
-            criteria = {'_id': search_text}
-        elif filter_type == "Имя":
-            criteria = {'name': {'$regex': search_text, '$options': 'i'}}
-        elif filter_type == "Хозяин":
-            criteria = {'owner_name': {'$regex': search_text, '$options': 'i'}}
-        else:  # По телефону
-            criteria = {'owner_phone': {'$regex': '^' + search_text}}
+        # Перечитываем только изменённые строки с учётом текущего фильтра
+        self.tasks.submit(
+            ('animals_patch', tuple(changed_ids)),
+            self.mongo_db.get_animals_rows, changed_ids, self.current_criteria,
+            on_result=lambda animals: self.apply_animals_patch(changed_ids, animals)
+        )
 
-        animals = self.mongo_db.search_animals(criteria)
-        self.display_animals(animals)
+    def apply_animals_patch(self, changed_ids, animals):
+        """Обновляет строки изменённых животных; не подходящие под фильтр убирает."""
+        found = set()
+        for row in self.animal_rows(animals):
+            found.add(row[0])
+            self.animals_model.upsert_row(row)
+        for animal_id in changed_ids:
+            if animal_id not in found:
+                self.animals_model.remove_key(animal_id)
+        self.update_count_label()
 
     def clear_search(self):
         """Сбрасывает поиск и загружает всех животных."""
+        self.search_controller.cancel()
+        self.search_input.blockSignals(True)
         self.search_input.clear()
+        self.search_input.blockSignals(False)
         self.load_all_animals()
 
     def show_current_animal_details(self):
         """Отображает детальную информацию о выбранном животном."""
         try:
-            selected_items = self.animals_table.selectedItems()
-
-            # Проверяем, что выбрана хотя бы одна ячейка
-            if not selected_items or len(selected_items) == 0:
+            # ID животного - ключ выбранной строки модели
+            animal_id = selected_row_key(self.animals_table)
+            if animal_id is None:
                 QMessageBox.warning(self, "Ошибка", "Выберите животное из таблицы")
                 return
 
-            # Получаем ID из первого столбца выбранной строки
-            selected_row = self.animals_table.currentRow()
-            if selected_row < 0:
-                QMessageBox.warning(self, "Ошибка", "Не выбрана строка")
-                return
-
-            animal_id_item = self.animals_table.item(selected_row, 0)
-            if not animal_id_item:
-                QMessageBox.warning(self, "Ошибка", "Не удалось получить ID животного")
-                return
-
-            animal_id = animal_id_item.text()
             if not animal_id:
                 QMessageBox.warning(self, "Ошибка", "ID животного пуст")
                 return
 
-            self.show_animal_details(selected_row)
+            self.show_animal_details(animal_id)
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
-            print(f"Error in show_current_animal_details: {e}")
+            logger.error(f"Error in show_current_animal_details: {e}")
 
-    def show_animal_details(self, row):
+    def show_animal_details(self, animal_id):
         """Открывает диалог с подробной информацией о животном."""
         try:
-            animal_id_item = self.animals_table.item(row, 0)
-            if not animal_id_item:
-                QMessageBox.warning(self, "Ошибка", "Не удалось получить ID животного")
-                return
+            # Трассируется загрузка и построение карточки, но не модальный показ
+            with trace_action("animals.details"):
+                animal = self.mongo_db.get_animal_by_id(animal_id)
 
-            animal_id = animal_id_item.text()
-            animal = self.mongo_db.get_animal_by_id(animal_id)
+                if not animal:
+                    QMessageBox.warning(self, "Ошибка", "Животное не найдено в базе данных")
+                    return
 
-            if not animal:
-                QMessageBox.warning(self, "Ошибка", "Животное не найдено в базе данных")
-                return
+                # Создаем диалог с проверкой
+                dialog = QDialog(self)
+                dialog.setWindowTitle(f"Карточка животного: {animal.get('name', 'Без имени')}")
+                dialog.setMinimumSize(800, 600)
 
-            # Создаем диалог с проверкой
-            dialog = QDialog(self)
-            dialog.setWindowTitle(f"Карточка животного: {animal.get('name', 'Без имени')}")
-            dialog.setMinimumSize(800, 600)
+                # Добавляем защиту от ошибок при создании вкладок
+                try:
+                    with trace_span("animals.details_tabs"):
+                        layout = QVBoxLayout()
+                        tabs = QTabWidget()
 
-            # Добавляем защиту от ошибок при создании вкладок
-            try:
-                layout = QVBoxLayout()
-                tabs = QTabWidget()
+                        # Вкладка "Общая информация"
+                        general_tab = QWidget()
+                        self.init_general_tab(general_tab, animal)
+                        tabs.addTab(general_tab, "Общая информация")
 
-                # Вкладка "Общая информация"
-                general_tab = QWidget()
-                self.init_general_tab(general_tab, animal)
-                tabs.addTab(general_tab, "Общая информация")
+                        # Вкладка "История болезни"
+                        medical_tab = QWidget()
+                        self.init_medical_tab(medical_tab, animal)
+                        tabs.addTab(medical_tab, "История болезни")
 
-                # Вкладка "История болезни"
-                medical_tab = QWidget()
-                self.init_medical_tab(medical_tab, animal)
-                tabs.addTab(medical_tab, "История болезни")
+                        layout.addWidget(tabs)
+                        close_btn = QPushButton("Закрыть")
+                        close_btn.clicked.connect(dialog.close)
+                        layout.addWidget(close_btn)
 
-                layout.addWidget(tabs)
-                close_btn = QPushButton("Закрыть")
-                close_btn.clicked.connect(dialog.close)
-                layout.addWidget(close_btn)
+                        dialog.setLayout(layout)
 
-                dialog.setLayout(layout)
-                dialog.exec()
+                except Exception as e:
+                    QMessageBox.critical(self, "Ошибка", f"Ошибка при создании диалога: {str(e)}")
+                    logger.error(f"Dialog creation error: {e}")
+                    return
 
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Ошибка при создании диалога: {str(e)}")
-                print(f"Dialog creation error: {e}")
+            dialog.exec()
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
-            print(f"Error in show_animal_details: {e}")
+            logger.error(f"Error in show_animal_details: {e}")
 
     def init_general_tab(self, tab, animal):
         """Инициализирует вкладку с общей информацией о животном.
@@ -596,7 +770,7 @@ class AnimalsWidget(QWidget):
 
         except Exception as e:
             # Если возникла ошибка при настройке валидации, просто продолжаем без нее
-            logging.warning(f"Ошибка при настройке валидации телефона: {str(e)}")
+            logger.warning(f"Ошибка при настройке валидации телефона: {str(e)}")
             # Устанавливаем базовые настройки без валидации
             phone_edit.setPlaceholderText("Введите телефон (например: +79991234567)")
 
@@ -664,18 +838,16 @@ class AnimalsWidget(QWidget):
         if self.mongo_db.create_animal(animal_data):
             QMessageBox.information(self, "Успешно", "Животное добавлено")
             dialog.close()
-            self.load_all_animals()
         else:
             QMessageBox.warning(self, "Ошибка", "Не удалось добавить животное")
 
     def edit_current_animal(self):
         """Отображает диалог редактирования выбранного животного."""
-        selected = self.animals_table.selectedItems()
-        if not selected:
+        animal_id = selected_row_key(self.animals_table)
+        if animal_id is None:
             QMessageBox.warning(self, "Ошибка", "Выберите животное")
             return
 
-        animal_id = selected[0].text()
         animal = self.mongo_db.get_animal_by_id(animal_id)
         if not animal:
             QMessageBox.warning(self, "Ошибка", "Животное не найдено")
@@ -760,19 +932,18 @@ class AnimalsWidget(QWidget):
         if self.mongo_db.update_animal(animal_id, update_data):
             QMessageBox.information(self, "Успешно", "Данные обновлены")
             dialog.close()
-            self.load_all_animals()
         else:
             QMessageBox.warning(self, "Ошибка", "Не удалось обновить данные")
 
     def delete_current_animal(self):
         """Удаляет выбранное животное из базы данных."""
-        selected = self.animals_table.selectedItems()
+        selected = selected_row_values(self.animals_table)
         if not selected:
             QMessageBox.warning(self, "Ошибка", "Выберите животное")
             return
 
-        animal_id = selected[0].text()
-        animal_name = selected[1].text()
+        animal_id = selected[0]
+        animal_name = selected[1]
 
         reply = QMessageBox.question(
             self, "Подтверждение",
@@ -783,7 +954,6 @@ class AnimalsWidget(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             if self.mongo_db.delete_animal(animal_id):
                 QMessageBox.information(self, "Успешно", "Животное удалено")
-                self.load_all_animals()
             else:
                 QMessageBox.warning(self, "Ошибка", "Не удалось удалить животное")
 
@@ -1,24 +1,31 @@
 # ui_appointments_widget.py
 
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableWidget,
-    QTableWidgetItem, QHeaderView, QDateEdit, QComboBox, QCompleter, QDialog, QFormLayout,
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTableView,
+    QHeaderView, QDateEdit, QComboBox, QCompleter, QDialog, QFormLayout,
     QMessageBox, QTimeEdit, QGroupBox, QAbstractItemView, QStyledItemDelegate, QCalendarWidget, QTextEdit, QLineEdit
 )
-from PyQt6.QtCore import Qt, QDate, QTime, pyqtSignal, QRegularExpression
+from PyQt6.QtCore import Qt, QDate, QTime, QRegularExpression
 from PyQt6.QtGui import QIcon, QPalette, QRegularExpressionValidator
 from database.database_models_pg import PostgresModels
-from database.database_models_mongo import MongoDBModels
-from datetime import datetime, timedelta
+from database.database_models_mongo import MongoDBModels, CHOICE_PROJECTION
 import logging
 from logic.logic_calendar_utils import CalendarUtils
+from logic.logic_background_tasks import TaskRunner
+from logic.logic_tracing import trace_action, trace_span
+from logic.logic_session import BOOK_ANY_TIME, get_doctors, get_services, has_permission
+from logic.logic_search_controller import SearchController
+from logic.logic_event_bus import EventSubscription
+from database import database_events as events
+from ui.ui_table_model import ColumnTableModel, make_sort_proxy, selected_row_key
+
+
+logger = logging.getLogger(__name__)
+
 
 class AppointmentsWidget(QWidget):
     """Виджет для управления приёмами в ветеринарной клинике."""
 
-    # Сигнал об обновлении данных
-    data_updated = pyqtSignal()
-
     def __init__(self, user_data, main_window=None):
         """
         Инициализация виджета приёмов.
@@ -32,8 +39,15 @@ class AppointmentsWidget(QWidget):
         self.db_pg = PostgresModels()
         self.db_mongo = MongoDBModels()
         self.selected_date = QDate.currentDate()
+        self.tasks = TaskRunner()  # Запросы к базам выполняются в фоне
         self.init_ui()
         self.load_appointments()
+        # Изменения приёмов применяются точечно; изменения животных, услуг
+        # и врачей влияют на подписи в строках - день перечитывается
+        self.subscription = EventSubscription(
+            self, [events.APPOINTMENT, events.ANIMAL, events.SERVICE, events.EMPLOYEE],
+            self.on_data_changed
+        )
         self.calendar_utils = CalendarUtils()
         self.services_widget = None  # Для хранения ссылки
 
@@ -101,11 +115,18 @@ class AppointmentsWidget(QWidget):
         control_layout.addWidget(action_group)
 
         # Таблица приёмов
-        self.appointments_table = QTableWidget()
-        self.appointments_table.setColumnCount(7)  # ID, Дата, Время, Животное, Врач, Услуга, Статус
-        self.appointments_table.setHorizontalHeaderLabels([
-            "ID", "Дата", "Время", "Животное", "Врач", "Услуга", "Статус"
-        ])
+        self.appointments_model = ColumnTableModel(
+            ["ID", "Дата", "Время", "Животное", "Врач", "Услуга", "Статус"],
+            key_column=0,  # Ключ строки - ID приёма
+            formatters={
+                1: lambda value: value.strftime("%d.%m.%Y"),
+                2: lambda value: value.strftime("%H:%M"),
+            }
+        )
+        self.appointments_proxy = make_sort_proxy(self.appointments_model, self)
+        self.appointments_table = QTableView()
+        self.appointments_table.setModel(self.appointments_proxy)
+        self.appointments_table.setSortingEnabled(True)
 
         # Настройка таблицы
         self.appointments_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
@@ -124,105 +145,132 @@ class AppointmentsWidget(QWidget):
 
         self.setLayout(main_layout)
 
-
-        if self.main_window:
-            self.main_window.services_widget.data_updated.connect(self.load_appointments)
-
     def date_changed(self, date):
         """Обработчик изменения даты."""
         self.selected_date = date
         self.load_appointments()
 
     def load_appointments(self):
-        """Загружает приёмы из базы данных и отображает их в таблице."""
+        """Загружает приёмы из базы данных в фоне и отображает их в таблице."""
         if not self.db_pg or not self.db_mongo:
-            logging.error("Нет подключения к базе данных")
+            logger.error("Нет подключения к базе данных")
             return
 
-        try:
-            # Получаем выбранный статус
-            status_filter = self.status_combo.currentText()
-            status = None if status_filter == "Все" else status_filter
-
-            # Получаем приёмы из PostgreSQL
-            appointments = self.db_pg.get_appointments_by_date(
-                self.selected_date.toString('yyyy-MM-dd'),
-                status
+        # Получаем выбранный статус
+        status_filter = self.status_combo.currentText()
+        status = None if status_filter == "Все" else status_filter
+
+        # Новый запрос (например, при быстрой смене даты) вытесняет предыдущий
+        with trace_action("appointments.load"):
+            self.tasks.submit(
+                'appointments', self.query_appointments,
+                self.selected_date.toString('yyyy-MM-dd'), status,
+                on_result=self.display_appointments,
+                on_error=self.on_load_error
             )
 
-            # Очищаем таблицу
-            self.appointments_table.setRowCount(0)
+    def query_appointments(self, date_str, status):
+        """Готовит строки таблицы приёмов за день (в фоновом потоке).
 
-            if not appointments:
-                return
+        Returns:
+            list: Строки (ID, Дата, Время, Животное, Врач, Услуга, Статус)
+        """
+        # Получаем приёмы вместе с врачами и услугами одним запросом
+        return self.build_rows(self.db_pg.get_day_view(date_str, status))
 
-            # Заполняем таблицу
-            self.appointments_table.setRowCount(len(appointments))
+    def build_rows(self, appointments):
+        """Преобразует строки get_day_view в строки таблицы (в фоновом потоке)."""
+        if not appointments:
+            return []
 
-            for row, appt in enumerate(appointments):
-                appt_id, animal_id, vet_id, date, time, service_id, status = appt[:7]
+        # Имена всех животных - одним запросом к MongoDB
+        animal_names = self.db_mongo.get_animal_names(appt[1] for appt in appointments)
 
-                # Получаем данные животного из MongoDB
-                animal = self.db_mongo.get_animal_by_id(animal_id)
-                animal_name = animal.get('name', 'Неизвестно') if animal else "Животное не найдено"
+        rows = []
+        for appt in appointments:
+            (appt_id, animal_id, vet_id, doctor_name, date, time,
+             service_id, service_name, service_price, status) = appt
 
-                # Получаем данные врача
-                doctor = self.db_pg.get_employee_by_id(vet_id)
-                doctor_name = doctor[1] if doctor else "Врач не найден"
+            animal_name = animal_names.get(str(animal_id), "Животное не найдено")
+            doctor_name = doctor_name or "Врач не найден"
 
-                # Получаем данные услуги
-                service = self.db_pg.get_service_by_id(service_id)
-                service_name = service[1] if service else "Услуга не найдена"
-                service_price = f"{service[3]:.2f} ₽" if service else "0.00 ₽"
+            # Изменяем отображение названия услуги
+            service_display = service_name or "Услуга не найдена"
 
-                # Изменяем отображение названия услуги
-                service_display = f"{service_name}"
+            rows.append((appt_id, date, time, animal_name, doctor_name, service_display, status))
+        return rows
 
-                # Заполняем строку таблицы
-                self.appointments_table.setItem(row, 0, QTableWidgetItem(str(appt_id)))
-                self.appointments_table.setItem(row, 1, QTableWidgetItem(date.strftime("%d.%m.%Y")))
-                self.appointments_table.setItem(row, 2, QTableWidgetItem(time.strftime("%H:%M")))
-                self.appointments_table.setItem(row, 3, QTableWidgetItem(animal_name))
-                self.appointments_table.setItem(row, 4, QTableWidgetItem(doctor_name))
-                self.appointments_table.setItem(row, 5, QTableWidgetItem(service_display))
-                self.appointments_table.setItem(row, 6, QTableWidgetItem(status))
+    def display_appointments(self, rows):
+        """Отображает подготовленные строки приёмов."""
+        with trace_span("appointments.table_fill"):
+            self.appointments_model.set_rows(rows)
 
+            # Сортируем по времени
+            self.appointments_table.sortByColumn(2, Qt.SortOrder.AscendingOrder)
 
-                # Сохраняем ID приёма в пользовательские данные
-                for col in range(self.appointments_table.columnCount()):
-                    item = self.appointments_table.item(row, col)
-                    if item:
-                        item.setData(Qt.ItemDataRole.UserRole, appt_id)
+    def on_data_changed(self, changes):
+        """Применяет изменения данных к таблице.
 
-            # Сортируем по времени
-            self.appointments_table.sortItems(2, Qt.SortOrder.AscendingOrder)
+        Args:
+            changes (list): События DataEvent или None, если нужно перечитать день
+        """
+        if changes is None or any(event.entity != events.APPOINTMENT for event in changes):
+            self.load_appointments()
+            return
 
-        except Exception as e:
-            logging.error(f"Ошибка при загрузке приёмов: {str(e)}")
-            QMessageBox.critical(
-                self,
-                "Ошибка",
-                f"Не удалось загрузить данные о приёмах: {str(e)}"
-            )
+        appointment_ids = list(dict.fromkeys(event.id for event in changes))
+        self.tasks.submit(
+            ('appointments_patch', tuple(appointment_ids)), self.query_patch, appointment_ids,
+            on_result=self.apply_patch,
+            on_error=self.on_load_error
+        )
+
+    def query_patch(self, appointment_ids):
+        """Перечитывает изменённые приёмы (в фоновом потоке).
+
+        Returns:
+            tuple: (ID приёмов, строки таблицы для существующих приёмов)
+        """
+        found = [self.db_pg.get_day_view_row(appointment_id) for appointment_id in appointment_ids]
+        return appointment_ids, self.build_rows([row for row in found if row])
+
+    def apply_patch(self, result):
+        """Обновляет, добавляет или убирает строки изменённых приёмов."""
+        appointment_ids, rows = result
+        status_filter = self.status_combo.currentText()
+        selected_date = self.selected_date.toPyDate()
+        visible = {
+            row[0]: row for row in rows
+            if row[1] == selected_date and status_filter in ("Все", row[6])
+        }
+        for appointment_id in appointment_ids:
+            if appointment_id in visible:
+                self.appointments_model.upsert_row(visible[appointment_id])
+            else:
+                self.appointments_model.remove_key(appointment_id)
+
+    def on_load_error(self, error):
+        """Сообщает об ошибке фоновой загрузки приёмов."""
+        logger.error(f"Ошибка при загрузке приёмов: {str(error)}")
+        QMessageBox.critical(
+            self,
+            "Ошибка",
+            f"Не удалось загрузить данные о приёмах: {str(error)}"
+        )
 
     def get_selected_appointment_id(self):
         """Возвращает ID выбранного приёма или None."""
-        selected_items = self.appointments_table.selectedItems()
-        if not selected_items:
-            return None
-
-        # ID хранится в UserData первого элемента строки
-        return selected_items[0].data(Qt.ItemDataRole.UserRole)
+        # ID хранится как ключ строки модели
+        return selected_row_key(self.appointments_table)
 
     def add_appointment(self):
         """Открывает диалог для добавления нового приёма."""
         try:
             dialog = AppointmentDialog(self.user_data, self.db_pg, self.db_mongo)
-            if dialog.exec() == QDialog.DialogCode.Accepted:
-                self.load_appointments()
-                self.data_updated.emit()
+            # Таблица обновится по событию изменения приёма
+            dialog.exec()
         except Exception as e:
-            logging.error(f"Ошибка при открытии диалога добавления приёма: {str(e)}")
+            logger.error(f"Ошибка при открытии диалога добавления приёма: {str(e)}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось открыть диалог добавления приёма: {str(e)}")
 
     def edit_appointment(self):
@@ -238,9 +286,8 @@ class AppointmentsWidget(QWidget):
             self.db_mongo,
             appointment_id
         )
-        if dialog.exec() == QDialog.DialogCode.Accepted:
-            self.load_appointments()
-            self.data_updated.emit()
+        # Таблица обновится по событию изменения приёма
+        dialog.exec()
 
     def delete_appointment(self):
         """Удаляет выбранный приём"""
@@ -260,12 +307,10 @@ class AppointmentsWidget(QWidget):
             try:
                 if self.db_pg.delete_appointment(appointment_id):
                     QMessageBox.information(self, "Успешно", "Приём удалён")
-                    self.load_appointments()
-                    self.data_updated.emit()
                 else:
                     QMessageBox.warning(self, "Ошибка", "Не удалось удалить приём")
             except Exception as e:
-                logging.error(f"Ошибка при удалении приёма: {str(e)}")
+                logger.error(f"Ошибка при удалении приёма: {str(e)}")
                 QMessageBox.critical(
                     self,
                     "Ошибка",
@@ -285,6 +330,8 @@ class AppointmentsWidget(QWidget):
 class AppointmentDialog(QDialog):
     """Диалоговое окно для добавления/редактирования приёма."""
 
+    ANIMAL_CHOICES_LIMIT = 100  # Животных в списке выбора (остальные - через поиск по вводу)
+
     def __init__(self, user_data, db_pg, db_mongo, appointment_id=None):
         super().__init__()
         self.calendar_utils = CalendarUtils()
@@ -293,6 +340,15 @@ class AppointmentDialog(QDialog):
         self.db_mongo = db_mongo
         self.appointment_id = appointment_id
         self.is_edit_mode = appointment_id is not None
+        self.service_duration = None  # Длительность выбранной услуги, минуты
+        # Список животных загружается в фоне: только имя и хозяин
+        self.tasks = TaskRunner()
+        self.animal_search = SearchController(self.query_animal_choices, parent=self)
+        self.animal_search.results_ready.connect(
+            lambda filter_type, text, animals: self.set_animal_choices(animals, text)
+        )
+        self.animal_search.cleared.connect(self.load_animal_choices)
+        self.animal_search.failed.connect(self.on_animals_error)
 
         self.setWindowTitle("Добавить приём" if not self.is_edit_mode else "Редактировать приём")
         self.setMinimumSize(500, 400)
@@ -318,6 +374,10 @@ class AppointmentDialog(QDialog):
         self.animal_combo = QComboBox()
         self.animal_combo.setEditable(True)
         self.animal_combo.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
+        # Ввод в поле - поиск по имени животного или хозяина
+        self.animal_combo.lineEdit().textEdited.connect(
+            lambda text: self.animal_search.request('name', text)
+        )
         add_animal_btn = QPushButton("Добавить")
         add_animal_btn.clicked.connect(self.show_add_animal_dialog)
         animal_layout.addWidget(self.animal_combo)
@@ -352,8 +412,17 @@ class AppointmentDialog(QDialog):
         self.time_edit.timeChanged.connect(self.validate_time)
         form_layout.addRow("Время:", self.time_edit)
 
+        # Свободное время врача на выбранную дату (загружается в фоне)
+        self.free_slots_label = QLabel("Выберите врача")
+        self.free_slots_label.setWordWrap(True)
+        form_layout.addRow("Свободно:", self.free_slots_label)
+
         # обработчики событий
         self.date_edit.dateChanged.connect(self.validate_date_time)
+        self.date_edit.dateChanged.connect(self.update_available_times)
+        self.doctor_combo.currentIndexChanged.connect(self.update_available_times)
+        # После update_service_price - длительность услуги уже известна
+        self.service_combo.currentIndexChanged.connect(self.update_available_times)
         self.time_edit.timeChanged.connect(self.validate_date_time)
         self.time_edit.timeChanged.connect(self.validate_time)
 
@@ -381,7 +450,7 @@ class AppointmentDialog(QDialog):
         """Валидирует комбинацию даты и времени"""
         date = self.date_edit.date()
         time = self.time_edit.time()
-        is_admin = self.user_data.get('role') == 'admin'
+        is_admin = has_permission(self.user_data, BOOK_ANY_TIME)
 
         if not is_admin and date == QDate.currentDate():
             self.validate_time()
@@ -390,11 +459,13 @@ class AppointmentDialog(QDialog):
         """Валидирует введённое время"""
         time = self.time_edit.time()  # Получаем время из виджета
         date = self.date_edit.date()
-        is_admin = self.user_data.get('role') == 'admin'
+        is_admin = has_permission(self.user_data, BOOK_ANY_TIME)
 
-        # Проверка рабочего времени
-        if not self.calendar_utils.is_within_working_hours(time):
-            self.show_time_error("Рабочее время с 9:00 до 18:00")
+        # Проверка рабочего времени по графику выбранного врача
+        vet_id = self.doctor_combo.currentData()
+        if not self.calendar_utils.is_within_working_hours(time, vet_id, date, self.service_duration):
+            hours = self.calendar_utils.describe_working_hours(date, vet_id)
+            self.show_time_error(f"Рабочее время: {hours}")
             return
 
         # Проверка на прошедшее время (если не админ)
@@ -417,19 +488,12 @@ class AppointmentDialog(QDialog):
     def update_service_price(self):
         """Обновляет отображение цены при изменении выбранной услуги."""
         service_id = self.service_combo.currentData()
+        # Цена и длительность (для проверки графика и пересечений) - из услуг сессии
+        service = None
         if service_id:
-            try:
-                service = self.db_pg.get_service_by_id(service_id)
-                if service:
-                    price = service[3]  # Предполагаем, что цена находится в 4-м поле (индекс 3)
-                    self.price_label.setText(f"{price:.2f} ₽")
-                else:
-                    self.price_label.setText("0.00 ₽")
-            except Exception as e:
-                logging.error(f"Ошибка при получении цены услуги: {str(e)}")
-                self.price_label.setText("0.00 ₽")
-        else:
-            self.price_label.setText("0.00 ₽")
+            service = next((s for s in get_services(self.db_pg) if s[0] == service_id), None)
+        self.service_duration = service[4] if service else None
+        self.price_label.setText(f"{service[3]:.2f} ₽" if service else "0.00 ₽")
 
     def show_add_animal_dialog(self):
         """Отображает диалог добавления нового животного."""
@@ -567,34 +631,35 @@ class AppointmentDialog(QDialog):
         else:
             self.doctor_combo.setCurrentIndex(0)  # "Выберите врача"
 
-        # Устанавливаем текущую дату и ближайшее доступное время
+        # Устанавливаем текущую дату и ближайшее время по графику врача
         self.date_edit.setDate(QDate.currentDate())
-
-        # Устанавливаем ближайшее рабочее время
-        now = datetime.now()
-        current_time = QTime(now.hour, now.minute)
-
-        if not self.calendar_utils.is_within_working_hours(current_time):
-            # Если сейчас нерабочее время, устанавливаем начало следующего рабочего дня
-            self.time_edit.setTime(QTime(9, 0))
-        else:
-            # Иначе ближайшие 30 минут
-            self.time_edit.setTime(self.calendar_utils.get_next_available_time())
+        self.time_edit.setTime(self.calendar_utils.get_next_available_time(self.doctor_combo.currentData()))
 
         # Устанавливаем статус "запланирован"
         self.status_combo.setCurrentText("запланирован")
 
     def update_available_times(self):
-        """Обновляет доступное время при изменении даты или врача"""
+        """Обновляет свободное время при изменении даты, врача или услуги"""
         vet_id = self.doctor_combo.currentData()
         date = self.date_edit.date()
 
-        if vet_id and date.isValid():
-            available_slots = self.calendar_utils.get_available_slots(
-                vet_id,
-                date,
-                self.db_pg
-            )
+        if not vet_id or not date.isValid():
+            self.tasks.cancel('available_times')
+            self.free_slots_label.setText("Выберите врача")
+            return
+
+        # Новый запрос вытесняет предыдущий; сетка берётся из общего кэша
+        self.free_slots_label.setText("Загрузка...")
+        self.tasks.submit(
+            'available_times', self.calendar_utils.get_available_slots,
+            vet_id, date.toString('yyyy-MM-dd'), self.service_duration,
+            on_result=self.set_available_times,
+            on_error=lambda error: self.free_slots_label.setText("Не удалось загрузить")
+        )
+
+    def set_available_times(self, slots):
+        """Показывает свободные слоты врача"""
+        self.free_slots_label.setText(", ".join(slots) if slots else "Нет свободного времени")
 
     def load_data(self):
         """Загружает данные для выпадающих списков."""
@@ -611,21 +676,16 @@ class AppointmentDialog(QDialog):
             self.doctor_combo.addItem("Выберите врача", None)
             self.service_combo.addItem("Выберите услугу", None)
 
-            # Загрузка животных
-            animals = self.db_mongo.get_all_animals()
-            for animal in animals:
-                self.animal_combo.addItem(
-                    f"{animal.get('name', 'Без имени')} ({animal.get('owner_name', 'Без хозяина')})",
-                    animal['_id']
-                )
+            # Животные - первая страница в фоне
+            self.load_animal_choices()
 
             # Загрузка ветеринаров
-            doctors = self.db_pg.get_all_doctors()
+            doctors = get_doctors(self.db_pg)
             for doc in doctors:
                 self.doctor_combo.addItem(doc[1], doc[0])
 
             # Загрузка услуг
-            services = self.db_pg.get_all_services()
+            services = get_services(self.db_pg)
             for srv in services:
                 self.service_combo.addItem(
                     f"{srv[1]}",  # Название
@@ -639,6 +699,88 @@ class AppointmentDialog(QDialog):
                 f"Не удалось загрузить данные: {str(e)}"
             )
 
+    @staticmethod
+    def animal_label(animal):
+        """Подпись животного в списке выбора"""
+        return f"{animal.get('name', 'Без имени')} ({animal.get('owner_name', 'Без хозяина')})"
+
+    def load_animal_choices(self):
+        """Загружает первую страницу животных для списка выбора (в фоне)"""
+        self.tasks.submit(
+            'animal_choices', self.db_mongo.get_animals_page,
+            limit=self.ANIMAL_CHOICES_LIMIT, projection=CHOICE_PROJECTION,
+            on_result=self.set_animal_choices,
+            on_error=self.on_animals_error
+        )
+
+    def query_animal_choices(self, filter_type, text):
+        """Поиск животных по имени или хозяину для SearchController"""
+        criteria = {'$or': [
+            self.db_mongo.build_search_criteria('name', text),
+            self.db_mongo.build_search_criteria('owner_name', text),
+        ]}
+        animals = self.db_mongo.get_animals_page(
+            criteria, limit=self.ANIMAL_CHOICES_LIMIT, projection=CHOICE_PROJECTION
+        )
+        return animals, len(animals) < self.ANIMAL_CHOICES_LIMIT
+
+    def set_animal_choices(self, animals, text=None):
+        """
+        Заполняет список животных; выбранное животное остаётся в списке.
+
+        Args:
+            animals (list): Документы с полями CHOICE_PROJECTION
+            text (str, optional): Текст поиска - сохраняется в поле ввода
+        """
+        combo = self.animal_combo
+        current_id = combo.currentData()
+        current_label = combo.currentText()
+        combo.blockSignals(True)
+        try:
+            combo.clear()
+            combo.addItem("Выберите животное или добавьте новое", None)
+            for animal in animals:
+                combo.addItem(self.animal_label(animal), animal['_id'])
+            if current_id and combo.findData(current_id) < 0:
+                combo.addItem(current_label, current_id)
+            if text is None:
+                combo.setCurrentIndex(max(combo.findData(current_id), 0) if current_id else 0)
+            else:
+                combo.setCurrentIndex(-1)
+                combo.setEditText(text)
+        finally:
+            combo.blockSignals(False)
+
+    def select_animal(self, animal_id):
+        """Выбирает животное; если его нет в списке - догружает одно по ID"""
+        index = self.animal_combo.findData(animal_id)
+        if index >= 0:
+            self.animal_combo.setCurrentIndex(index)
+            return
+        self.tasks.submit(
+            'animal_choice', self.db_mongo.get_animals_rows, [animal_id],
+            on_result=self.add_animal_choice,
+            on_error=self.on_animals_error
+        )
+
+    def add_animal_choice(self, animals):
+        """Добавляет догруженное животное в список и выбирает его"""
+        for animal in animals:
+            index = self.animal_combo.findData(animal['_id'])
+            if index < 0:
+                self.animal_combo.addItem(self.animal_label(animal), animal['_id'])
+                index = self.animal_combo.count() - 1
+            self.animal_combo.setCurrentIndex(index)
+
+    def on_animals_error(self, error):
+        QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить список животных:\n{error}")
+
+    def done(self, result):
+        """Закрытие диалога: фоновые загрузки больше не нужны"""
+        self.animal_search.cancel()
+        self.tasks.cancel_all()
+        super().done(result)
+
     def load_appointment_data(self):
         """Загружает данные выбранного приёма для редактирования."""
         if not self.appointment_id:
@@ -654,9 +796,7 @@ class AppointmentDialog(QDialog):
             _, animal_id, vet_id, date, time, service_id, status = appointment
 
             # Устанавливаем животное
-            animal_index = self.animal_combo.findData(animal_id)
-            if animal_index >= 0:
-                self.animal_combo.setCurrentIndex(animal_index)
+            self.select_animal(animal_id)
 
             # Устанавливаем врача
             doctor_index = self.doctor_combo.findData(vet_id)
@@ -698,7 +838,7 @@ class AppointmentDialog(QDialog):
             date = self.date_edit.date()  # QDate object
             time = self.time_edit.time()  # QTime object
             status = self.status_combo.currentText()
-            is_admin = self.user_data.get('role') == 'admin'
+            is_admin = has_permission(self.user_data, BOOK_ANY_TIME)
 
             # Проверка обязательных полей
             missing_fields = []
@@ -710,23 +850,22 @@ class AppointmentDialog(QDialog):
                 QMessageBox.warning(self, "Ошибка", f"Не заполнены поля: {', '.join(missing_fields)}")
                 return
 
-            # Проверка рабочего времени (для всех пользователей)
-            if not self.calendar_utils.is_within_working_hours(time):
-                QMessageBox.warning(self, "Ошибка", "Запись возможна только с 9:00 до 18:00")
-                return
-
-            # Для НЕ админов - проверка на прошедшее время
-            if not is_admin and self.calendar_utils.is_past_time(date, time):
-                QMessageBox.warning(self, "Ошибка", "Нельзя записать на прошедшее время")
+            # График врача (для всех) и прошедшее время (для НЕ админов)
+            valid, message = self.calendar_utils.validate_appointment_datetime(
+                date, time, is_admin, vet_id, self.service_duration
+            )
+            if not valid:
+                QMessageBox.warning(self, "Ошибка", message)
                 return
 
-            # Проверка доступности врача (для всех пользователей)
-            if not self.calendar_utils.validate_appointment_time(
+            # Проверка пересечения с другими приёмами врача с учётом длительности услуг
+            if status != "отменен" and not self.calendar_utils.validate_appointment_time(
                     vet_id,
                     date,
                     time,
                     self.db_pg,
-                    self.appointment_id if self.is_edit_mode else None
+                    self.appointment_id if self.is_edit_mode else None,
+                    service_id
             ):
                 QMessageBox.warning(self, "Ошибка", "Врач уже занят в это время")
                 return
@@ -763,7 +902,7 @@ class AppointmentDialog(QDialog):
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить приём: {str(e)}")
-            logging.error(f"Ошибка сохранения приёма: {str(e)}")
+            logger.error(f"Ошибка сохранения приёма: {str(e)}")
         finally:
             if conn:
                 self.db_pg.disconnect()
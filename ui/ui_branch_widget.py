@@ -1,7 +1,8 @@
+import logging
 import os
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
-    QTableWidget, QTableWidgetItem, QMessageBox, QDialog, QFormLayout,
+    QTableView, QAbstractItemView, QMessageBox, QDialog, QFormLayout,
     QListWidget, QListWidgetItem, QTextEdit, QDateEdit, QFileDialog,
     QComboBox, QGroupBox, QHeaderView, QTabWidget, QStyleOptionViewItem, QStyledItemDelegate, QMenu
 )
@@ -9,6 +10,14 @@ from PyQt6.QtCore import Qt, QDate, QEvent, QRect, QUrl
 from PyQt6.QtGui import QPixmap, QIcon, QDesktopServices
 from datetime import datetime
 from database.database_models_pg import PostgresModels
+from logic.logic_search_controller import SearchController
+from logic.logic_background_tasks import TaskRunner
+from logic.logic_event_bus import EventSubscription
+from database import database_events as events
+from ui.ui_table_model import ColumnTableModel, make_sort_proxy, selected_row_key, selected_row_values
+
+
+logger = logging.getLogger(__name__)
 
 
 class BranchWidget(QWidget):
@@ -27,8 +36,22 @@ class BranchWidget(QWidget):
         self.current_branch_id = None  # ID текущего филиала
         # self.attachments = []  # Список вложений для новой мед.записи
 
+        # Поиск по мере ввода: пауза в наборе, кэш и локальное уточнение результатов
+        self.search_controller = SearchController(self.query_search, self.refine_search, parent=self)
+        self.search_controller.results_ready.connect(
+            lambda filter_type, text, branches: self.display_branches(branches)
+        )
+        self.search_controller.cleared.connect(self.load_branches_data)
+        self.search_controller.failed.connect(
+            lambda error: QMessageBox.warning(self, "Ошибка поиска", f"Ошибка при выполнении поиска:\n{error}")
+        )
+
+        self.tasks = TaskRunner()  # Точечные перечитывания филиалов - в фоне
+
         self.init_ui()  # Инициализация интерфейса
         self.load_branches_data()  # Загрузка всех филиалов при старте
+        # Изменения филиалов применяются к таблице точечно
+        self.subscription = EventSubscription(self, [events.BRANCH], self.on_branches_changed)
 
     def init_ui(self):
         """Инициализация пользовательского интерфейса."""
@@ -57,6 +80,9 @@ class BranchWidget(QWidget):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Введите значение для поиска...")
         self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(self.on_search_text_changed)  # Поиск по мере ввода
+        self.search_input.returnPressed.connect(self.search_branches)
+        self.filter_combo.currentIndexChanged.connect(self.on_search_text_changed)
 
         # Кнопка поиска
         search_btn = QPushButton("Поиск")
@@ -111,18 +137,19 @@ class BranchWidget(QWidget):
         top_layout.addWidget(buttons_group)
 
         # Таблица филиалов
-        self.branches_table = QTableWidget()
-
-        self.branches_table.setColumnCount(4)  # 4 колонки
-        self.branches_table.setHorizontalHeaderLabels(["ID", "Название", "Адрес", "Телефон"])
+        self.branches_model = ColumnTableModel(["ID", "Название", "Адрес", "Телефон"], key_column=0)
+        self.branches_table = QTableView()
+        self.branches_table.setModel(make_sort_proxy(self.branches_model, self))
+        self.branches_table.setSortingEnabled(True)
 
         # Настройка отображения таблицы
         self.branches_table.horizontalHeader().setSectionResizeMode(
             QHeaderView.ResizeMode.Stretch)  # Равномерное растяжение
         self.branches_table.verticalHeader().setVisible(False)
-        self.branches_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.branches_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
-        self.branches_table.cellDoubleClicked.connect(self.show_current_branch_details)
+        self.branches_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.branches_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.branches_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.branches_table.doubleClicked.connect(lambda _index: self.show_current_branch_details())
 
         # Сборка основного интерфейса
         main_layout.addWidget(top_panel)
@@ -135,7 +162,7 @@ class BranchWidget(QWidget):
         branches = self.pSQL_db.get_all_branches()
 
         # Очищаем таблицу перед загрузкой новых данных
-        self.branches_table.setRowCount(0)
+        self.branches_model.clear()
         if not branches:
             QMessageBox.information(self, "Информация", "Нет доступных филиалов")
             return
@@ -148,24 +175,26 @@ class BranchWidget(QWidget):
         Args:
             branches (list): Список кортежей с данными филиалов (id, name, address, phone)
         """
-        self.branches_table.setRowCount(len(branches))
-        for row, branch in enumerate(branches):
-            self.branches_table.insertRow(row)
-            # branch - это кортеж: (id, name, address, phone)
-            self.branches_table.setItem(row, 0, QTableWidgetItem(str(branch[0])))
-            self.branches_table.setItem(row, 1, QTableWidgetItem(branch[1] or ''))
-            self.branches_table.setItem(row, 2, QTableWidgetItem(branch[2] or ''))
-            self.branches_table.setItem(row, 3, QTableWidgetItem(branch[3] or ''))
+        # branch - это кортеж: (id, name, address, phone)
+        self.branches_model.set_rows(branches or [])
+
+    # Колонка филиала, по которой ищет фильтр (ID ищется точным совпадением)
+    SEARCH_COLUMNS = {"Название": 1, "Адрес": 2, "Телефон": 3}
 
     def search_branches(self):
-        """Выполняет поиск филиалов по выбранному фильтру."""
-        search_text = self.search_input.text().strip()
-        if not search_text:
-            self.load_branches_data()
-            return
+        """Выполняет поиск филиалов по выбранному фильтру сразу."""
+        self.search_controller.search_now(self.filter_combo.currentText(), self.search_input.text())
 
-        filter_type = self.filter_combo.currentText()
+    def on_search_text_changed(self, *args):
+        """Запускает поиск после паузы в наборе."""
+        self.search_controller.request(self.filter_combo.currentText(), self.search_input.text())
 
+    def query_search(self, filter_type, search_text):
+        """Поиск филиалов в базе (в фоновом потоке).
+
+        Returns:
+            tuple: (филиалы, полный ли результат)
+        """
         # Определяем критерии поиска в зависимости от выбранного фильтра
         if filter_type == "ID":
             branches = self.pSQL_db.search_branches_by_id(search_text)
@@ -175,36 +204,56 @@ class BranchWidget(QWidget):
             branches = self.pSQL_db.search_branches_by_address(search_text)
         else:  # По телефону
             branches = self.pSQL_db.search_branches_by_phone(search_text)
+        return branches, True
+
+    def refine_search(self, filter_type, search_text, branches):
+        """Отбирает из найденных филиалов подходящие под уточнённый текст (как ILIKE '%текст%')."""
+        column = self.SEARCH_COLUMNS.get(filter_type)
+        if column is None:
+            return None
+        needle = search_text.lower()
+        return [b for b in branches if needle in (b[column] or '').lower()]
+
+    def on_branches_changed(self, changes):
+        """Применяет изменения филиалов (None - перечитать таблицу)."""
+        self.search_controller.invalidate()
+        if changes is None or self.search_input.text().strip():
+            # Активный поиск просто повторяем
+            self.search_branches()
+            return
 
-        self.display_branches(branches)
+        branch_ids = list(dict.fromkeys(event.id for event in changes))
+        self.tasks.submit(
+            ('branches_patch', tuple(branch_ids)),
+            lambda: [(branch_id, self.pSQL_db.get_branch_by_id(branch_id)) for branch_id in branch_ids],
+            on_result=self.apply_branches_patch
+        )
+
+    def apply_branches_patch(self, changed):
+        """Обновляет или убирает строки изменённых филиалов."""
+        for branch_id, branch in changed:
+            if branch:
+                self.branches_model.upsert_row(branch)
+            else:
+                self.branches_model.remove_key(branch_id)
 
     def clear_search(self):
         """Сбрасывает поиск и загружает всех филиалов."""
+        self.search_controller.cancel()
+        self.search_input.blockSignals(True)
         self.search_input.clear()
+        self.search_input.blockSignals(False)
         self.load_branches_data()
 
     def show_current_branch_details(self):
         """Отображает детальную информацию о выбранном филиале."""
         try:
-            selected_items = self.branches_table.selectedItems()
-
-            # Проверяем, что выбрана хотя бы одна ячейка
-            if not selected_items or len(selected_items) == 0:
+            # ID филиала - ключ выбранной строки модели
+            branch_id = selected_row_key(self.branches_table)
+            if branch_id is None:
                 QMessageBox.warning(self, "Ошибка", "Выберите филиал из таблицы")
                 return
 
-            # Получаем ID из первого столбца выбранной строки
-            selected_row = self.branches_table.currentRow()
-            if selected_row < 0:
-                QMessageBox.warning(self, "Ошибка", "Не выбрана строка")
-                return
-
-            branch_id_item = self.branches_table.item(selected_row, 0)
-            if not branch_id_item:
-                QMessageBox.warning(self, "Ошибка", "Не удалось получить ID филиала")
-                return
-
-            branch_id = branch_id_item.text()
             if not branch_id:
                 QMessageBox.warning(self, "Ошибка", "ID филиала пуст")
                 return
@@ -227,7 +276,7 @@ class BranchWidget(QWidget):
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
-            print(f"Error in show_current_branch_details: {e}")
+            logger.error(f"Error in show_current_branch_details: {e}")
 
     def show_add_branch_dialog(self):
         """Отображает диалог добавления нового филиала."""
@@ -292,18 +341,16 @@ class BranchWidget(QWidget):
         if self.pSQL_db.insert_branch(branch_data):
             QMessageBox.information(self, "Успешно", "Филиал добавлен")
             dialog.close()
-            self.load_branches_data()
         else:
             QMessageBox.warning(self, "Ошибка", "Не удалось добавить филиал")
 
     def edit_current_branch(self):
         """Отображает диалог редактирования выбранного филиала."""
-        selected = self.branches_table.selectedItems()
-        if not selected:
+        branch_id = selected_row_key(self.branches_table)
+        if branch_id is None:
             QMessageBox.warning(self, "Ошибка", "Выберите филиал")
             return
 
-        branch_id = selected[0].text()
         branch = self.pSQL_db.get_branch_by_id(int(branch_id))
         if not branch:
             QMessageBox.warning(self, "Ошибка", "Филиал не найден")
@@ -366,19 +413,18 @@ class BranchWidget(QWidget):
         if self.pSQL_db.update_branch(branch_id, update_data):
             QMessageBox.information(self, "Успешно", "Данные обновлены")
             dialog.close()
-            self.load_branches_data()
         else:
             QMessageBox.warning(self, "Ошибка", "Не удалось обновить данные")
 
     def delete_current_branch(self):
         """Удаляет выбранный филиал из базы данных."""
-        selected = self.branches_table.selectedItems()
+        selected = selected_row_values(self.branches_table)
         if not selected:
             QMessageBox.warning(self, "Ошибка", "Выберите филиал")
             return
 
-        branch_id = selected[0].text()
-        branch_name = selected[1].text()
+        branch_id = selected[0]
+        branch_name = selected[1]
 
         reply = QMessageBox.question(
             self, "Подтверждение",
@@ -389,7 +435,6 @@ class BranchWidget(QWidget):
         if reply == QMessageBox.StandardButton.Yes:
             if self.pSQL_db.delete_branch(int(branch_id)):
                 QMessageBox.information(self, "Успешно", "Филиал удалён")
-                self.load_branches_data()
             else:
                 QMessageBox.warning(self, "Ошибка", "Не удалось удалить филиал")
 
@@ -10,6 +10,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont, QIcon, QPixmap
 from logic.logic_auth_manager import AuthManager
+from logic.logic_background_tasks import TaskRunner
 
 
 class LoginWindow(QWidget):
@@ -20,6 +21,8 @@ class LoginWindow(QWidget):
 
         # Инициализация менеджера аутентификации
         self.auth_manager = AuthManager()
+        # Проверка логина выполняется в фоне, окно не замирает
+        self.tasks = TaskRunner()
 
         # Инициализация UI
         self.init_ui()
@@ -85,7 +88,7 @@ class LoginWindow(QWidget):
         form_layout.addWidget(self.password_input)
 
         # --- Кнопка входа ---
-        login_button = QPushButton("Войти")
+        self.login_button = login_button = QPushButton("Войти")
         login_button.setMinimumHeight(40)
         login_button.setCursor(Qt.CursorShape.PointingHandCursor)
         login_button.setStyleSheet("""
@@ -133,9 +136,29 @@ class LoginWindow(QWidget):
             self.show_error("Логин и пароль не могут быть пустыми")
             return
 
-        # Попытка аутентификации
-        user_data = self.auth_manager.authenticate(login, password)
+        # Повторный запуск, пока идёт проверка, игнорируем
+        if self.tasks.is_running('login'):
+            return
+
+        # Попытка аутентификации в фоне
+        self.login_button.setEnabled(False)
+        self.login_button.setText("Вход...")
+        self.tasks.submit(
+            'login', self.auth_manager.authenticate, login, password,
+            on_result=self.on_authenticated,
+            on_error=lambda error: self.show_error(f"Ошибка подключения к базе данных:\n{error}"),
+            on_finished=self.reset_login_button
+        )
 
+    def reset_login_button(self):
+        """Возвращает кнопку входа в исходное состояние"""
+        self.login_button.setEnabled(True)
+        self.login_button.setText("Войти")
+
+    def on_authenticated(self, user_data):
+        """
+        Обработка результата аутентификации
+        """
         if user_data:
             # Успешная авторизация
             QMessageBox.information(
@@ -1,12 +1,8 @@
 # ui_main_window.py
 from PyQt6.QtWidgets import QMainWindow, QTabWidget, QWidget, QVBoxLayout, QLabel
-from PyQt6.QtCore import Qt
-from ui.ui_animals_widget import AnimalsWidget
-from ui.ui_appointments_widget import AppointmentsWidget
-from ui.ui_branch_widget import BranchWidget
-# from ui.ui_staff_widget import StaffWidget
-from ui.ui_reports_widget import ReportsWidget
-from ui.ui_services_widget import ServicesWidget
+from PyQt6.QtCore import Qt, QTimer
+from logic import logic_tracing as tracing
+from logic import logic_startup_profile as startup
 
 class MainWindow(QMainWindow):
     def __init__(self, user_data):
@@ -20,22 +16,26 @@ class MainWindow(QMainWindow):
 
         self.init_tabs()
 
+        # Сводка трассировки последнего действия - в строке состояния
+        if tracing.ENABLED:
+            tracing.add_summary_listener(
+                lambda action, summary: self.statusBar().showMessage(summary, 15000)
+            )
+
     def init_tabs(self):
-        # Вкладка Животные
-        self.animals_widget = AnimalsWidget()
-        self.tab_widget.addTab(self.animals_widget, "Животные")
+        """
+        Вкладки создаются при первом открытии: до этого на их месте
+        заглушка, а модуль виджета не импортирован. Первая вкладка
+        создаётся сразу после появления окна.
+        """
+        self.pending_tabs = {}  # заглушка -> (название, атрибут, фабрика)
 
+        # Вкладка Животные
+        self.add_lazy_tab("Животные", 'animals_widget', self.create_animals_widget)
 
         # Вкладка Приёмы
-        self.appointments_widget = AppointmentsWidget(self.user_data)
-        self.tab_widget.addTab(self.appointments_widget, "Приёмы")
-
-        # Отключаем старые соединения перед созданием новых
-        try:
-            self.appointments_widget.data_updated.disconnect()
-        except:
-            pass
-        self.appointments_widget.data_updated.connect(self.handle_data_update)
+        self.add_lazy_tab("Приёмы", 'appointments_widget', self.create_appointments_widget)
+        # Вкладки обновляются сами по событиям изменения данных (logic_event_bus)
 
         # Вкладка Сотрудники
         # self.staff_widget = StaffWidget()
@@ -44,10 +44,7 @@ class MainWindow(QMainWindow):
         self.tab_widget.addTab(self.staff_widget, "Сотрудники")
 
         # Вкладка Филиалы
-        self.branch_widget = BranchWidget()
-        self.tab_widget.addTab(self.branch_widget, "Филиалы")
-        # self.branch_widget = QWidget()
-        # self.tab_widget.addTab(self.branch_widget, "Филиалы")
+        self.add_lazy_tab("Филиалы", 'branch_widget', self.create_branch_widget)
 
         # if self.user_data['role'] == 'admin':
         #     self.staff_widget = StaffWidget(self.user_data)
@@ -57,29 +54,64 @@ class MainWindow(QMainWindow):
         #     self.staff_widget = None
 
         # Вкладка Отчёты
-        self.reports_widget = ReportsWidget(self.user_data)
-        self.tab_widget.addTab(self.reports_widget, "Отчёты")
-        # bf.tab_widget.addTab(self.reports_widget, "Отчёты")
+        self.add_lazy_tab("Отчёты", 'reports_widget', self.create_reports_widget)
 
         # Вкладка Услуги
-        self.services_widget = ServicesWidget(self.user_data)
-        self.tab_widget.addTab(self.services_widget, "Услуги")
+        self.add_lazy_tab("Услуги", 'services_widget', self.create_services_widget)
+
+        self.tab_widget.currentChanged.connect(self.ensure_tab)
+        QTimer.singleShot(0, lambda: self.ensure_tab(self.tab_widget.currentIndex()))
+
+    def add_lazy_tab(self, title, attr, factory):
+        """Добавляет вкладку-заглушку; виджет создаст factory() при открытии"""
+        placeholder = QWidget()
+        layout = QVBoxLayout(placeholder)
+        label = QLabel("Загрузка...")
+        label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(label)
+        setattr(self, attr, None)
+        self.pending_tabs[placeholder] = (title, attr, factory)
+        self.tab_widget.addTab(placeholder, title)
 
-        # Отключаем старые соединения перед созданием новых
+    def ensure_tab(self, index):
+        """Создаёт виджет вкладки index, если на её месте ещё заглушка"""
+        placeholder = self.tab_widget.widget(index)
+        pending = self.pending_tabs.pop(placeholder, None)
+        if pending is None:
+            return
+        title, attr, factory = pending
+        with startup.measure(f"Вкладка {title}"), tracing.trace_action(f"tab.{attr}"):
+            widget = factory()
+        setattr(self, attr, widget)
+
+        # Заменяем заглушку, не вызывая повторно currentChanged
+        self.tab_widget.blockSignals(True)
         try:
-            self.services_widget.data_updated.disconnect()
-        except:
-            pass
-        self.services_widget.data_updated.connect(self.handle_data_update)
-
-    def handle_data_update(self):
-        """Обновляет данные во всех виджетах при изменении"""
-        # Добавляем проверку, чтобы избежать рекурсии
-        if not hasattr(self, '_updating'):
-            self._updating = True
-            try:
-                self.animals_widget.load_all_animals()
-                self.appointments_widget.load_appointments()
-                self.services_widget.load_services()
-            finally:
-                del self._updating
+            self.tab_widget.removeTab(index)
+            self.tab_widget.insertTab(index, widget, title)
+            self.tab_widget.setCurrentIndex(index)
+        finally:
+            self.tab_widget.blockSignals(False)
+        placeholder.deleteLater()
+
+    # Модули виджетов импортируются при создании вкладки
+
+    def create_animals_widget(self):
+        from ui.ui_animals_widget import AnimalsWidget
+        return AnimalsWidget()
+
+    def create_appointments_widget(self):
+        from ui.ui_appointments_widget import AppointmentsWidget
+        return AppointmentsWidget(self.user_data)
+
+    def create_branch_widget(self):
+        from ui.ui_branch_widget import BranchWidget
+        return BranchWidget()
+
+    def create_reports_widget(self):
+        from ui.ui_reports_widget import ReportsWidget
+        return ReportsWidget(self.user_data)
+
+    def create_services_widget(self):
+        from ui.ui_services_widget import ServicesWidget
+        return ServicesWidget(self.user_data)
@@ -1,24 +1,25 @@
 # reports_widget.py
 import logging
 
-import pandas as pd
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox,
-    QPushButton, QTableWidget, QTableWidgetItem, QMessageBox,
+    QPushButton, QTableView, QAbstractItemView, QMessageBox,
     QDateEdit, QFileDialog, QGroupBox, QHeaderView
 )
 from PyQt6.QtCore import Qt, QDate
-from PyQt6.QtGui import QIcon, QColor
+from PyQt6.QtGui import QIcon, QColor, QFont
 from datetime import datetime
 from logic.logic_reports_generator import ReportsGenerator
+from logic.logic_background_tasks import TaskRunner
+from logic.logic_tracing import trace_action, trace_span
+from logic.logic_session import get_doctors
+from logic.logic_export import (
+    ExportSource, export_rows, export_pdf, table_source, appointments_source, animals_source
+)
+from ui.ui_table_model import ColumnTableModel, make_sort_proxy
+
 
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+logger = logging.getLogger(__name__)
 
 
 class ReportsWidget(QWidget):
@@ -28,6 +29,7 @@ class ReportsWidget(QWidget):
         self.report_generator = ReportsGenerator()
         self.doctors_data = {}  # Инициализируем пустой словарь
         self.current_stats_data = None
+        self.tasks = TaskRunner()  # Отчёты формируются в фоне
         self.init_ui()
 
     def init_ui(self):
@@ -110,13 +112,14 @@ class ReportsWidget(QWidget):
         main_layout.addWidget(top_panel)
 
         # Таблица результатов
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(0)
+        self.results_model = ColumnTableModel([], style=self.report_cell_style)
+        self.results_table = QTableView()
+        self.results_table.setModel(make_sort_proxy(self.results_model, self))
         self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         self.results_table.verticalHeader().setVisible(False)
-        self.results_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.results_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
-        self.results_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.results_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.results_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.results_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         main_layout.addWidget(self.results_table)
 
         self.setLayout(main_layout)
@@ -182,7 +185,7 @@ class ReportsWidget(QWidget):
 
             # Заполняем комбобокс параметров
             self.param_combo.clear()
-            self.param_combo.addItems(["Месячная статистика", "Годовая статистика"])
+            self.param_combo.addItems(["Месячная статистика", "Годовая статистика", "Сравнение по годам"])
             self.param_combo.currentTextChanged.connect(self.update_statistics_filters)
 
             # Показываем параметры для статистики
@@ -261,7 +264,7 @@ class ReportsWidget(QWidget):
         try:
             # Очищаем и настраиваем комбобокс параметров
             self.param_combo.clear()
-            self.param_combo.addItems(["Месячная статистика", "Годовая статистика"])
+            self.param_combo.addItems(["Месячная статистика", "Годовая статистика", "Сравнение по годам"])
             self.param_combo.currentTextChanged.connect(self.update_statistics_filters)
 
             # Создаем виджеты для выбора периода, если их нет
@@ -272,7 +275,7 @@ class ReportsWidget(QWidget):
             self.update_statistics_filters()
 
         except Exception as e:
-            logging.error(f"Ошибка настройки интерфейса статистики: {str(e)}")
+            logger.error(f"Ошибка настройки интерфейса статистики: {str(e)}")
             QMessageBox.critical(self, "Ошибка", f"Не удалось настроить интерфейс: {str(e)}")
 
     def update_statistics_filters(self):
@@ -304,7 +307,7 @@ class ReportsWidget(QWidget):
         """Загружает список ветеринаров для комбобокса"""
         try:
             self.param_combo.clear()
-            doctors = self.report_generator.db_pg.get_all_doctors()
+            doctors = get_doctors(self.report_generator.db_pg)
 
             if not doctors:
                 QMessageBox.warning(self, "Предупреждение", "Нет данных о врачах")
@@ -335,10 +338,15 @@ class ReportsWidget(QWidget):
             self.date_to.setDate(QDate.currentDate())
 
     def generate_report(self):
-        """Генерация отчета по выбранным параметрам"""
+        """Генерация отчета по выбранным параметрам
+
+        Параметры считываются из интерфейса, а запросы к базам выполняются
+        в фоне; повторное нажатие вытесняет незавершённый отчёт.
+        """
         report_type = self.report_type_combo.currentText()
-        headers = []
-        data = []  # Инициализируем переменную data
+        generator = self.report_generator
+        job = None
+        is_stats = False
 
         try:
             if report_type == "Статистика":
@@ -346,23 +354,23 @@ class ReportsWidget(QWidget):
                 selected_year = int(self.year_combo.currentText()) if hasattr(self, 'year_combo') else None
                 selected_month = self.month_combo.currentIndex() + 1 if hasattr(self,
                                 'month_combo') and self.month_combo.isVisible() else None
+                is_stats = True
                 if stat_type == "Месячная статистика":
-                    headers, data = self.report_generator.generate_monthly_stats_report(year=selected_year,
-                    month=selected_month)
+                    job = lambda: generator.generate_monthly_stats_report(year=selected_year,
+                                                                          month=selected_month)
                 elif stat_type == "Годовая статистика":
-                    headers, data = self.report_generator.generate_monthly_stats_report(year=selected_year)
-
-                if data:  # Проверяем, что данные есть
-                    self.current_stats_data = data
-                    if hasattr(self, 'show_chart_btn'):
-                        self.show_chart_btn.setEnabled(True)
+                    job = lambda: generator.generate_monthly_stats_report(year=selected_year)
+                elif stat_type == "Сравнение по годам":
+                    # Выбранный год против предыдущего
+                    job = lambda: generator.generate_year_over_year_report(
+                        [selected_year - 1, selected_year])
             elif report_type == "Приемы за период":
                 date_from = self.date_from.date().toString("yyyy-MM-dd")
                 date_to = self.date_to.date().toString("yyyy-MM-dd")
-                headers, data = self.report_generator.generate_appointments_report(date_from, date_to)
+                job = lambda: generator.generate_appointments_report(date_from, date_to)
             elif report_type == "Животные по диагнозу":
                 diagnosis = self.param_combo.currentText()
-                headers, data = self.report_generator.generate_animals_by_diagnosis(diagnosis)
+                job = lambda: generator.generate_animals_by_diagnosis(diagnosis)
             elif report_type == "Услуги по врачу":
                 doctor_name = self.param_combo.currentText()
                 doctor_id = self.doctors_data.get(doctor_name)
@@ -372,21 +380,49 @@ class ReportsWidget(QWidget):
 
                 date_from = self.date_from.date().toString("yyyy-MM-dd")
                 date_to = self.date_to.date().toString("yyyy-MM-dd")
-                headers, data = self.report_generator.generate_services_by_doctor(doctor_id, date_from, date_to)
+                job = lambda: generator.generate_services_by_doctor(doctor_id, date_from, date_to)
             elif report_type == "Финансы":
                 date_from = self.date_from.date().toString("yyyy-MM-dd")
                 date_to = self.date_to.date().toString("yyyy-MM-dd")
-                headers, data = self.report_generator.generate_finance_report(date_from, date_to)
+                job = lambda: generator.generate_finance_report(date_from, date_to)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось сформировать отчет:\n{str(e)}")
+            logger.error(f"Ошибка формирования отчета: {str(e)}")
+            return
 
-            # Отображаем отчет только если есть данные
-            if headers and data:
+        if job is None:
+            QMessageBox.information(self, "Информация", "Нет данных для отображения")
+            return
+
+        self.generate_btn.setText("Формирование...")
+        with trace_action(f"reports.generate: {report_type}"):
+            self.tasks.submit(
+                'report', job,
+                on_result=lambda result: self.on_report_ready(result, is_stats),
+                on_error=self.on_report_error,
+                on_finished=lambda: self.generate_btn.setText("Сформировать")
+            )
+
+    def on_report_ready(self, result, is_stats=False):
+        """Отображает сформированный в фоне отчет"""
+        headers, data = result if result else ([], [])
+
+        if is_stats and data:  # Проверяем, что данные есть
+            self.current_stats_data = data
+            if hasattr(self, 'show_chart_btn'):
+                self.show_chart_btn.setEnabled(True)
+
+        # Отображаем отчет только если есть данные
+        if headers and data:
+            with trace_span("reports.table_fill"):
                 self.display_report(headers, data)
-            else:
-                QMessageBox.information(self, "Информация", "Нет данных для отображения")
+        else:
+            QMessageBox.information(self, "Информация", "Нет данных для отображения")
 
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось сформировать отчет:\n{str(e)}")
-            logging.error(f"Ошибка формирования отчета: {str(e)}")
+    def on_report_error(self, error):
+        """Сообщает об ошибке фонового формирования отчета"""
+        QMessageBox.critical(self, "Ошибка", f"Не удалось сформировать отчет:\n{str(error)}")
+        logger.error(f"Ошибка формирования отчета: {str(error)}")
 
     # def generate_monthly_stats(self):
     #     """Генерация месячной статистики"""
@@ -430,7 +466,7 @@ class ReportsWidget(QWidget):
     #
     #                 data.append([month_name, appointments, f"{income:.2f} ₽"])
     #             except Exception as e:
-    #                 logging.error(f"Ошибка обработки строки данных: {row}. Ошибка: {str(e)}")
+    #                 logger.error(f"Ошибка обработки строки данных: {row}. Ошибка: {str(e)}")
     #                 continue
     #
     #         if not data:
@@ -439,7 +475,7 @@ class ReportsWidget(QWidget):
     #         return ["Месяц", "Количество приемов", "Доход"], data
     #
     #     except Exception as e:
-    #         logging.error(f"Ошибка генерации месячной статистики: {str(e)}")
+    #         logger.error(f"Ошибка генерации месячной статистики: {str(e)}")
     #         return ["Ошибка"], [[f"Не удалось сформировать отчет: {str(e)}"]]
 
     def generate_yearly_stats(self):
@@ -482,7 +518,7 @@ class ReportsWidget(QWidget):
 
                     data.append([year, appointments, f"{income:.2f} ₽"])
                 except Exception as e:
-                    logging.error(f"Ошибка обработки строки данных: {row}. Ошибка: {str(e)}")
+                    logger.error(f"Ошибка обработки строки данных: {row}. Ошибка: {str(e)}")
                     continue
 
             if not data:
@@ -491,7 +527,7 @@ class ReportsWidget(QWidget):
             return ["Год", "Количество приемов", "Доход"], data
 
         except Exception as e:
-            logging.error(f"Ошибка генерации годовой статистики: {str(e)}")
+            logger.error(f"Ошибка генерации годовой статистики: {str(e)}")
             return ["Ошибка"], [[f"Не удалось сформировать отчет: {str(e)}"]]
 
     # def show_statistics_chart(self):
@@ -557,56 +593,54 @@ class ReportsWidget(QWidget):
     #     fig.tight_layout()
 
 
+    @staticmethod
+    def report_cell_style(model, row, column, role):
+        """Оформление ячеек отчета (вызывается моделью только для видимых ячеек)"""
+        value = model.value(row, column)
+        text = "" if value is None else str(value)
+
+        # Выравнивание для числовых данных и денежных значений
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            if isinstance(value, (int, float)) or '₽' in text:
+                return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+            return None
+
+        # Особое форматирование для финансовых данных
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return QColor(0, 100, 0) if '₽' in text else None  # Темно-зеленый для сумм
+
+        # Форматирование заголовков и разделителей
+        if role in (Qt.ItemDataRole.BackgroundRole, Qt.ItemDataRole.FontRole):
+            if (column == 0 and model.headers()[0] == "Показатель" and
+                    model.value(row, 0) in ("Услуги", "Врачи", "")):
+                if role == Qt.ItemDataRole.BackgroundRole:
+                    return QColor(240, 240, 240)  # Серый фон
+                font = QFont()
+                font.setBold(True)
+                return font
+        return None
+
     def display_report(self, headers, data):
         """Отображает отчет в таблице с улучшенным форматированием"""
         try:
-            # Очищаем таблицу перед заполнением
-            self.results_table.clear()
+            # Заменяем содержимое модели: строки хранятся по колонкам,
+            # а таблица запрашивает только видимые ячейки
+            self.results_model.set_rows(data, headers=headers)
 
-            # Устанавливаем количество колонок и строк
-            self.results_table.setColumnCount(len(headers))
-            self.results_table.setRowCount(len(data))
-
-            # Устанавливаем заголовки
-            self.results_table.setHorizontalHeaderLabels(headers)
+            # Сортировка по клику на заголовок, исходный порядок строк - до первого клика
+            self.results_table.setSortingEnabled(False)
+            self.results_table.model().sort(-1)
+            self.results_table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+            self.results_table.setSortingEnabled(True)
 
             # Настраиваем поведение заголовков
             header = self.results_table.horizontalHeader()
             header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
             header.setDefaultSectionSize(150)  # Значение по умолчанию
 
-            # Заполняем таблицу данными
-            for row_idx, row_data in enumerate(data):
-                for col_idx, col_data in enumerate(row_data):
-                    item = QTableWidgetItem(str(col_data))
-
-                    # Выравнивание для числовых данных и денежных значений
-                    if isinstance(col_data, (int, float)) or '₽' in str(col_data):
-                        item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-
-                    # Особое форматирование для финансовых данных
-                    if '₽' in str(col_data):
-                        item.setForeground(QColor(0, 100, 0))  # Темно-зеленый для сумм
-
-                    # Форматирование заголовков и разделителей
-                    if (headers[0] == "Показатель" and col_idx == 0 and
-                            (row_data[0] in ["Услуги", "Врачи"] or row_data[0] == "")):
-                        item.setBackground(QColor(240, 240, 240))  # Серый фон
-                        font = item.font()
-                        font.setBold(True)
-                        item.setFont(font)
-
-                    self.results_table.setItem(row_idx, col_idx, item)
-
-            # Настраиваем ширину колонок
+            # Настраиваем ширину колонок (по видимым строкам)
             self.results_table.resizeColumnsToContents()
 
-            # Дополнительные настройки для таблицы
-            self.results_table.verticalHeader().setVisible(False)
-            self.results_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-            self.results_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
-            self.results_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
-
             # Особые настройки для финансового отчета
             if headers[0] == "Показатель":
                 header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
@@ -620,7 +654,7 @@ class ReportsWidget(QWidget):
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось отобразить отчет:\n{str(e)}")
-            logging.error(f"Ошибка отображения отчета: {str(e)}")
+            logger.error(f"Ошибка отображения отчета: {str(e)}")
 
     # def show_monthly_chart(self, data):
     #     """Показывает график месячной статистики"""
@@ -661,382 +695,124 @@ class ReportsWidget(QWidget):
     #         QMessageBox.warning(self, "Ошибка",
     #                             "Для отображения графиков требуется установить matplotlib")
     #     except Exception as e:
-    #         logging.error(f"Ошибка при создании графика: {str(e)}")
+    #         logger.error(f"Ошибка при создании графика: {str(e)}")
     #         QMessageBox.critical(self, "Ошибка",
     #                              f"Не удалось отобразить график:\n{str(e)}")
     def export_to_pdf(self):
-        """Экспорт текущего отчета в PDF"""
-        if self.results_table.rowCount() == 0:
-            QMessageBox.warning(self, "Ошибка", "Нет данных для экспорта")
+        """
+        Экспорт в PDF в фоне (источник строк - как у экспорта в Excel).
+
+        Повторное нажатие во время экспорта отменяет его.
+        """
+        if self.tasks.is_running('export_pdf'):
+            self.tasks.cancel('export_pdf')
+            self.export_pdf_btn.setText("Экспорт в PDF")
             return
 
         report_type = self.report_type_combo.currentText()
-        default_name = f"{report_type}_{datetime.now().strftime('%Y%m%d')}.pdf"
-
-        PDFExporter.export_to_pdf(
-            self,
-            self.results_table,
-            default_name,
-            f"Отчет: {report_type}"
-        )
-
-    def export_to_excel(self):
-        """Экспорт текущего отчета в Excel"""
-        if self.results_table.rowCount() == 0:
+        build_source = self.export_source_builder(report_type)
+        if build_source is None:
             QMessageBox.warning(self, "Ошибка", "Нет данных для экспорта")
             return
 
-        report_type = self.report_type_combo.currentText()
-        default_name = f"{report_type}_{datetime.now().strftime('%Y%m%d')}.xlsx"
-
-        ExcelExporter.export_to_excel(
+        default_name = f"{report_type}_{datetime.now().strftime('%Y%m%d')}.pdf"
+        file_path, _ = QFileDialog.getSaveFileName(
             self,
-            self.results_table,
+            "Экспорт в PDF",
             default_name,
-            report_type
+            "PDF Files (*.pdf)"
         )
+        if not file_path:
+            return
 
+        def job(task):
+            return export_pdf(task, file_path, build_source(), f"Отчет: {report_type}")
+
+        self.export_pdf_btn.setText("Отменить")
+        self.tasks.submit(
+            'export_pdf', job,
+            with_task=True,
+            on_progress=lambda percent: self.export_pdf_btn.setText(f"Отменить ({percent}%)"),
+            on_result=lambda count: QMessageBox.information(
+                self, "Успех", f"PDF-документ успешно сохранен:\n{file_path}"
+            ),
+            on_error=self.on_export_error,
+            on_finished=lambda: self.export_pdf_btn.setText("Экспорт в PDF")
+        )
 
-class PDFExporter:
-    """Класс для экспорта данных таблицы в PDF-формат.
-
-    Предоставляет функционал для генерации PDF-документов с табличными данными.
-
-    Attributes:
-        Все методы класса являются статическими.
-
-    Methods:
-        export_to_pdf: Основной метод экспорта данных
-        prepare_data: Подготовка данных таблицы
-        create_styles: Создание стилей документа
-        create_table_style: Настройка стилей таблицы
-        register_fonts: Регистрация шрифтов
-        calculate_column_widths: Расчет ширины колонок
-
-    Пример использования:
-        PDFExporter.export_to_pdf(parent_window, table, "report.pdf", "Отчет")
-    """
-    @staticmethod
-    def export_to_pdf(parent, table_widget, default_filename, document_title):
-        """Экспортирует данные таблицы в PDF-файл.
-
-        Args:
-            parent (QWidget): Родительское окно для диалогов
-            table_widget (QTableWidget): Таблица с данными для экспорта
-            default_filename (str): Имя файла по умолчанию
-            document_title (str): Заголовок документа
-
-        Raises:
-            PermissionError: При отсутствии прав записи
-            Exception: Общие ошибки генерации PDF
-
-        Process:
-            1. Проверка наличия данных
-            2. Настройка шрифтов и стилей
-            3. Подготовка данных таблицы
-            4. Показ диалога сохранения
-            5. Генерация PDF-документа
-        """
-
-        try:
-            if table_widget.rowCount() == 0:
-                QMessageBox.warning(parent, "Ошибка", "Нет данных для экспорта")
-                return
-
-            # Регистрация шрифтов
-            font_name = PDFExporter.register_fonts()
-
-            # Создание стилей
-            styles = PDFExporter.create_styles(font_name)
-
-            # Подготовка данных с форматированием
-            headers, table_data = PDFExporter.prepare_data(table_widget, styles)
-
-            # Диалог сохранения
-            file_path, _ = QFileDialog.getSaveFileName(
-                parent,
-                "Экспорт в PDF",
-                default_filename,
-                "PDF Files (*.pdf)"
-            )
-            if not file_path:
-                return
-
-            # Создание документа
-            doc = SimpleDocTemplate(
-                file_path,
-                pagesize=landscape(A4),
-                leftMargin=10 * mm,
-                rightMargin=10 * mm,
-                topMargin=15 * mm,
-                bottomMargin=15 * mm
-            )
-
-            elements = []
-
-            # Добавление заголовка
-            elements.append(Paragraph(document_title, styles['Title']))
-            elements.append(Spacer(1, 0.2 * 25.4))
-
-            # Создание и настройка таблицы
-            table = Table(
-                table_data,
-                colWidths=PDFExporter.calculate_column_widths(len(headers))
-            )
-            table.setStyle(PDFExporter.create_table_style(font_name))
-
-            elements.append(table)
-            doc.build(elements)
-
-            QMessageBox.information(
-                parent,
-                "Успех",
-                f"PDF-документ успешно сохранен:\n{file_path}"
-            )
-
-        except PermissionError:
-            error_msg = "Нет прав для записи в выбранную директорию"
-            logging.error(error_msg)
-            QMessageBox.critical(parent, "Ошибка", error_msg)
-        except Exception as e:
-            logging.error(f"PDF Export Error: {str(e)}")
-            QMessageBox.critical(parent, "Ошибка", f"Не удалось создать PDF:\n{str(e)}")
-
-    @staticmethod
-    def prepare_data(table_widget, styles):
-        """Подготавливает данные таблицы для вставки в PDF.
-
-        Args:
-            table_widget (QTableWidget): Исходная таблица
-            styles (dict): Словарь стилей ReportLab
-
-        Returns:
-            tuple: Кортеж содержащий:
-                - headers (list): Список заголовков
-                - table_data (list): Данные для ReportLab Table
-
-        Notes:
-            - Форматирует заголовки жирным начертанием
-            - Центрирует содержимое ячеек
-            - Заменяет пустые ячейки на пустые строки
+    def export_to_excel(self):
         """
+        Экспорт в Excel (XLSX) или CSV в фоне.
 
-        def format_text(text, is_header=False):
-            """Форматирование текста ячейки"""
-            style = styles['Header'] if is_header else styles['Body']
-            text = str(text).strip() if text else ""
-            return Paragraph(f"<b>{text}</b>" if is_header else text, style)
-
-        # Получение заголовков
-        headers = [
-            table_widget.horizontalHeaderItem(i).text()
-            for i in range(table_widget.columnCount())
-        ]
-
-        # Форматирование данных
-        table_data = []
-        if headers:
-            table_data.append([format_text(h, True) for h in headers])
-
-        # Обработка строк данных
-        for row in range(table_widget.rowCount()):
-            formatted_row = []
-            for col in range(table_widget.columnCount()):
-                item = table_widget.item(row, col)
-                text = item.text() if item else ""
-                formatted_row.append(format_text(text))
-            table_data.append(formatted_row)
-
-        return headers, table_data
-
-    @staticmethod
-    def create_styles(font_name):
-        """Создает набор стилей для элементов PDF.
-
-        Args:
-            font_name (str): Имя зарегистрированного шрифта
-
-        Returns:
-            dict: Словарь стилей с ключами:
-                - 'Header': Стиль заголовков таблицы
-                - 'Body': Стиль тела таблицы
-                - 'Title': Стиль заголовка документа
-
-        Notes:
-            Размеры шрифтов:
-                - Заголовок документа: 14pt
-                - Заголовки таблицы: 9pt
-                - Тело таблицы: 8pt
+        Приемы за период и животные по диагнозу выгружаются курсором прямо
+        из базы - отчет не нужно сначала формировать в таблице; остальные
+        отчеты выгружаются из таблицы. Повторное нажатие во время экспорта
+        отменяет его.
         """
-        styles = getSampleStyleSheet()
-
-        # Стиль для заголовков таблицы
-        styles.add(ParagraphStyle(
-            name='Header',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=9,
-            leading=11,
-            alignment=1,  # Центрирование
-            textColor=colors.white,
-            spaceBefore=2,
-            spaceAfter=2
-        ))
-
-        # Стиль для тела таблицы
-        styles.add(ParagraphStyle(
-            name='Body',
-            parent=styles['Normal'],
-            fontName=font_name,
-            fontSize=8,
-            leading=10,
-            alignment=1,  # Центрирование
-            textColor=colors.black,
-            spaceBefore=2,
-            spaceAfter=2
-        ))
-
-        # Стиль для заголовка документа
-        styles['Title'].fontName = font_name
-        styles['Title'].fontSize = 14
-        styles['Title'].alignment = 1  # Центрирование
-
-        return styles
-
-    @staticmethod
-    def create_table_style(font_name):
-        """Генерирует стили оформления таблицы.
-
-        Args:
-            font_name (str): Имя используемого шрифта
-
-        Returns:
-            TableStyle: Объект стилей таблицы ReportLab
+        if self.tasks.is_running('export'):
+            self.tasks.cancel('export')
+            self.export_excel_btn.setText("Экспорт в Excel")
+            return
 
-        Notes:
-            Применяет:
-                - Синий фон заголовков (#2c3e50)
-                - Серую сетку таблицы (#bdc3c7)
-                - Чередующийся фон строк (#f8f9fa)
-        """
-        return TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2c3e50')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, -1), font_name),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#f8f9fa')),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 3),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-        ])
+        report_type = self.report_type_combo.currentText()
+        build_source = self.export_source_builder(report_type)
+        if build_source is None:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для экспорта")
+            return
 
-    @staticmethod
-    def register_fonts():
-        """Регистрирует шрифты для поддержки кириллицы.
+        default_name = f"{report_type}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Экспорт в Excel",
+            default_name,
+            "Excel Files (*.xlsx);;CSV Files (*.csv)"
+        )
+        if not file_path:
+            return
 
-        Returns:
-            str: Имя зарегистрированного шрифта
+        def job(task):
+            return export_rows(task, file_path, build_source(), report_type)
+
+        self.export_excel_btn.setText("Отменить")
+        self.tasks.submit(
+            'export', job,
+            with_task=True,
+            on_progress=lambda percent: self.export_excel_btn.setText(f"Отменить ({percent}%)"),
+            on_result=lambda count: QMessageBox.information(
+                self, "Успех", f"Выгружено строк: {count}\nФайл: {file_path}"
+            ),
+            on_error=self.on_export_error,
+            on_finished=lambda: self.export_excel_btn.setText("Экспорт в Excel")
+        )
 
-        Notes:
-            Приоритет шрифтов:
-                1. DejaVuSans
-                2. Arial
-                3. Helvetica (по умолчанию)
+    def export_source_builder(self, report_type):
         """
-        font_name = 'Helvetica'
-        try:
-            pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-            font_name = 'DejaVuSans'
-        except:
-            try:
-                pdfmetrics.registerFont(TTFont('Arial', 'Arial.ttf'))
-                font_name = 'Arial'
-            except:
-                logging.warning("Используется стандартный шрифт")
-        return font_name
-
-    @staticmethod
-    def calculate_column_widths(columns_count):
-        """Рассчитывает ширину колонок таблицы.
-
-        Args:
-            columns_count (int): Количество колонок в таблице
+        Функция, создающая источник строк для экспорта (вызывается в фоне).
 
         Returns:
-            list: Список значений ширины для каждой колонки
-
-        Notes:
-            Ширина рассчитывается с учетом:
-                - Размера страницы A4 в альбомной ориентации
-                - Отступов по краям документа
-        """
-        page_width = landscape(A4)[0] - 20 * mm
-        return [page_width / columns_count * 0.95] * columns_count
-
-
-
-
-class ExcelExporter:
-    @staticmethod
-    def export_to_excel(parent, table_widget, default_filename, sheet_name="Данные"):
-        """
-        "кспорт в Excel
+            callable: Функция без аргументов -> ExportSource или None, если выгружать нечего
         """
-        try:
-            if table_widget.rowCount() == 0:
-                QMessageBox.warning(parent, "Ошибка", "Нет данных для экспорта")
-                return
-
-            # Получение заголовков
-            headers = [
-                table_widget.horizontalHeaderItem(i).text()
-                for i in range(table_widget.columnCount())
-            ]
-
-            # Сбор данных
-            data = []
-            for row in range(table_widget.rowCount()):
-                row_data = []
-                for col in range(table_widget.columnCount()):
-                    item = table_widget.item(row, col)
-                    row_data.append(item.text() if item else "")
-                data.append(row_data)
-
-            # Создание DataFrame
-            df = pd.DataFrame(data, columns=headers)
-
-            # Диалог сохранения файла
-            file_path, _ = QFileDialog.getSaveFileName(
-                parent,
-                "Экспорт в Excel",
-                default_filename,
-                "Excel Files (*.xlsx)"
-            )
-
-            if not file_path:
-                return
-
-            # Cохранение без форматирования
-            df.to_excel(file_path, sheet_name=sheet_name, index=False)
-
-            QMessageBox.information(
-                parent,
-                "Успех",
-                f"Данные успешно экспортированы в файл:\n{file_path}"
-            )
-
-        except PermissionError:
-            error_msg = "Нет прав для записи в выбранную директорию"
-            logging.error(error_msg)
-            QMessageBox.critical(parent, "Ошибка", error_msg)
-        except Exception as e:
-            logging.error(f"Excel Export Error: {str(e)}")
-            QMessageBox.critical(
-                parent,
-                "Ошибка",
-                f"Не удалось экспортировать данные:\n{str(e)}"
-            )
+        generator = self.report_generator
+        if report_type == "Приемы за период":
+            date_from = self.date_from.date().toString("yyyy-MM-dd")
+            date_to = self.date_to.date().toString("yyyy-MM-dd")
+            return lambda: appointments_source(generator.db_pg, generator.db_mongo, date_from, date_to)
+        if report_type == "Животные по диагнозу" and self.param_combo.currentText():
+            criteria = {'medical_history.diagnosis': self.param_combo.currentText()}
+            return lambda: animals_source(generator.db_mongo, criteria)
+
+        if self.results_model.total_rows() == 0:
+            return None
+        # Копия строк: таблицу могут перестроить, пока идет выгрузка
+        source = table_source(self.results_model)
+        snapshot = ExportSource(source.headers, list(source.rows), source.total)
+        return lambda: snapshot
+
+    def on_export_error(self, error):
+        """Сообщает об ошибке фонового экспорта"""
+        if isinstance(error, PermissionError):
+            message = "Нет прав для записи в выбранную директорию"
+        else:
+            message = f"Не удалось экспортировать данные:\n{str(error)}"
+        logger.error(f"Export Error: {str(error)}")
+        QMessageBox.critical(self, "Ошибка", message)
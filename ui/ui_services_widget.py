@@ -1,13 +1,19 @@
 # ui_services_widget.py
 from PyQt6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+    QWidget, QVBoxLayout, QHBoxLayout, QTableView, QAbstractItemView,
     QHeaderView, QPushButton, QMessageBox, QDialog, QFormLayout,
     QLineEdit, QDoubleSpinBox, QTextEdit, QDialogButtonBox, QGroupBox, QComboBox, QLabel
 )
-from PyQt6.QtCore import pyqtSignal, Qt
+from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon
 
 from database.database_models_pg import PostgresModels
+from logic.logic_search_controller import SearchController
+from logic.logic_event_bus import EventSubscription
+from logic.logic_background_tasks import TaskRunner
+from logic.logic_session import MANAGE_SERVICES, get_services, has_permission
+from database import database_events as events
+from ui.ui_table_model import ColumnTableModel, make_sort_proxy, selected_row_key
 
 
 class ServiceDialog(QDialog):
@@ -78,17 +84,31 @@ class ServicesWidget(QWidget):
     - Просмотр детальной информации
     """
 
-    data_updated = pyqtSignal()  # Добавляем сигнал
-
     def __init__(self, user_data):
         super().__init__()
         self.user_data = user_data  # Данные текущего пользователя
         self.db = PostgresModels()  # Подключение к PostgreSQL
         self.current_service_id = None  # ID текущей выбранной услуги
         self.all_services = []  # Список всех услуг
+        self.search_index = {}  # ID услуги -> поля поиска в нижнем регистре
+        self.tasks = TaskRunner()  # Точечные перечитывания услуг - в фоне
+
+        # Поиск по мере ввода среди загруженных услуг (без фонового потока)
+        self.search_controller = SearchController(
+            self.query_search, self.refine_search, delay_ms=150, background=False, parent=self
+        )
+        self.search_controller.results_ready.connect(
+            lambda filter_type, text, services: self.update_services_table(services)
+        )
+        self.search_controller.cleared.connect(lambda: self.update_services_table(self.all_services))
+        self.search_controller.failed.connect(
+            lambda error: QMessageBox.warning(self, "Ошибка поиска", f"Ошибка при выполнении поиска:\n{error}")
+        )
 
         self.init_ui()  # Инициализация интерфейса
         self.load_services()  # Загрузка всех услуг при старте
+        # Изменения услуг применяются к таблице точечно
+        self.subscription = EventSubscription(self, [events.SERVICE], self.on_services_changed)
 
     def init_ui(self):
         """Инициализация пользовательского интерфейса."""
@@ -117,6 +137,9 @@ class ServicesWidget(QWidget):
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Введите значение для поиска...")
         self.search_input.setClearButtonEnabled(True) # Кнопка очистки
+        self.search_input.textChanged.connect(self.on_search_text_changed) # Поиск по мере ввода
+        self.search_input.returnPressed.connect(self.search_services) # Enter - поиск сразу
+        self.filter_combo.currentIndexChanged.connect(self.on_search_text_changed)
 
         # Кнопка поиска
         search_btn = QPushButton("Поиск")
@@ -163,7 +186,7 @@ class ServicesWidget(QWidget):
         self.details_btn.setToolTip("Просмотр подробной информации")
 
         # проверка ролей для ограничения функционала
-        if self.user_data['role'] != 'admin':
+        if not has_permission(self.user_data, MANAGE_SERVICES):
             self.add_btn.setEnabled(False)
             self.edit_btn.setEnabled(False)
             self.delete_btn.setEnabled(False)
@@ -179,21 +202,26 @@ class ServicesWidget(QWidget):
         top_layout.addWidget(buttons_group)
 
         # Таблица услуг
-        self.services_table = QTableWidget()
-        self.services_table.setColumnCount(4) # 4 колонки
-        self.services_table.setHorizontalHeaderLabels(["ID", "Название", "Описание", "Цена"])
+        self.services_model = ColumnTableModel(
+            ["ID", "Название", "Описание", "Цена"],  # 4 колонки
+            key_column=0,  # Ключ строки - ID услуги
+            formatters={3: lambda price: f"{price:.2f} ₽"}
+        )
+        self.services_table = QTableView()
+        self.services_table.setModel(make_sort_proxy(self.services_model, self))
+        self.services_table.setSortingEnabled(True)  # Сортировка по клику на заголовок
 
         # Настройка отображения таблицы
         self.services_table.horizontalHeader().setSectionResizeMode(
                     QHeaderView.ResizeMode.Stretch)  # Равномерное растяжение
         self.services_table.verticalHeader().setVisible(False) # Скрыть нумерацию строк
         # Настройка выделения строк
-        self.services_table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.services_table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.services_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.services_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         # Запрет редактирования ячеек напрямую
-        self.services_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.services_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         # Обработчик двойного клика по строке
-        self.services_table.cellDoubleClicked.connect(self.show_service_details)
+        self.services_table.doubleClicked.connect(lambda _index: self.show_service_details())
 
         # Сборка основного интерфейса
         main_layout.addWidget(top_panel)  # Добавление верхней панели
@@ -204,62 +232,113 @@ class ServicesWidget(QWidget):
     def load_services(self):
         """Загрузка всех услуг из базы данных."""
         try:
-            self.all_services = self.db.get_all_services() # Получение всех услуг
+            self.all_services = get_services(self.db)  # Все услуги (из сессии пользователя)
+            # Поля поиска приводятся к нижнему регистру один раз при загрузке
+            self.search_index = {service[0]: self.index_fields(service) for service in self.all_services}
+            self.search_controller.invalidate()
             self.update_services_table(self.all_services) # Обновление таблицы
-            self.data_updated.emit()  # Сигнализируем об обновлении
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить услуги:\n{str(e)}")
 
-    def update_services_table(self, services):
-        """Обновление таблицы услуг."""
-        self.services_table.setRowCount(len(services)) # Установка количества строк
+    @staticmethod
+    def index_fields(service):
+        """Поля услуги для поиска: ID, название и описание в нижнем регистре, цена."""
+        return (
+            str(service[0]),
+            (service[1] or "").lower(),
+            (service[2] or "").lower(),
+            f"{service[3]:.2f}",
+        )
 
-        for row, service in enumerate(services):
-            self.services_table.setItem(row, 0, QTableWidgetItem(str(service[0])))  # ID
-            self.services_table.setItem(row, 1, QTableWidgetItem(service[1]))  # Название
-            self.services_table.setItem(row, 2, QTableWidgetItem(service[2] or ""))  # Описание
-            self.services_table.setItem(row, 3, QTableWidgetItem(f"{service[3]:.2f} ₽"))  # Цена
+    def on_services_changed(self, changes):
+        """Применяет изменения услуг (None - перечитать все услуги)."""
+        if changes is None:
+            self.load_services()
+            return
 
-    def search_services(self):
-        """Поиск услуг по выбранному фильтру."""
-        search_text = self.search_input.text().strip()  # Текст для поиска
-        filter_type = self.filter_combo.currentText()  # Выбранный фильтр
+        service_ids = list(dict.fromkeys(event.id for event in changes))
+        self.tasks.submit(
+            ('services_patch', tuple(service_ids)),
+            # Одна строка по первичному ключу на каждую изменённую услугу
+            lambda: [(service_id, self.db.get_service_by_id(service_id)) for service_id in service_ids],
+            on_result=self.apply_services_patch
+        )
 
-        if not search_text:  # Если строка поиска пустая
-            self.update_services_table(self.all_services)  # Показать все услуги
-            return
+    def apply_services_patch(self, changed):
+        """Обновляет список услуг и таблицу по перечитанным услугам."""
+        self.search_controller.invalidate()
+        searching = bool(self.search_input.text().strip())
+        for service_id, service in changed:
+            self.all_services = [s for s in self.all_services if s[0] != service_id]
+            self.search_index.pop(service_id, None)
+            if service:
+                self.all_services.append(service)
+                self.search_index[service_id] = self.index_fields(service)
+                if not searching:
+                    self.services_model.upsert_row(service)
+            elif not searching:
+                self.services_model.remove_key(service_id)
+
+        # Активный поиск пересчитывается по обновлённому списку
+        if searching:
+            self.search_services()
 
-        try:
-            filtered_services = []  # Результаты поиска
-            for service in self.all_services:
-                # Поиск по ID (точное совпадение)
-                if filter_type == "ID" and search_text == str(service[0]):
-                    filtered_services.append(service)
-                # Поиск по названию (частичное совпадение без учета регистра)
-                elif filter_type == "Название" and search_text.lower() in service[1].lower():
-                    filtered_services.append(service)
-                # Поиск по описанию (частичное совпадение без учета регистра)
-                elif filter_type == "Описание" and service[2] and search_text.lower() in service[2].lower():
-                    filtered_services.append(service)
-                # Поиск по цене (точное совпадение)
-                elif filter_type == "Цена" and search_text in f"{service[3]:.2f}":
-                    filtered_services.append(service)
-
-            self.update_services_table(filtered_services)  # Обновление таблицы
+    def update_services_table(self, services):
+        """Обновление таблицы услуг."""
+        # Строки: ID, Название, Описание, Цена
+        self.services_model.set_rows(services)
 
-        except Exception as e:
-            QMessageBox.warning(self, "Ошибка поиска", f"Ошибка при выполнении поиска:\n{str(e)}")
+    def search_services(self):
+        """Поиск услуг по выбранному фильтру сразу."""
+        self.search_controller.search_now(self.filter_combo.currentText(), self.search_input.text())
+
+    def on_search_text_changed(self, *args):
+        """Поиск после паузы в наборе."""
+        self.search_controller.request(self.filter_combo.currentText(), self.search_input.text())
+
+    def matches(self, filter_type, needle, service):
+        """Проверка услуги по фильтру (needle для текстовых фильтров - в нижнем регистре)."""
+        service_id, title, description, price = self.search_index[service[0]]
+        if filter_type == "ID":  # Точное совпадение
+            return needle == service_id
+        if filter_type == "Название":  # Частичное совпадение без учета регистра
+            return needle in title
+        if filter_type == "Описание":
+            return needle in description
+        return needle in price  # Цена
+
+    @staticmethod
+    def search_needle(filter_type, search_text):
+        return search_text if filter_type in ("ID", "Цена") else search_text.lower()
+
+    def query_search(self, filter_type, search_text):
+        """Поиск по всем загруженным услугам.
+
+        Returns:
+            tuple: (найденные услуги, полный ли результат)
+        """
+        needle = self.search_needle(filter_type, search_text)
+        return [s for s in self.all_services if self.matches(filter_type, needle, s)], True
+
+    def refine_search(self, filter_type, search_text, services):
+        """Уточнение предыдущего результата при продолжении ввода."""
+        if filter_type == "ID":  # Точное совпадение не уточняется
+            return None
+        needle = self.search_needle(filter_type, search_text)
+        return [s for s in services if self.matches(filter_type, needle, s)]
 
     def clear_search(self):
         """Очистка поиска и отображение всех услуг."""
+        self.search_controller.cancel()
+        self.search_input.blockSignals(True)
         self.search_input.clear()  # Очистка поля ввода
+        self.search_input.blockSignals(False)
         self.update_services_table(self.all_services)  # Показать все услуги
 
     def get_selected_service(self):
         """Возвращает данные выбранной услуги."""
-        selected_row = self.services_table.currentRow() # Индекс выбранной строки
-        if selected_row >= 0: # Если строка выбрана
-            service_id = int(self.services_table.item(selected_row, 0).text())  # Получение ID
+        service_id = selected_row_key(self.services_table)  # ID выбранной строки
+        if service_id is not None: # Если строка выбрана
             return next((s for s in self.all_services if s[0] == service_id), None) # Поиск услуги в общем списке
         return None # Если ничего не выбрано
 
@@ -283,7 +362,6 @@ class ServicesWidget(QWidget):
 
                 if service_id: # Если добавление успешно
                     QMessageBox.information(self, "Успешно", "Услуга добавлена!")
-                    self.load_services() # Обновление списка
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось добавить услугу:\n{str(e)}")
 
@@ -317,7 +395,6 @@ class ServicesWidget(QWidget):
                         price=data['price']
                 ):
                     QMessageBox.information(self, "Успешно", "Данные услуги обновлены!")
-                    self.load_services()  # Обновление списка
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Не удалось обновить услугу:\n{str(e)}")
 
@@ -339,7 +416,6 @@ class ServicesWidget(QWidget):
             try:
                 if self.db.delete_service(service[0]):  # Удаление из базы
                     QMessageBox.information(self, "Успешно", "Услуга удалена!")
-                    self.load_services() # Обновление списка
             except Exception as e:
                 QMessageBox.critical(
                     self, "Ошибка",
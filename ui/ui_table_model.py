@@ -0,0 +1,300 @@
+# ui_table_model.py
+"""
+Табличная модель Qt (model/view) для списков приложения.
+
+Данные хранятся по колонкам - по одному списку значений на колонку, без
+объекта на каждую ячейку, - а представление запрашивает только видимые
+ячейки. Строки выдаются представлению порциями через canFetchMore/fetchMore;
+когда загруженные строки закончились, модель может догрузить следующую
+порцию из внешнего источника (например, следующую страницу из MongoDB) -
+сразу или асинхронно, из фоновой задачи.
+Сортировка выполняется через прокси-модель по исходным значениям.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+
+
+# Ключ строки (ID записи), как раньше хранился в UserRole у QTableWidgetItem
+KeyRole = Qt.ItemDataRole.UserRole
+# Исходное значение ячейки, пригодное для сравнения, - по нему сортирует прокси
+SortRole = Qt.ItemDataRole.UserRole + 1
+
+
+def sort_value(value):
+    """Приводит значение ячейки к типу, который Qt умеет сравнивать"""
+    if value is None:
+        return ""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+class ColumnTableModel(QAbstractTableModel):
+    """Модель только для чтения с хранением данных по колонкам"""
+
+    def __init__(self, headers, key_column=None, formatters=None, style=None,
+                 batch_size=500, parent=None):
+        """
+        Args:
+            headers (list): Заголовки колонок
+            key_column (int, optional): Колонка с ключом строки (ID записи);
+                без неё ключом служит номер строки
+            formatters (dict, optional): {колонка: функция(значение) -> str} для отображения
+            style (callable, optional): style(model, row, column, role) -> значение роли
+                (цвет, шрифт, выравнивание) или None
+            batch_size (int): Сколько строк отдавать представлению за один fetchMore
+        """
+        super().__init__(parent)
+        self._headers = list(headers)
+        self._columns = [[] for _ in self._headers]
+        self._count = 0  # Строк в хранилище
+        self._visible = 0  # Строк, уже отданных представлению
+        self.key_column = key_column
+        self.formatters = formatters or {}
+        self.style = style
+        self.batch_size = batch_size
+        self._fetcher = None  # Источник следующих порций
+        self._source_exhausted = True
+        self._fetch_pending = False  # Источник загружает порцию в фоне
+        self._key_index = None  # ключ -> номер строки (строится по требованию)
+
+    # --- Наполнение ---
+
+    def set_rows(self, rows, headers=None, fetcher=None):
+        """
+        Заменяет содержимое модели.
+
+        Args:
+            rows (list): Строки (кортежи значений по колонкам)
+            headers (list, optional): Новые заголовки колонок
+            fetcher (callable, optional): fetcher() -> список следующих строк из источника;
+                пустой список означает, что источник исчерпан, а None - что порция
+                загружается в фоне и будет передана в append_rows()
+        """
+        self.beginResetModel()
+        if headers is not None:
+            self._headers = list(headers)
+        self._columns = [[] for _ in self._headers]
+        self._count = 0
+        self._visible = 0
+        self._store(rows)
+        self._visible = min(self._count, self.batch_size)
+        self._fetcher = fetcher
+        self._source_exhausted = fetcher is None
+        self._fetch_pending = False
+        self._key_index = None
+        self.endResetModel()
+
+    def append_rows(self, rows, exhausted=False):
+        """
+        Добавляет строки в конец (например, порцию, загруженную в фоне).
+
+        Args:
+            rows (list): Новые строки
+            exhausted (bool): Источник больше не вернёт строк
+        """
+        self._store(rows)
+        self._fetch_pending = False
+        if exhausted:
+            self._source_exhausted = True
+        self._expose_batch()
+
+    def clear(self):
+        self.set_rows([])
+
+    # --- Точечные изменения ---
+
+    def find_row(self, key):
+        """Номер строки с ключом key или None"""
+        if self._key_index is None:
+            if self.key_column is None:
+                return key if isinstance(key, int) and 0 <= key < self._count else None
+            self._key_index = {k: row for row, k in enumerate(self._columns[self.key_column])}
+        return self._key_index.get(key)
+
+    def upsert_row(self, values):
+        """Обновляет строку с тем же ключом или добавляет новую в конец"""
+        key = values[self.key_column] if self.key_column is not None else None
+        row = self.find_row(key) if key is not None else None
+        if row is None:
+            self._store([values])
+            # Если все строки уже показаны - показываем и новую
+            if self._visible == self._count - 1:
+                self._expose_batch()
+            return
+        for column, value in zip(self._columns, values):
+            column[row] = value
+        if row < self._visible:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self._headers) - 1))
+
+    def remove_key(self, key):
+        """Удаляет строку с ключом key (если она есть)"""
+        row = self.find_row(key)
+        if row is None:
+            return False
+        shown = row < self._visible
+        if shown:
+            self.beginRemoveRows(QModelIndex(), row, row)
+        for column in self._columns:
+            del column[row]
+        self._count -= 1
+        if shown:
+            self._visible -= 1
+        self._key_index = None
+        if shown:
+            self.endRemoveRows()
+        return True
+
+    def _store(self, rows):
+        """Раскладывает строки по колонкам (все строки - по значению на колонку)"""
+        rows = list(rows)
+        if not rows:
+            return
+        if self._key_index is not None and self.key_column is not None:
+            for row, values in enumerate(rows, self._count):
+                self._key_index[values[self.key_column]] = row
+        for column, values in zip(self._columns, zip(*rows)):
+            column.extend(values)
+        self._count += len(rows)
+
+    # --- Доступ к данным ---
+
+    def headers(self):
+        return list(self._headers)
+
+    def total_rows(self):
+        """Количество строк в хранилище (включая ещё не показанные)"""
+        return self._count
+
+    def value(self, row, column):
+        return self._columns[column][row]
+
+    def row_values(self, row):
+        return tuple(column[row] for column in self._columns)
+
+    def row_key(self, row):
+        if self.key_column is None:
+            return row
+        return self._columns[self.key_column][row]
+
+    def display_text(self, row, column):
+        """Текст ячейки в том виде, в каком его показывает таблица"""
+        value = self._columns[column][row]
+        formatter = self.formatters.get(column)
+        if formatter is not None:
+            return formatter(value)
+        return "" if value is None else str(value)
+
+    def iter_display_rows(self):
+        """Все строки хранилища в отображаемом виде (для экспорта)"""
+        columns = range(len(self._headers))
+        for row in range(self._count):
+            yield [self.display_text(row, column) for column in columns]
+
+    # --- Интерфейс QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._visible
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.display_text(row, column)
+        if role == KeyRole:
+            return self.row_key(row)
+        if role == SortRole:
+            return sort_value(self._columns[column][row])
+        if self.style is not None:
+            return self.style(self, row, column, role)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            if 0 <= section < len(self._headers):
+                return self._headers[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        if self._visible < self._count:
+            return True
+        return not self._source_exhausted and not self._fetch_pending
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        if self._visible == self._count and not self._source_exhausted:
+            if self._fetch_pending:
+                return
+            rows = self._fetcher()
+            if rows is None:
+                # Порция придёт позже через append_rows()
+                self._fetch_pending = True
+                return
+            if not rows:
+                self._source_exhausted = True
+                return
+            self._store(rows)
+        self._expose_batch()
+
+    def _expose_batch(self):
+        """Показывает представлению очередную порцию уже загруженных строк"""
+        remaining = self._count - self._visible
+        if remaining <= 0:
+            return
+        batch = min(remaining, self.batch_size)
+        self.beginInsertRows(QModelIndex(), self._visible, self._visible + batch - 1)
+        self._visible += batch
+        self.endInsertRows()
+
+
+def make_sort_proxy(model, parent=None):
+    """Прокси-модель, сортирующая по исходным значениям ячеек"""
+    proxy = QSortFilterProxyModel(parent)
+    proxy.setSourceModel(model)
+    proxy.setSortRole(SortRole)
+    return proxy
+
+
+def selected_row_key(view):
+    """Ключ (ID записи) выделенной строки таблицы или None"""
+    selection = view.selectionModel()
+    if selection is None:
+        return None
+    rows = selection.selectedRows()
+    if not rows:
+        return None
+    return rows[0].data(KeyRole)
+
+
+def selected_row_values(view):
+    """Значения выделенной строки в исходной модели или None"""
+    selection = view.selectionModel()
+    if selection is None:
+        return None
+    rows = selection.selectedRows()
+    if not rows:
+        return None
+    index = rows[0]
+    model = view.model()
+    while isinstance(model, QSortFilterProxyModel):
+        index = model.mapToSource(index)
+        model = model.sourceModel()
+    return model.row_values(index.row())